@@ -1,5 +1,12 @@
 import sys
-from PySide6.QtCore import (QCoreApplication, )
+if __name__ == "__main__" and '--profile-startup' in sys.argv:
+    # time the imports below; the report is printed once the main window is up
+    sys.argv.remove('--profile-startup')
+    import startupprofile
+    startupprofile.start()
+# endif --profile-startup
+
+from PySide6.QtCore import (QCoreApplication, QTimer, )
 from PySide6.QtWidgets import (
     QApplication, 
     QWidget, QVBoxLayout, 
@@ -13,7 +20,8 @@ from app_secrets import (sysver_key, usr_auth_required, )
 
 from menuformname_viewMap import FormNameToURL_Map
 from externalWebPageURL_Map import ExternalWebPageURL_Map
-from app.database import get_app_sessionmaker
+from app.database import fnDBSettingsText, get_app_sessionmaker
+from app.schema import fnBootstrapSchema
 
 class MainScreen(QWidget):
     def __init__(self, parent = None):
@@ -30,7 +38,7 @@ class MainScreen(QWidget):
             ExternalWebPageURL_Map=ExternalWebPageURL_Map,
             appname=_appname,
             logo=applogo,
-            appver=sysver[sysver_key],
+            appver=f"{sysver[sysver_key]} - {fnDBSettingsText()}",
             usr_auth=usr_auth_required,
             )
 
@@ -50,12 +58,27 @@ class MainScreen(QWidget):
         pass
 
 
+def shutdownBarcodePool():
+    # the Count Worksheets' barcode process pool, if one was started; app.barcodes is only
+    # imported once a worksheet is opened, and isn't imported here just to shut it down
+    if 'app.barcodes' in sys.modules:
+        sys.modules['app.barcodes'].Barcodes.shutdown()
+# shutdownBarcodePool
+
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
 
+    fnBootstrapSchema()
+
     topscreen = MainScreen()
     topscreen.show()
 
+    if 'startupprofile' in sys.modules:
+        QTimer.singleShot(0, sys.modules['startupprofile'].report)
+
+    app.aboutToQuit.connect(shutdownBarcodePool)
+
     sys.exit(app.exec())
 
 
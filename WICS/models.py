@@ -6,6 +6,7 @@ from django.db.models.functions import Concat
 from django.http import HttpRequest
 from userprofiles.models import WICSuser
 from cMenu.utils import GroupConcat, dictfetchall, user_db
+from mathematical_expressions_parser.eval import evaluate
 
 from .models_async_comm import *
 
@@ -235,6 +236,9 @@ class ActualCounts(models.Model):
     FLAG_PossiblyNotRecieved = models.BooleanField(blank=True, default=False)
     FLAG_MovementDuringCount = models.BooleanField(blank=True, default=False)
     Notes = models.CharField(max_length=250, null=True, blank=True)
+    # CTD_QTY_Expr evaluated on save; CTD_QTY_Valid None = not evaluated yet
+    CTD_QTY_Eval = models.FloatField(null=True, blank=True, default=None)
+    CTD_QTY_Valid = models.BooleanField(null=True, blank=True, default=None)
 
     class Meta:
         ordering = ['CountDate', 'Material']
@@ -242,8 +246,17 @@ class ActualCounts(models.Model):
             models.Index(fields=['CountDate','Material']),
             models.Index(fields=['Material']),
             models.Index(fields=['LOCATION']),
+            models.Index(fields=['CountDate','Material','LocationOnly','CTD_QTY_Eval']),
         ]
 
+    def save(self, *args, **kwargs):
+        try:
+            self.CTD_QTY_Eval = float(evaluate(str(self.CTD_QTY_Expr))) if self.CTD_QTY_Expr is not None else None
+        except Exception:
+            self.CTD_QTY_Eval = None
+        self.CTD_QTY_Valid = self.CTD_QTY_Eval is not None
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         # return str(self.pk) + ": " + str(self.CountDate) + " / " + str(self.Material) + " / " + str(self.Counter) + " / " + str(self.LOCATION)
         return f'{self.pk}: {self.CountDate:%Y-%m-%d}  / {self.Material} / {self.Counter} / {self.LOCATION}'
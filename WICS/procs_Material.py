@@ -262,11 +262,15 @@ def fnMaterialForm(req, recNum = -1, gotoRec=False, newRec=False, HistoryCutoffD
     LastMaterial = None ; LastCountDate = None
     initdata = []
     for r in raw_countdata:
-        try:
-            r.QtyEval = evaluate(r.CTD_QTY_Expr)
-        # except (ValueError, SyntaxError):
-        except:
-            r.QtyEval = 0
+        if r.CTD_QTY_Valid is not None:
+            # evaluated when the record was saved
+            r.QtyEval = r.CTD_QTY_Eval if r.CTD_QTY_Valid else 0
+        else:
+            try:
+                r.QtyEval = evaluate(r.CTD_QTY_Expr)
+            # except (ValueError, SyntaxError):
+            except:
+                r.QtyEval = 0
         if (r.Material != LastMaterial or r.CountDate != LastCountDate):
             LastMaterial = r.Material ; LastCountDate = r.CountDate
             if SAPTotals.filter(uploaded_at__lte=r.CountDate).exists():
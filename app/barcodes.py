@@ -0,0 +1,219 @@
+"""
+Code128 barcodes for the worksheets, rendered once and kept
+
+cBarcodeService caches each SVG in memory and on disk, keyed by the text and the writer options,
+so the Materials that turn up on the worksheet day after day cost a dict lookup (or a file read,
+after a restart). What isn't cached is rendered in a process pool, in parallel.
+The pool's processes are spawned, and each one re-imports the application's __main__ (Main.py,
+so PySide6, SQLAlchemy and app.database) before its first task: about 0.7 s, against about
+3.5 ms to render one barcode here. So the pool is only started for a batch of misses big
+enough to pay for that (minParallel), and is then kept for the rest of the run.
+"""
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from typing import Callable, Iterable
+
+from barcode import Code128
+
+rootdir = "."
+app_barcodeCacheDir = f"{rootdir}/barcodecache"
+
+
+def _renderCode128(strings: list[str], writer_options: dict) -> list[bytes]:
+    # runs in the pool's processes; a chunk of barcodes at a time to keep the pickling down
+    return [Code128(s).render(writer_options=writer_options) for s in strings]
+# _renderCode128
+
+
+class cBarcodeService:
+    """
+    Barcodes.render(text, writer_options)           one barcode (SVG bytes)
+    Barcodes.renderMany(texts, writer_options)      {text: SVG bytes}, the cache misses rendered in parallel
+
+    thread safe; the pool is started the first time enough barcodes miss the cache to be worth it
+    """
+    def __init__(self, cacheDir: str | None = app_barcodeCacheDir, memCacheSize: int = 4096, maxWorkers: int | None = None, minParallel: int = 256):
+        self.cacheDir = cacheDir
+        self.memCacheSize = memCacheSize
+        self.maxWorkers = maxWorkers
+        # fewer misses than this are rendered here rather than in the pool; the pool's ~0.7 s start
+        # is worth about 200 barcodes rendered here
+        self.minParallel = minParallel
+        self._memCache: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool: ProcessPoolExecutor | None = None
+    # __init__
+
+    @staticmethod
+    def _optionsKey(writer_options: dict | None) -> str:
+        return json.dumps(writer_options or {}, sort_keys=True)
+    # _optionsKey
+
+    def _diskPath(self, text: str, optionsKey: str) -> str | None:
+        if self.cacheDir is None:
+            return None
+        digest = hashlib.sha1(f'{optionsKey}\0{text}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.cacheDir, digest[:2], f'{digest}.svg')
+    # _diskPath
+
+    def _memGet(self, key: tuple[str, str]) -> bytes | None:
+        with self._lock:
+            svg = self._memCache.get(key)
+            if svg is not None:
+                self._memCache.move_to_end(key)
+            return svg
+        # endwith _lock
+    # _memGet
+
+    def _memPut(self, key: tuple[str, str], svg: bytes):
+        with self._lock:
+            self._memCache[key] = svg
+            self._memCache.move_to_end(key)
+            while len(self._memCache) > self.memCacheSize:
+                self._memCache.popitem(last=False)
+        # endwith _lock
+    # _memPut
+
+    def _diskGet(self, text: str, optionsKey: str) -> bytes | None:
+        path = self._diskPath(text, optionsKey)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+        # endtry
+    # _diskGet
+
+    def _diskPut(self, text: str, optionsKey: str, svg: bytes):
+        path = self._diskPath(text, optionsKey)
+        if path is None:
+            return
+        # written under another name, then renamed, so a reader never sees half a file
+        tmpPath = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmpPath, 'wb') as f:
+                f.write(svg)
+            os.replace(tmpPath, path)
+        except OSError:
+            # the disk cache is only a cache
+            try:
+                os.remove(tmpPath)
+            except OSError:
+                pass
+        # endtry
+    # _diskPut
+
+    def _getPool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawned, not forked: the app has Qt and worker threads running, which a fork copies badly
+                self._pool = ProcessPoolExecutor(max_workers=self.maxWorkers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+        # endwith _lock
+    # _getPool
+
+    def render(self, text: str, writer_options: dict | None = None) -> bytes:
+        return self.renderMany([text], writer_options)[text]
+    # render
+
+    def renderMany(
+        self,
+        texts: Iterable[str],
+        writer_options: dict | None = None,
+        progress: Callable[[int, int], None] | None = None,
+        isCancelled: Callable[[], bool] | None = None,
+        ) -> dict[str, bytes] | None:
+        """
+        the barcodes of texts, {text: SVG bytes}
+
+        progress(done, total) is called as barcodes come back; if isCancelled returns True,
+        the renders not yet started are dropped and renderMany returns None
+        """
+        if progress is None:
+            progress = lambda done, total: None
+        if isCancelled is None:
+            isCancelled = lambda: False
+        writer_options = dict(writer_options or {})
+        optionsKey = self._optionsKey(writer_options)
+
+        texts = list(dict.fromkeys(texts))
+        total = len(texts)
+        result: dict[str, bytes] = {}
+        misses: list[str] = []
+        for text in texts:
+            svg = self._memGet((text, optionsKey))
+            if svg is None:
+                svg = self._diskGet(text, optionsKey)
+                if svg is not None:
+                    self._memPut((text, optionsKey), svg)
+            if svg is None:
+                misses.append(text)
+            else:
+                result[text] = svg
+        # endfor text
+        progress(len(result), total)
+
+        def keep(text: str, svg: bytes):
+            result[text] = svg
+            self._memPut((text, optionsKey), svg)
+            self._diskPut(text, optionsKey, svg)
+        # keep
+
+        if len(misses) < self.minParallel:
+            # starting the pool would cost more than it saves
+            for text in misses:
+                if isCancelled(): return None
+                keep(text, Code128(text).render(writer_options=writer_options))
+                progress(len(result), total)
+            # endfor text
+            return result
+        # endif few misses
+
+        pool = self._getPool()
+        nWorkers = self.maxWorkers or os.cpu_count() or 1
+        chunkSize = max(1, min(64, len(misses) // (nWorkers * 4)))
+        pending: dict[Future, list[str]] = {}
+        for start in range(0, len(misses), chunkSize):
+            chunk = misses[start:start+chunkSize]
+            pending[pool.submit(_renderCode128, chunk, writer_options)] = chunk
+        # endfor start
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                if isCancelled():
+                    return None
+                for fut in done:
+                    for text, svg in zip(pending.pop(fut), fut.result()):
+                        keep(text, svg)
+                    progress(len(result), total)
+                # endfor fut
+            # endwhile pending
+        finally:
+            for fut in pending:
+                fut.cancel()
+        # endtry
+        return result
+    # renderMany
+
+    def clearMemoryCache(self):
+        with self._lock:
+            self._memCache.clear()
+    # clearMemoryCache
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    # shutdown
+# cBarcodeService
+
+Barcodes = cBarcodeService()
@@ -1,19 +1,454 @@
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+import threading
+from typing import Iterator
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QPersistentModelIndex, Qt
+from PySide6.QtWidgets import QComboBox, QCompleter, QLineEdit
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+
 from calvincTools.utils import cDataList
 
 from app.models import (
-    MaterialList,
+    MaterialList, Organizations,
 )
-from app.database import ( Repository, get_app_sessionmaker )
+from app.database import ( get_app_session, )
 
 # many, many choices for these tables - construct the choice list only once or spend forever waiting
 Nochoice = {'---': None}    # only needed for combo boxes, not datalists
-choices_Materials = {rec.id: str(rec) for rec in Repository(get_app_sessionmaker(), MaterialList).get_all()}
+
+class cMaterialSearchIndex:
+    """
+    type-ahead search over Materials: the choice text, Material, Description and SAPMPN, case-insensitive
+
+        - prefix: a sorted list of (field value, id), searched with bisect
+        - substring: every Material's fields, lowercased, end to end in one string, searched with
+          str.find (which runs at C speed); a bisect on the segment offsets turns a hit back into an id
+    search() is a generator, so a caller pulls only as many matches as it shows
+
+    changes are cheap: add() puts its keys in a small sorted list of its own and its text on a list
+    of pending segments (joined on to the text when next searched); remove() only forgets the id, and
+    what it leaves behind is skipped by search(). Once the pending keys and leftovers are a fair part of
+    the index, it's rebuilt - as load() builds it.
+    thread safe: search() snapshots the index under the lock and walks the snapshot without it; a
+    rebuild replaces the lists rather than changing them
+    """
+    _SEP = '\n'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+    # __init__
+
+    def _clear(self):
+        self._prefixKeys: list[tuple[str, int]] = []       # replaced, never changed, by a rebuild
+        self._prefixAdded: list[tuple[str, int]] = []      # sorted; the keys added since the rebuild
+        self._keysByID: dict[int, tuple[str, ...]] = {}
+        self._text = ''
+        self._textAdded: list[str] = []                    # segments not yet joined on to _text
+        self._textLen = 0
+        self._segStarts: list[int] = []
+        self._segIDs: list[int] = []
+        self._segStartByID: dict[int, int] = {}
+        self._nStale = 0        # prefix keys and segments remove() left behind
+    # _clear
+
+    def _fieldKeys(self, *fields) -> tuple[str, ...]:
+        return tuple(dict.fromkeys(str(fld).lower().replace(self._SEP, ' ') for fld in fields if fld))
+    # _fieldKeys
+
+    def _rebuild(self):
+        # from _keysByID, in the order the ids went in; caller holds the lock
+        self._prefixKeys = sorted((key, matlID) for matlID, keys in self._keysByID.items() for key in keys)
+        self._prefixAdded = []
+        parts = []
+        pos = 0
+        self._segStarts, self._segIDs, self._segStartByID = [], [], {}
+        for matlID, keys in self._keysByID.items():
+            seg = '\0'.join(keys) + self._SEP
+            self._segStarts.append(pos)
+            self._segIDs.append(matlID)
+            self._segStartByID[matlID] = pos
+            parts.append(seg)
+            pos += len(seg)
+        # endfor
+        self._text = ''.join(parts)
+        self._textAdded = []
+        self._textLen = pos
+        self._nStale = 0
+    # _rebuild
+
+    def _rebuildIfWorthIt(self):
+        if len(self._prefixAdded) + self._nStale > max(1000, len(self._prefixKeys) // 8):
+            self._rebuild()
+    # _rebuildIfWorthIt
+
+    def load(self, rows):
+        """
+        (re)build from rows of (id, choice text, Material, Description, SAPMPN)
+        """
+        keysByID = {matlID: self._fieldKeys(*fields) for matlID, *fields in rows}
+        with self._lock:
+            self._clear()
+            self._keysByID = keysByID
+            self._rebuild()
+        # endwith _lock
+    # load
+
+    def _remove(self, matlID: int):
+        # caller holds the lock
+        self._nStale += len(self._keysByID.pop(matlID, ()))
+        if self._segStartByID.pop(matlID, None) is not None:
+            self._nStale += 1
+    # _remove
+
+    def remove(self, matlID: int):
+        with self._lock:
+            self._remove(matlID)
+            self._rebuildIfWorthIt()
+        # endwith _lock
+    # remove
+
+    def add(self, matlID: int, *fields):
+        keys = self._fieldKeys(*fields)
+        seg = '\0'.join(keys) + self._SEP
+        with self._lock:
+            self._remove(matlID)
+            self._keysByID[matlID] = keys
+            for key in keys:
+                insort(self._prefixAdded, (key, matlID))
+            self._segStarts.append(self._textLen)
+            self._segIDs.append(matlID)
+            self._segStartByID[matlID] = self._textLen
+            self._textAdded.append(seg)
+            self._textLen += len(seg)
+            self._rebuildIfWorthIt()
+        # endwith _lock
+    # add
+
+    @staticmethod
+    def _prefixRun(prefixKeys: list[tuple[str, int]], text: str) -> Iterator[tuple[str, int]]:
+        pos = bisect_left(prefixKeys, (text,))
+        while pos < len(prefixKeys) and prefixKeys[pos][0].startswith(text):
+            yield prefixKeys[pos]
+            pos += 1
+        # endwhile
+    # _prefixRun
+
+    def search(self, text: str) -> Iterator[int]:
+        """
+        ids of the Materials matching text: prefix matches first (in field value order),
+        then the other Materials containing text (in the order they were indexed - id order, then changes)
+        """
+        text = text.lower()
+        if not text or self._SEP in text:
+            return
+        with self._lock:
+            if self._textAdded:
+                self._text += ''.join(self._textAdded)
+                self._textAdded = []
+            prefixKeys, prefixAdded = self._prefixKeys, list(self._prefixAdded)
+            alltext, segStarts, segIDs, nSegs = self._text, self._segStarts, self._segIDs, len(self._segIDs)
+            keysByID, segStartByID = self._keysByID, self._segStartByID
+        # endwith _lock
+        seen = set()
+
+        for key, matlID in merge(self._prefixRun(prefixKeys, text), self._prefixRun(prefixAdded, text)):
+            # a key remove() left behind isn't one of the id's keys any more
+            if matlID not in seen and key in keysByID.get(matlID, ()):
+                seen.add(matlID)
+                yield matlID
+        # endfor prefix matches
+
+        pos = alltext.find(text)
+        while pos >= 0:
+            seg = bisect_right(segStarts, pos, 0, nSegs) - 1
+            matlID = segIDs[seg]
+            if matlID not in seen and segStartByID.get(matlID) == segStarts[seg]:
+                seen.add(matlID)
+                yield matlID
+            # the rest of this Material's segment can't give anything new
+            pos = alltext.find(text, alltext.index(self._SEP, pos) + 1)
+        # endwhile substring matches
+    # search
+# cMaterialSearchIndex
+
+class cMaterialChoices:
+    """
+    the {MaterialList.id: 'orgname-Material'} choice list, shared by every chooseMaterials
+
+    built the first time it's asked for (not at import), from a narrow (id, orgname, Material) query
+    rather than whole MaterialList records. Once built it is kept up to date in place:
+        - Materials added, changed or deleted through an ORM session, and Organizations renamed, are
+          noted by the mapper events below and re-read once the session commits (materialsChanged);
+          a rolled-back session changes nothing
+        - bulk (Core) inserts and deletes have to say so, once committed: materialsAdded() after
+          inserting, materialsRemoved(ids) after deleting
+    the dict itself is never replaced, so a widget holding it sees the changes
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._choices: dict[int, str] = {}
+        self._built = False
+        self._index: cMaterialSearchIndex | None = None
+        self._warming = False
+        self._changedWhileWarming: set[int] = set()    # ids to redo once the index being built is in
+    # __init__
+
+    @staticmethod
+    def _choiceText(orgname, Material) -> str:
+        # same as str(MaterialList record)
+        return f'{orgname}-{Material}'
+    # _choiceText
+
+    def _load(self, *whereclause) -> set[int]:
+        # the search fields are read only once the search index exists; returns the ids read
+        stmt = (
+            select(MaterialList.id, Organizations.orgname, MaterialList.Material)
+            .outerjoin(Organizations, MaterialList.org_id == Organizations.id)
+            .where(*whereclause)
+            .order_by(MaterialList.id)
+            )
+        if self._index is not None:
+            stmt = stmt.add_columns(MaterialList.Description, MaterialList.SAPMPN)
+        loaded = set()
+        with get_app_session() as session:
+            for matlID, orgname, Material, *searchFlds in session.execute(stmt):
+                self._choices[matlID] = self._choiceText(orgname, Material)
+                if self._index is not None:
+                    self._index.add(matlID, self._choices[matlID], Material, *searchFlds)
+                loaded.add(matlID)
+            # endfor
+        # endwith session
+        if self._warming:
+            self._changedWhileWarming |= loaded
+        return loaded
+    # _load
+
+    def choices(self) -> dict[int, str]:
+        with self._lock:
+            if not self._built:
+                self._load()
+                self._built = True
+            return self._choices
+    # choices
+
+    def _buildSearchIndex(self):
+        # runs on the warming thread, and holds the lock only to copy the choices and to put the index in;
+        # Materials changed meanwhile are noted (_changedWhileWarming) and redone once it's in
+        try:
+            with self._lock:
+                choices = dict(self.choices())
+            stmt = select(MaterialList.id, MaterialList.Material, MaterialList.Description, MaterialList.SAPMPN)
+            with get_app_session() as session:
+                rows = [(matlID, choices[matlID], Material, Description, SAPMPN)
+                    for matlID, Material, Description, SAPMPN in session.execute(stmt) if matlID in choices]
+            # endwith session
+            index = cMaterialSearchIndex()
+            index.load(rows)
+        except Exception:
+            # let the next warmSearchIndex try again
+            with self._lock:
+                self._warming = False
+            raise
+        # endtry
+        with self._lock:
+            self._index = index
+            self._warming = False
+            changed, self._changedWhileWarming = self._changedWhileWarming, set()
+            self.materialsChanged(changed)
+        # endwith _lock
+    # _buildSearchIndex
+
+    def searchIndex(self) -> cMaterialSearchIndex | None:
+        """
+        the search index over the choices, or None if it isn't built (yet - see warmSearchIndex)
+        """
+        return self._index
+    # searchIndex
+
+    def search(self, text: str) -> Iterator[int]:
+        """
+        ids of the Materials matching text, from the search index; until it's built, the choice
+        texts containing text, from a scan of (a copy of) the choice list
+        """
+        index = self._index
+        if index is not None:
+            return index.search(text)
+        self.warmSearchIndex()
+        with self._lock:
+            choices = list(self.choices().items())
+        text = text.lower()
+        return (matlID for matlID, choiceText in choices if text and text in choiceText.lower())
+    # search
+
+    def warmSearchIndex(self):
+        """
+        build the search index in the background, so it's (usually) ready by the first keystroke
+        """
+        with self._lock:
+            if self._index is not None or self._warming:
+                return
+            self._warming = True
+            self._changedWhileWarming = set()
+        threading.Thread(target=self._buildSearchIndex, name='MaterialSearchIndex', daemon=True).start()
+    # warmSearchIndex
+
+    def materialsAdded(self):
+        """
+        pick up Materials inserted since the list was built. New ids are always above the highest
+        id still in the list (SQLite hands out max(rowid)+1), so only those rows are read
+        """
+        with self._lock:
+            if not self._built:
+                return
+            self._load(MaterialList.id > max(self._choices, default=0))
+    # materialsAdded
+
+    def materialsRemoved(self, ids):
+        with self._lock:
+            for matlID in ids:
+                self._choices.pop(matlID, None)
+                if self._index is not None:
+                    self._index.remove(matlID)
+                elif self._warming:
+                    self._changedWhileWarming.add(matlID)
+    # materialsRemoved
+
+    def materialsChanged(self, ids = (), orgIDs = ()):
+        """
+        re-read the Materials with these ids, and every Material of the Organizations orgIDs (renamed, say);
+        an id no longer in MaterialList is dropped
+        """
+        ids, orgIDs = list(ids), list(orgIDs)
+        with self._lock:
+            if not self._built:
+                return
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start+500]
+                self.materialsRemoved(set(chunk) - self._load(MaterialList.id.in_(chunk)))
+            # endfor start
+            if orgIDs:
+                self._load(MaterialList.org_id.in_(orgIDs))
+        # endwith _lock
+    # materialsChanged
+# cMaterialChoices
+MaterialChoices = cMaterialChoices()
+
+@event.listens_for(MaterialList, 'after_insert')
+@event.listens_for(MaterialList, 'after_update')
+@event.listens_for(MaterialList, 'after_delete')
+def _MaterialChoices_touch(mapper, connection, target):    # pylint: disable=unused-argument
+    # note the Material; the choice list is brought up to date only once the session commits
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('_MaterialChoices_touched', set()).add(target.id)
+# _MaterialChoices_touch
+
+@event.listens_for(Organizations, 'after_update')
+def _MaterialChoices_orgTouch(mapper, connection, target):  # pylint: disable=unused-argument
+    # a renamed Organization changes the choice text of all its Materials
+    session = object_session(target)
+    if session is not None and inspect(target).attrs.orgname.history.has_changes():
+        session.info.setdefault('_MaterialChoices_orgsTouched', set()).add(target.id)
+# _MaterialChoices_orgTouch
+
+@event.listens_for(Session, 'after_commit')
+def _MaterialChoices_commit(session):
+    touched = session.info.pop('_MaterialChoices_touched', None)
+    orgsTouched = session.info.pop('_MaterialChoices_orgsTouched', None)
+    if touched or orgsTouched:
+        MaterialChoices.materialsChanged(touched or (), orgsTouched or ())
+# _MaterialChoices_commit
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _MaterialChoices_rollback(session, previous_transaction):
+    # a rolled-back savepoint leaves the notes; re-reading a Material that didn't change is harmless
+    if not previous_transaction.nested:
+        session.info.pop('_MaterialChoices_touched', None)
+        session.info.pop('_MaterialChoices_orgsTouched', None)
+# _MaterialChoices_rollback
+
+class MaterialCompleterModel(QAbstractListModel):
+    """
+    the completions for the text typed so far, from MaterialChoices.search, handed over
+    PAGESIZE rows at a time as the completer's popup scrolls (canFetchMore/fetchMore)
+    """
+    PAGESIZE = 50
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self._rows: list[int] = []
+        self._matches: Iterator[int] = iter(())
+        self._exhausted = True
+    # __init__
+
+    def setSearchText(self, text: str):
+        self.beginResetModel()
+        self._rows = []
+        self._matches = MaterialChoices.search(text)
+        self._exhausted = False
+        self.endResetModel()
+        if self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+    # setSearchText
+
+    def rowCount(self, parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+    # rowCount
+
+    def canFetchMore(self, parent: QModelIndex | QPersistentModelIndex) -> bool:
+        return not parent.isValid() and not self._exhausted
+    # canFetchMore
+
+    def fetchMore(self, parent: QModelIndex | QPersistentModelIndex):
+        page = []
+        for matlID in self._matches:
+            page.append(matlID)
+            if len(page) >= self.PAGESIZE:
+                break
+        # endfor
+        if len(page) < self.PAGESIZE:
+            self._exhausted = True
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(page) - 1)
+            self._rows.extend(page)
+            self.endInsertRows()
+    # fetchMore
+
+    def data(self, index: QModelIndex | QPersistentModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        matlID = self._rows[index.row()]
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return MaterialChoices.choices().get(matlID, '')
+        if role == Qt.ItemDataRole.UserRole:
+            return matlID
+        return None
+    # data
+# MaterialCompleterModel
 
 class chooseMaterials(cDataList):
-    def __init__(self, choices = choices_Materials, initval = '', parent = None):
-        choices = choices_Materials # ensure we use the prebuilt choice list
+    def __init__(self, choices = None, initval = '', parent = None):
+        choices = MaterialChoices.choices() # ensure we use the shared choice list
         super().__init__(choices, initval, parent)
 
+        # type-ahead goes through the search index rather than a scan of the whole choice list;
+        # the completer shows what the model found, unfiltered
+        edit = self if isinstance(self, QLineEdit) else self.lineEdit() if isinstance(self, QComboBox) else self.findChild(QLineEdit)
+        if edit is not None:
+            self.completerModel = MaterialCompleterModel(self)
+            completer = QCompleter(self.completerModel, self)
+            completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+            completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+            edit.setCompleter(completer)
+            edit.textEdited.connect(self.completerModel.setSearchText)
+            MaterialChoices.warmSearchIndex()
+        # endif edit
+    # __init__
+# chooseMaterials
+
 # List of nested classes - used to check types (see cQFmFldWidg)
 nested_classes = [
     chooseMaterials,
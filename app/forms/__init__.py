@@ -1,9 +1,76 @@
+import importlib
+import importlib.util
 
 from PySide6.QtWidgets import QLabel
 std_id_def = {'label': 'ID', 'widget_type': QLabel, 'readonly': True, 'position': (0,0)}
 
-from .fmActualCounts import *
-from .frmCountSchedule import *
-from .frmMaterials import *
-from .frmPartTypes import *
-from .spreadsheet import *
+# the form modules are imported the first time something from them is asked for, not with the package
+# (app.forms.X still works for anything they used to star-import into here)
+_formModules = ('fmActualCounts', 'frmCountSchedule', 'frmMaterials', 'frmPartTypes', 'rptCountWorksheet', 'spreadsheet', )
+_formNames = {
+    'CountEntryForm': 'fmActualCounts',
+    'rptCountSummary': 'fmActualCounts',
+    'CountScheduleRecordForm': 'frmCountSchedule',
+    'MaterialForm': 'frmMaterials',
+    'PartTypesForm': 'frmPartTypes',
+    'rptCountWorksheet': 'rptCountWorksheet',
+    'rptCountWorksheetLoc': 'rptCountWorksheet',
+    'UpdateMatlListfromSAP': 'spreadsheet',
+    'UploadActCountSprsht': 'spreadsheet',
+    'UploadSAPSOHSprsht': 'spreadsheet',
+    }
+
+def __getattr__(name):
+    if name.startswith('_'):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if name in _formNames:
+        value = getattr(importlib.import_module(f'.{_formNames[name]}', __name__), name)
+    elif importlib.util.find_spec(f'{__name__}.{name}') is not None:
+        # a submodule (including ones being imported right now via 'from app.forms import ...')
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        for modname in _formModules:
+            module = importlib.import_module(f'.{modname}', __name__)
+            if hasattr(module, name):
+                value = getattr(module, name)
+                break
+        else:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+        # endfor modname
+    # endif name
+    globals()[name] = value
+    return value
+# __getattr__
+
+class cLazyForm:
+    """
+    stands in for a form class in FormNameToURL_Map: the form's module is imported the first
+    time the form is opened (called), or something is asked of it
+    """
+    def __init__(self, modulename: str, classname: str):
+        self._modulename = modulename
+        self._classname = classname
+        self._formclass = None
+    # __init__
+
+    def resolve(self) -> type:
+        if self._formclass is None:
+            self._formclass = getattr(importlib.import_module(f'.{self._modulename}', __name__), self._classname)
+        return self._formclass
+    # resolve
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+    # __call__
+
+    def __getattr__(self, name):
+        if name in ('_modulename', '_classname', '_formclass'):
+            # not set up yet (say, mid-copy) - don't go looking for them in the form class
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+    # __getattr__
+
+    def __repr__(self) -> str:
+        return f'<cLazyForm {__name__}.{self._modulename}.{self._classname}>'
+    # __repr__
+# cLazyForm
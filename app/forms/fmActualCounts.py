@@ -1,26 +1,28 @@
 from datetime import date
-from typing import Any, List
-
-from PySide6.QtCore import QDate, Qt, Slot
-from PySide6.QtWidgets import QCalendarWidget, QCheckBox, QDateEdit, QFrame, QHBoxLayout, QLabel, QLineEdit, QPlainTextEdit, QPushButton, QScrollArea, QVBoxLayout, QWidget
-from sqlalchemy import and_, literal, literal_column, or_, select
+import html
+import threading
+from typing import Any, Callable, List
+
+from PySide6.QtCore import QAbstractItemModel, QDate, QModelIndex, QObject, QPersistentModelIndex, QRunnable, QThreadPool, Qt, Signal, Slot
+from PySide6.QtGui import QFont, QTextDocument
+from PySide6.QtPrintSupport import QPrintPreviewDialog
+from PySide6.QtWidgets import QCalendarWidget, QCheckBox, QDateEdit, QHBoxLayout, QLabel, QLineEdit, QPlainTextEdit, QPushButton, QTreeView, QVBoxLayout, QWidget
+from sqlalchemy import and_, literal, literal_column, or_, select, union_all
 from sqlalchemy.orm import aliased
 
-from mathematical_expressions_parser.eval import evaluate
-from app.database import Repository, app_Session, get_app_session, get_app_sessionmaker
+from mathematical_expressions_parser.eval import evaluate, evaluate_many
+from app.database import Repository, app_Session, get_app_session, get_app_sessionmaker, unitOfWork
 from app.forms import (
     std_id_def,
     AppchoiceWidgets,
     )
 from app.models import ActualCounts, CountSchedule, MaterialList, Organizations
-from app.utils import fnSAPList
+from app.utils import fnCountTotals, fnSAPByMaterial, fnSAPList
 
 from calvincTools.utils import (
     ExcelWorkbook_fileext, cExcelFile,
     cQFmFldWidg,
-    clearLayout,
     cDataList,
-    cPrintManager,
     )
 from calvincTools.utils.forms import (
     cQFormFieldDef,
@@ -207,37 +209,65 @@ class CountEntryForm(cSRFSingleRecordForm):
     # changeInternalVarField
 # CountEntryForm
 
-class rptCountSummary(QWidget):
+class CountSummaryEngine:
     """
-    Count Summary Report
-
-    A lot of the original WICS code is preserved. That's why, for instance, outputlines dictionary is built 
-    and then later parsed to create the report, instead of just building the report directly.
+    Count Summary Report data - the queries and the output rows, no widgets
 
+    All three sections (Scheduled and Counted, UnScheduled, Scheduled but Not Counted) for all
+    organizations come from one UNION ALL query, each part tagged with its section number and
+    joined to organizations for OrgName. The organization list is a second query, so orgs with
+    no counts are still reported. The rows are then split by org and section here; the number of
+    queries no longer grows with the number of organizations.
     """
-    _formname = "Count Summary"
+    SECTION_SCHEDULED_COUNTED = 1
+    SECTION_UNSCHEDULED = 2
+    SECTION_SCHEDULED_NOTCOUNTED = 3
+
+    def __init__(self, CountDate: date, Rptvariation = None):
+        self.CountDate = CountDate
+        self.Rptvariation = Rptvariation     # None, or 'REQ' for requested only
+        self.Excel_qdict: list[dict] = []
+    # __init__
 
-    def CreateOutputRows(self, raw_qs, SAP_SOH, Excel_qdict, Eval_CTDQTY=True):
+    def sectionTitles(self) -> dict[int, str]:
+        """
+        the report sections, in report order, with their titles for this Rptvariation
+        """
+        if self.Rptvariation == 'REQ':
+            return {
+                self.SECTION_SCHEDULED_COUNTED: 'Requested and Counted',
+                self.SECTION_UNSCHEDULED: 'UnScheduled',
+                self.SECTION_SCHEDULED_NOTCOUNTED: 'Requested but Not Counted',
+                }
+        return {
+            self.SECTION_SCHEDULED_COUNTED: 'Scheduled and Counted',
+            self.SECTION_UNSCHEDULED: 'UnScheduled',
+            self.SECTION_SCHEDULED_NOTCOUNTED: 'Scheduled but Not Counted',
+            }
+    # sectionTitles
+
+    def CreateOutputRows(self, raw_qs, SAP_SOH, Excel_qdict, Eval_CTDQTY=True, CountTotals=None):
         """
         Create output rows for Count Summary report
         raw_qs: queryset of ActualCounts records
-        SAP_SOH: dict as returned by fnSAPList
-        Eval_CTDQTY: if True, evaluate the CTD_QTY_Expr field; if False, just put in '----'
+        SAP_SOH: dict as returned by fnSAPList, plus 'SAPByMatl' as returned by fnSAPByMaterial
+            (built once per report by buildReport)
+        Eval_CTDQTY: if True, show the evaluated CTD_QTY_Expr (the stored CTD_QTY_Eval, or evaluated
+            here if the record hasn't been); if False, just put in '----'
+        CountTotals: {Material_id: total counted} (from fnCountTotals) for the summary lines;
+            if None, the totals are added up from the rows
         """
         outputrows = []
         lastrow = {}
+        SAPByMatl = SAP_SOH['SAPByMatl'] if 'SAPByMatl' in SAP_SOH else fnSAPByMaterial(SAP_SOH['SAPTable'])
 
         def SummaryLine(lastrow):
             # summarize last Matl
             # total SAP Numbers
-            SAPTot = 0
+            SAPLines, SAPTot = SAPByMatl.get(lastrow['Material_id'], ([], 0))
             outputline = dict()
             outputline['type'] = 'Summary'
-            outputline['SAPNum'] = []
-            for SAProw in SAP_SOH['SAPTable']:
-                if SAProw.Material_id == lastrow['Material_id']:
-                    outputline['SAPNum'].append((SAProw.StorageLocation, SAProw.Amount, SAProw.BaseUnitofMeasure))
-                    SAPTot += SAProw.Amount*SAProw.mult
+            outputline['SAPNum'] = list(SAPLines)
             outputline['TypicalContainerQty'] = lastrow['TypicalContainerQty']
             outputline['TypicalPalletQty'] = lastrow['TypicalPalletQty']
             outputline['OrgName'] = lastrow['OrgName']
@@ -274,7 +304,7 @@ class rptCountSummary(QWidget):
             lastrow['Requestor'] = rawrow.Requestor
             lastrow['RequestFilled'] = rawrow.RequestFilled
             lastrow['PartType'] = rawrow.PartType
-            lastrow['TotalCounted'] = 0
+            lastrow['TotalCounted'] = 0 if CountTotals is None else CountTotals.get(rawrow.matl_id, 0)
             lastrow['SchedNotes'] = rawrow.cs_Notes
             lastrow['TypicalContainerQty'] = rawrow.TypicalContainerQty
             lastrow['TypicalPalletQty'] = rawrow.TypicalPalletQty
@@ -284,7 +314,7 @@ class rptCountSummary(QWidget):
             return lastrow
         # end def CreateLastRow
 
-        def DetailLine(rawrow, Eval_CTDQTY=True):
+        def DetailLine(rawrow, CTD_QTY_Eval):
             outputline = dict()
             outputline['type'] = 'Detail'
             outputline['CycCtID'] = rawrow.ac_CycCtID
@@ -302,25 +332,38 @@ class rptCountSummary(QWidget):
             outputline['PossNotRec'] = rawrow.FLAG_PossiblyNotRecieved
             outputline['MovDurCt'] = rawrow.FLAG_MovementDuringCount
             outputline['CTD_QTY_Expr'] = rawrow.ac_CTD_QTY_Expr
-            if Eval_CTDQTY:
-                try:
-                    outputline['CTD_QTY_Eval'] = evaluate(rawrow.ac_CTD_QTY_Expr)
-                    # do next line at caller
-                    # lastrow['TotalCounted'] += outputline['CTD_QTY_Eval']
-                except Exception:   # pylint: disable=broad-exception-caught   # catch any exceptions from evaluate
-                    # Exception('bad expression:'+rawrow.ac_CTD_QTY_Expr)
-                    outputline['CTD_QTY_Eval'] = "????"
-            else:
-                outputline['CTD_QTY_Eval'] = "----"
+            # do next line at caller
+            # lastrow['TotalCounted'] += outputline['CTD_QTY_Eval']
+            outputline['CTD_QTY_Eval'] = CTD_QTY_Eval
             outputline['ActCountNotes'] = rawrow.ac_Notes
             # outputrows.append(outputline)
 
             return outputline
         #end def DetailLine
 
+        raw_qs = list(raw_qs)
+        if Eval_CTDQTY:
+            # use the stored CTD_QTY_Eval; any rows not evaluated yet are evaluated together,
+            # each distinct expression once
+            notEvaluated = [rawrow.ac_CTD_QTY_Expr for rawrow in raw_qs if rawrow.ac_CTD_QTY_Valid is None]
+            Evaluated = iter(evaluate_many(notEvaluated))
+            CTD_QTY_Evals = []
+            for rawrow in raw_qs:
+                if rawrow.ac_CTD_QTY_Valid is None:
+                    v = next(Evaluated)
+                    CTD_QTY_Evals.append("????" if isinstance(v, Exception) else v)
+                elif rawrow.ac_CTD_QTY_Valid:
+                    v = rawrow.ac_CTD_QTY_Eval
+                    CTD_QTY_Evals.append(int(v) if float(v).is_integer() else v)
+                else:
+                    CTD_QTY_Evals.append("????")
+            # endfor rawrow
+        else:
+            CTD_QTY_Evals = ["----"] * len(raw_qs)
+
         outputrows = []
         lastrow = {'Material_id': None}
-        for rawrow in raw_qs:
+        for rawrow, CTD_QTY_Eval in zip(raw_qs, CTD_QTY_Evals):
             if rawrow.matl_id != lastrow['Material_id']:     # new Matl
                 if outputrows:
                     SmLine = SummaryLine(lastrow)
@@ -337,10 +380,10 @@ class rptCountSummary(QWidget):
             #endif
 
             # process this row
-            outputline = DetailLine(rawrow, Eval_CTDQTY)
+            outputline = DetailLine(rawrow, CTD_QTY_Eval)
             outputrows.append(outputline)
             assert isinstance(lastrow['TotalCounted'], (int,float)), "lastrow['TotalCounted'] is not numeric"
-            if isinstance(outputline['CTD_QTY_Eval'],(int,float)):
+            if CountTotals is None and isinstance(outputline['CTD_QTY_Eval'],(int,float)):
                 lastrow['TotalCounted'] += outputline['CTD_QTY_Eval']     # type: ignore
         # endfor
         # need to do the summary on the last row
@@ -356,6 +399,452 @@ class rptCountSummary(QWidget):
         return outputrows
     # end def CreateOutputRows
 
+    @staticmethod
+    def _buildFieldList(ac, cs, mtl, org, section: int) -> list[Any]:
+        acCols = ac.c if hasattr(ac,"c") else ac
+        csCols = cs.c if hasattr(cs,"c") else cs
+        mtlCols = mtl.c if hasattr(mtl,"c") else mtl
+        fld_list = [
+            literal_column(str(section)).label("Section"),
+            literal_column("0").label("id"),
+            csCols.id.label("cs_id"),
+            csCols.CountDate.label("cs_CountDate"),
+            csCols.Counter.label("cs_Counter"),
+            csCols.Priority.label("cs_Priority"),
+            csCols.ReasonScheduled.label("cs_ReasonScheduled"),
+            csCols.Requestor,
+            csCols.RequestFilled,
+            csCols.Notes.label("cs_Notes"),
+            acCols.id.label("ac_id"),
+            acCols.CountDate.label("ac_CountDate"),
+            acCols.CycCtID.label("ac_CycCtID"),
+            acCols.Counter.label("ac_Counter"),
+            acCols.LocationOnly.label("ac_LocationOnly"),
+            acCols.CTD_QTY_Expr.label("ac_CTD_QTY_Expr"),
+            acCols.CTD_QTY_Eval.label("ac_CTD_QTY_Eval"),
+            acCols.CTD_QTY_Valid.label("ac_CTD_QTY_Valid"),
+            acCols.LOCATION.label("ac_LOCATION"),
+            acCols.PKGID_Desc.label("ac_PKGID_Desc"),
+            acCols.TAGQTY.label("ac_TAGQTY"),
+            acCols.FLAG_PossiblyNotRecieved,
+            acCols.FLAG_MovementDuringCount,
+            acCols.Notes.label("ac_Notes"),
+            mtlCols.id.label("matl_id"),
+            mtlCols.org_id,
+            org.orgname.label("OrgName"),
+            (org.orgname+literal("-")+mtlCols.Material).label("Matl_PartNum"),
+            mtlCols.PartType_id.label("PartType"),  #TODO: join to PartTypes to get the name
+            mtlCols.Description,
+            mtlCols.TypicalContainerQty,
+            mtlCols.TypicalPalletQty,
+            mtlCols.Notes.label("mtl_Notes"),
+        ]
+        return fld_list
+    # _buildFieldList
+
+    def buildQuery(self):
+        """
+        the one statement that returns every section for every organization,
+        ordered by org_id, Section, Matl_PartNum
+        """
+        countDate = self.CountDate
+
+        ###### PART A: Records Scheduled and Counted ######
+        cs = aliased(CountSchedule, name='cs')
+        mtl = aliased(MaterialList, name='mtl')
+        org = aliased(Organizations, name='org')
+        # (SELECT * FROM WICS_actualcounts WHERE not LocationOnly)
+        ac = (
+            select(ActualCounts)
+            .where(ActualCounts.LocationOnly == False)
+            .subquery(name='ac')
+        )
+        partA = (
+            select(*self._buildFieldList(ac, cs, mtl, org, self.SECTION_SCHEDULED_COUNTED))
+            .select_from(cs)
+            .join(ac, and_(
+                cs.CountDate == ac.c.CountDate,
+                cs.Material_id == ac.c.Material_id
+            ))
+            .join(mtl, ac.c.Material_id == mtl.id)
+            .join(org, mtl.org_id == org.id)
+            .where(
+                or_(
+                    ac.c.CountDate == countDate,
+                    cs.CountDate == countDate
+                ),
+            )
+        )
+        if self.Rptvariation == 'REQ':
+            partA = partA.where(cs.Requestor.is_not(None))
+
+        ###### PART B: Records UnScheduled but Counted ######
+        cs = aliased(CountSchedule, name='cs')
+        mtl = aliased(MaterialList, name='mtl')
+        org = aliased(Organizations, name='org')
+        ac = aliased(ActualCounts, name='ac')
+        partB = (
+            select(*self._buildFieldList(ac, cs, mtl, org, self.SECTION_UNSCHEDULED))
+            .select_from(ac)
+            .join(mtl, ac.Material_id == mtl.id)
+            .join(org, mtl.org_id == org.id)
+            .outerjoin(cs, and_(
+                cs.CountDate == ac.CountDate,
+                cs.Material_id == ac.Material_id
+            ))
+            .where(
+                ac.LocationOnly == False,
+                or_(
+                    ac.CountDate == countDate,
+                    cs.CountDate == countDate
+                ),
+                cs.id.is_(None) # unscheduled only
+            )
+        )
+
+        ###### PART C: Records Scheduled but not Counted ######
+        cs = aliased(CountSchedule, name='cs')
+        mtl = aliased(MaterialList, name='mtl')
+        org = aliased(Organizations, name='org')
+        ac = (
+            select(ActualCounts)
+            .where(ActualCounts.LocationOnly == False)
+            .subquery(name='ac')
+        )
+        partC = (
+            select(*self._buildFieldList(ac, cs, mtl, org, self.SECTION_SCHEDULED_NOTCOUNTED))
+            .select_from(cs)
+            .join(mtl, cs.Material_id == mtl.id)
+            .join(org, mtl.org_id == org.id)
+            .outerjoin(ac, and_(
+                cs.CountDate == ac.c.CountDate,
+                cs.Material_id == ac.c.Material_id
+            ))
+            .where(
+                or_(
+                    ac.c.CountDate == countDate,
+                    cs.CountDate == countDate
+                ),
+                ac.c.id.is_(None),  # not counted
+            )
+        )
+        if self.Rptvariation == 'REQ':
+            partC = partC.where(cs.Requestor.is_not(None))
+
+        rpt = union_all(partA, partB, partC).subquery(name='rpt')
+        return select(rpt).order_by(rpt.c.org_id, rpt.c.Section, rpt.c.Matl_PartNum)
+    # buildQuery
+
+    def build(self, isCancelled: Callable[[], bool] | None = None) -> dict | None:
+        """
+        run the report queries and build the output rows
+
+        returns {'CountDate', 'Rptvariation', 'SAPDate', 'SummaryReport', 'Excel_qdict'}; SummaryReport has one
+        entry per organization and section, {'org', 'OrgName', 'Title', 'outputrows'}, in report order
+
+        isCancelled is polled between steps; if it returns True, build stops and returns None.
+        Nothing here touches a widget, so build can run on a worker thread.
+        """
+        if isCancelled is None:
+            isCancelled = lambda: False
+
+        # every query of the build goes through one unit of work - one session and connection,
+        # instead of one apiece for the SAP snapshot, the report rows and the totals
+        with unitOfWork() as uow:
+            SAP_SOH = fnSAPList(self.CountDate, ssnmaker=uow.sessionmaker)
+            # group the SAP snapshot by Material once; every summary line is then a dict lookup
+            SAP_SOH['SAPByMatl'] = fnSAPByMaterial(SAP_SOH['SAPTable'])
+
+            orgList = uow.session.execute(
+                select(Organizations.id, Organizations.orgname).order_by(Organizations.id)
+                ).all()
+            if isCancelled(): return None
+            rptRows = uow.session.execute(self.buildQuery()).all()
+
+            # the per-Material totals come from SQL SUM over the stored CTD_QTY_Eval - unless some counts
+            # haven't been evaluated yet (see app.maintenance backfill-ctdqty), then they're added up from the rows
+            CountTotals = None
+            if not any(rawrow.ac_id is not None and rawrow.ac_CTD_QTY_Valid is None for rawrow in rptRows):
+                CountTotals = {matlID: total for (matlID, _ctDate), total in fnCountTotals(self.CountDate, ssnmaker=uow.sessionmaker).items()}
+        # endwith uow
+
+        # split the rows by org and section; they arrive in Matl_PartNum order within each
+        SectionRows: dict[tuple[int, int], list] = {}
+        for rawrow in rptRows:
+            SectionRows.setdefault((rawrow.org_id, rawrow.Section), []).append(rawrow)
+
+        self.Excel_qdict = []
+        SummaryReport = []
+        for org, orgname in orgList:
+            for section, ttl in self.sectionTitles().items():
+                if isCancelled(): return None
+                SummaryReport.append({
+                            'org':org,
+                            'OrgName':orgname,
+                            'Title':ttl,
+                            'outputrows': self.CreateOutputRows(SectionRows.get((org, section), []), SAP_SOH, self.Excel_qdict, CountTotals=CountTotals),
+                            })
+            # endfor section
+        # endfor org
+
+        return {
+            'CountDate': self.CountDate,
+            'Rptvariation': self.Rptvariation,
+            'SAPDate': SAP_SOH['SAPDate'],
+            'SummaryReport': SummaryReport,
+            'Excel_qdict': self.Excel_qdict,
+            }
+    # build
+
+# CountSummaryEngine
+
+class CountSummaryBuildSignals(QObject):
+    """
+    signals for CountSummaryBuildJob - a QRunnable isn't a QObject, so it can't carry its own
+    """
+    finished = Signal(int, object)      # build number, CountSummaryEngine.build result
+    failed = Signal(int, str)           # build number, error description
+# CountSummaryBuildSignals
+
+class CountSummaryBuildJob(QRunnable):
+    """
+    runs CountSummaryEngine.build on a QThreadPool thread and hands the plain data back
+    through signals, which Qt queues to the GUI thread
+
+    cancel() is cooperative: the engine polls it between steps and gives up early. A cancelled
+    job emits nothing.
+    """
+    def __init__(self, buildNum: int, CountDate: date, Rptvariation = None):
+        super().__init__()
+        self.buildNum = buildNum
+        self.CountDate = CountDate
+        self.Rptvariation = Rptvariation
+        self.signals = CountSummaryBuildSignals()
+        self._cancelled = threading.Event()
+    # __init__
+
+    def cancel(self):
+        self._cancelled.set()
+    # cancel
+
+    def isCancelled(self) -> bool:
+        return self._cancelled.is_set()
+    # isCancelled
+
+    def run(self):
+        if self.isCancelled():
+            return
+        try:
+            rpt = CountSummaryEngine(self.CountDate, self.Rptvariation).build(isCancelled=self.isCancelled)
+        except Exception as ex:     # pylint: disable=broad-exception-caught
+            if not self.isCancelled():
+                self.signals.failed.emit(self.buildNum, repr(ex))
+            return
+        # endtry
+        if rpt is not None and not self.isCancelled():
+            self.signals.finished.emit(self.buildNum, rpt)
+    # run
+# CountSummaryBuildJob
+
+class CountSummaryModel(QAbstractItemModel):
+    """
+    The Count Summary report as a tree model: Organization > Section > Material > count lines.
+
+    The view only asks for the rows it paints, so a big count day costs one small node per line
+    instead of a row of widgets. toHtml renders the same tree for printing.
+    """
+    NODE_ORG = 'org'
+    NODE_SECTION = 'section'
+    NODE_MATERIAL = 'material'
+    NODE_DETAIL = 'detail'
+
+    _columns = [
+        'Organization / Section / Material / Count Date',
+        'Counter', 'LOCATION', 'PKG ID/Desc', 'TAG QTY', 'Actual Count',
+        'Counted Total', 'SAP Total', 'Diff', 'Accuracy',
+        'Flags', 'Notes',
+        ]
+    _numericColumns = {4, 5, 6, 7, 8, 9}
+
+    class Node:
+        """
+        one row of the tree; line is the CountSummaryEngine output row (Detail or Summary) behind it
+        """
+        def __init__(self, kind: str, parent, text: str = '', line: dict | None = None):
+            self.kind = kind
+            self.parent = parent
+            self.row = len(parent.children) if parent is not None else 0
+            self.children: list = []
+            self.text = text
+            self.line = line
+            if parent is not None:
+                parent.children.append(self)
+        # __init__
+    # Node
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.CountDate: date | None = None
+        self.SAPDate: date | None = None
+        self._root = self.Node('root', None)
+    # __init__
+
+    def setReport(self, CountDate: date | None, SAPDate: date | None, SummaryReport: list[dict]):
+        """
+        replace the model contents with a CountSummaryEngine SummaryReport
+        """
+        self.beginResetModel()
+        self.CountDate = CountDate
+        self.SAPDate = SAPDate
+        self._root = root = self.Node('root', None)
+        orgNode = None
+        for rptSection in SummaryReport:
+            if orgNode is None or orgNode.line['org'] != rptSection['org']:
+                orgNode = self.Node(self.NODE_ORG, root, f"Organization: {rptSection['OrgName']}", {'org': rptSection['org']})
+            if not rptSection['outputrows']:
+                continue
+            sectNode = self.Node(self.NODE_SECTION, orgNode, f"Counts {rptSection['Title']}")
+            matlNode = None
+            for outputline in rptSection['outputrows']:
+                if matlNode is None or matlNode.line['Material_id'] != outputline['Material_id']:
+                    matlNode = self.Node(self.NODE_MATERIAL, sectNode,
+                        f"Material: {outputline['Material']} - {outputline['Description']}",
+                        {'Material_id': outputline['Material_id']})
+                if outputline['type'] == 'Detail':
+                    self.Node(self.NODE_DETAIL, matlNode, f"{CountDate:%m/%d}" if CountDate else '', outputline)
+                elif outputline['type'] == 'Summary':
+                    matlNode.line = outputline
+                # endif outputline type
+            # endfor outputline
+        # endfor rptSection
+        for orgNode in root.children:
+            if not orgNode.children:
+                orgNode.text += '    NO COUNTS'
+        self.endResetModel()
+    # setReport
+
+    def _node(self, index: QModelIndex | QPersistentModelIndex):
+        return index.internalPointer() if index.isValid() else self._root
+    # _node
+
+    def index(self, row: int, column: int, parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> QModelIndex:
+        parentNode = self._node(parent)
+        if not (0 <= row < len(parentNode.children) and 0 <= column < len(self._columns)):
+            return QModelIndex()
+        return self.createIndex(row, column, parentNode.children[row])
+    # index
+
+    def parent(self, index: QModelIndex | QPersistentModelIndex = QModelIndex()) -> QModelIndex:     # type: ignore[override]
+        if not index.isValid():
+            return QModelIndex()
+        parentNode = index.internalPointer().parent
+        if parentNode is None or parentNode is self._root:
+            return QModelIndex()
+        return self.createIndex(parentNode.row, 0, parentNode)
+    # parent
+
+    def rowCount(self, parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> int:
+        if parent.isValid() and parent.column() != 0:
+            return 0
+        return len(self._node(parent).children)
+    # rowCount
+
+    def columnCount(self, parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> int:
+        return len(self._columns)
+    # columnCount
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self._columns[section]
+        return None
+    # headerData
+
+    def cellText(self, node, column: int) -> str:
+        """
+        the text shown for node in column - used by data and toHtml
+        """
+        line = node.line
+        if column == 0:
+            return node.text
+        if node.kind == self.NODE_DETAIL:
+            if   column == 1: return str(line['ActCounter'] or '')
+            elif column == 2: return str(line['LOCATION'] or '')
+            elif column == 3: return str(line['PKGID'] or '')
+            elif column == 4: return str(line['TAGQTY'] or '')
+            elif column == 5: return f"{line['CTD_QTY_Expr']} = {line['CTD_QTY_Eval']}"
+            elif column == 10:
+                flags = []
+                if line['PossNotRec']: flags.append('Possibly Not Received')
+                if line['MovDurCt']: flags.append('Movement During Count')
+                return ' | '.join(flags)
+            elif column == 11: return str(line['ActCountNotes'] or '')
+        elif node.kind == self.NODE_MATERIAL and line is not None and line.get('type') == 'Summary':
+            if   column == 1: return str(line['Counters'] or '')
+            elif column == 6: return f"{line['CountTotal']}"
+            elif column == 7: return f"{line['SAPTotal']}"
+            elif column == 8: return f"{line['Diff']}"
+            elif column == 9: return f"{line['Accuracy']:.2f}%"
+        # endif node.kind
+        return ''
+    # cellText
+
+    def data(self, index: QModelIndex | QPersistentModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.cellText(node, index.column())
+        if role == Qt.ItemDataRole.FontRole and node.kind != self.NODE_DETAIL:
+            font = QFont()
+            font.setBold(True)
+            font.setUnderline(node.kind == self.NODE_ORG)
+            return font
+        if role == Qt.ItemDataRole.TextAlignmentRole and index.column() in self._numericColumns:
+            return int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return None
+    # data
+
+    def toHtml(self) -> str:
+        """
+        the whole report as HTML, in the same layout as the view, for printing
+        """
+        esc = html.escape
+        hdrCells = ''.join(f"<th>{esc(c)}</th>" for c in self._columns[1:])
+        out = [
+            f"<h2>Count Summary Report for Count Date: {self.CountDate:%Y-%m-%d}</h2>" if self.CountDate else '',
+            f"<p>SAP Data Date: {self.SAPDate.isoformat() if self.SAPDate else 'N/A'}</p>",
+            ]
+        for orgNode in self._root.children:
+            out.append(f"<hr><h2><u>{esc(orgNode.text)}</u></h2>")
+            for sectNode in orgNode.children:
+                out.append(f"<h3>{esc(sectNode.text)}</h3>")
+                for matlNode in sectNode.children:
+                    out.append(f"<h4><u>{esc(matlNode.text)}</u></h4>")
+                    out.append(f'<table border="1" cellspacing="0" cellpadding="2"><tr><th>Count Date</th>{hdrCells}</tr>')
+                    for node in matlNode.children + [matlNode]:
+                        cells = ''.join(
+                            ('<td align="right">' if c in self._numericColumns else '<td>') + esc(self.cellText(node, c)) + '</td>'
+                            for c in range(1, len(self._columns))
+                            )
+                        label = esc(node.text) if node is not matlNode else '<b>Total</b>'
+                        out.append(f"<tr><td>{label}</td>{cells}</tr>")
+                    out.append('</table>')
+                # endfor matlNode
+            # endfor sectNode
+        # endfor orgNode
+        return '\n'.join(out)
+    # toHtml
+# CountSummaryModel
+
+class rptCountSummary(QWidget):
+    """
+    Count Summary Report
+
+    A lot of the original WICS code is preserved. That's why, for instance, outputlines dictionary is built 
+    and then later parsed to create the report, instead of just building the report directly.
+
+    """
+    _formname = "Count Summary"
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -389,16 +878,25 @@ class rptCountSummary(QWidget):
         self.lblSAPDate = QLabel("SAP Data Date: N/A")
         myLayout.addWidget(self.lblSAPDate)
 
-        wdgtMainArea = QWidget()
-        self.layoutMainArea = QVBoxLayout(wdgtMainArea)
-        self.layoutMainArea.setSpacing(1)
-        wdgtScrollArea = QScrollArea()
-        wdgtScrollArea.setWidgetResizable(True)
-        wdgtScrollArea.setWidget(wdgtMainArea)
-        myLayout.addWidget(wdgtScrollArea)
+        self.lblRptHeader = QLabel("")
+        myLayout.addWidget(self.lblRptHeader)
+
+        # the report itself is a model; the view only paints the rows on screen
+        self.rptModel = CountSummaryModel(self)
+        self.rptView = QTreeView()
+        self.rptView.setModel(self.rptModel)
+        self.rptView.setUniformRowHeights(True)
+        self.rptView.setAlternatingRowColors(True)
+        myLayout.addWidget(self.rptView)
 
         self.Excel_qdict = []
 
+        # reports are built on this pool, one at a time; a newer date supersedes whatever is in flight
+        self._buildPool = QThreadPool(self)
+        self._buildPool.setMaxThreadCount(1)
+        self._buildNum = 0
+        self._buildJob: CountSummaryBuildJob | None = None
+
         Rptvariation = None  # or 'REQ' for requested only - implement later
         self.buildReport(Rptvariation=Rptvariation)
     # __init__
@@ -406,231 +904,55 @@ class rptCountSummary(QWidget):
     @Slot()
     def buildReport(self, Rptvariation = None):
         """
-        Build the report for the selected date
-        """
-        def buildFieldList(ac, cs, mtl, orgname) -> list[Any]:
-            acCols = ac.c if hasattr(ac,"c") else ac
-            csCols = cs.c if hasattr(cs,"c") else cs
-            mtlCols = mtl.c if hasattr(mtl,"c") else mtl
-            fld_list = [
-                literal_column("0").label("id"),
-                csCols.id.label("cs_id"),
-                csCols.CountDate.label("cs_CountDate"),
-                csCols.Counter.label("cs_Counter"),
-                csCols.Priority.label("cs_Priority"),
-                csCols.ReasonScheduled.label("cs_ReasonScheduled"),
-                csCols.Requestor,
-                csCols.RequestFilled,
-                csCols.Notes.label("cs_Notes"),
-                acCols.id.label("ac_id"),
-                acCols.CountDate.label("ac_CountDate"),
-                acCols.CycCtID.label("ac_CycCtID"),
-                acCols.Counter.label("ac_Counter"),
-                acCols.LocationOnly.label("ac_LocationOnly"),
-                acCols.CTD_QTY_Expr.label("ac_CTD_QTY_Expr"),
-                acCols.LOCATION.label("ac_LOCATION"),
-                acCols.PKGID_Desc.label("ac_PKGID_Desc"),
-                acCols.TAGQTY.label("ac_TAGQTY"),
-                acCols.FLAG_PossiblyNotRecieved,
-                acCols.FLAG_MovementDuringCount,
-                acCols.Notes.label("ac_Notes"),
-                mtlCols.id.label("matl_id"),
-                mtlCols.org_id,
-                # literal("(SELECT name FROM organizations WHERE organizations.id = "+str(mtl.org_id)+")").label("OrgName"),
-                literal(orgname).label("OrgName"),
-                # mtl.Material_org.label("Matl_PartNum"),
-                (literal(orgname)+literal("-")+mtlCols.Material).label("Matl_PartNum"),
-                mtlCols.PartType_id.label("PartType"),  #TODO: join to PartTypes to get the name
-                mtlCols.Description,
-                mtlCols.TypicalContainerQty,
-                mtlCols.TypicalPalletQty,
-                mtlCols.Notes.label("mtl_Notes"),
-            ]
-            return fld_list
-        # buildFieldList
-
+        Start building the report for the selected date on the build pool.
+        Any build still in flight is cancelled; if it finishes anyway, its result is ignored.
+        """
         countDate = self.clndrCountDate.selectedDate().toPython()
         assert isinstance(countDate, date), "countDate is not a date"
-        SAP_SOH = fnSAPList(countDate)
-        SummaryReport = []
-
-        for org in [rec.id for rec in Repository(get_app_sessionmaker(), Organizations).get_all()]:
-            orgname = Repository(get_app_sessionmaker(), Organizations).get_by_id(org).orgname      # type: ignore
-
-            ###### PART A: Records Scheduled and Counted ######        
-            # 1. Define Aliases
-            cs = aliased(CountSchedule, name='cs')
-            mtl = aliased(MaterialList, name='mtl')
-
-            # 2. Handle the ActualCounts subquery: (SELECT * FROM WICS_actualcounts WHERE not LocationOnly)
-            ac = (
-                select(ActualCounts)
-                .where(ActualCounts.LocationOnly == False)
-                .subquery(name='ac')
-            )
-
-            # 3. Define the Field List with exact Labels
-            fld_list = buildFieldList(ac, cs, mtl, orgname)
-
-            # 4. Build the Query
-            stmt = (
-                select(*fld_list)
-                .select_from(cs)
-                .join(mtl, ac.c.Material_id == mtl.id) # Matches: ac.Material_id=mtl.id
-                .join(ac, and_(
-                    cs.CountDate == ac.c.CountDate,
-                    cs.Material_id == ac.c.Material_id
-                ))
-                .where(
-                    # date_condition: (ac.CountDate = ? OR cs.CountDate = ?)
-                    or_(
-                        ac.c.CountDate == countDate,
-                        cs.CountDate == countDate
-                    ),
-                    # org_condition
-                    mtl.org_id == org
-                )
-            )
-
-            # Add dynamic Rptvariation filter
-            if Rptvariation == 'REQ':
-                stmt = stmt.where(cs.Requestor.is_not(None))
-
-            # Order by the label we created
-            stmt = stmt.order_by(literal_column("Matl_PartNum"))
-
-            with get_app_session() as session:
-                rslt = session.execute(stmt)
-                # Note: rslt.detach() is rarely used in SQLAlchemy 2.0 unless 
-                # using specific legacy drivers; usually rslt.all() is safer.
-                partA_qs = rslt.all()
-            # end with get_app_session
-
-            # 5. Process the Query Results
-            ttl = 'Scheduled and Counted'
-            if Rptvariation == 'REQ':
-                ttl = 'Requested and Counted'
-            SummaryReport.append({
-                        'org':org,
-                        'OrgName':orgname,
-                        'Title':ttl,
-                        'outputrows': self.CreateOutputRows(partA_qs, SAP_SOH, self.Excel_qdict),
-                        })
-
 
-            ###### PART B: Records UnScheduled but Counted ######        
-            # 1. Define Aliases
-            cs = aliased(CountSchedule, name='cs')
-            mtl = aliased(MaterialList, name='mtl')
-            ac = aliased(ActualCounts, name='ac')
-
-            # no step 2 since we are using ac directly
-
-            # 3. Define the Field List with exact Labels
-            fld_list = buildFieldList(ac, cs, mtl, orgname)
-
-            # 4. Build the Query
-            stmt = (
-                select(*fld_list)
-                .select_from(ac)
-                .join(mtl, ac.Material_id == mtl.id) # Matches
-                .outerjoin(cs, and_(
-                    cs.CountDate == ac.CountDate,
-                    cs.Material_id == ac.Material_id
-                ))
-                .where(
-                    ac.LocationOnly == False,
-                    # date_condition: (ac.CountDate = ? OR cs.CountDate = ?)
-                    or_(
-                        ac.CountDate == countDate,
-                        cs.CountDate == countDate
-                    ),
-                    # org_condition
-                    mtl.org_id == org,
-                    cs.id.is_(None) # unscheduled only
-                )
-            )
-
-            # Order by the label we created
-            stmt = stmt.order_by(literal_column("Matl_PartNum"))
-
-            with get_app_session() as session:
-                rslt = session.execute(stmt)
-                # Note: rslt.detach() is rarely used in SQLAlchemy 2.0 unless 
-                # using specific legacy drivers; usually rslt.all() is safer.
-                partB_qs = rslt.all()
-            # end with get_app_session
-
-            # 5. Process the Query Results
-            ttl = 'UnScheduled'
-            SummaryReport.append({
-                        'org':org,
-                        'OrgName':orgname,
-                        'Title':ttl,
-                        'outputrows': self.CreateOutputRows(partB_qs, SAP_SOH, self.Excel_qdict),
-                        })
-
-            ###### PART C: Records Scheduled but not Counted ######
-            # 1. Define Aliases
-            cs = aliased(CountSchedule, name='cs')
-            mtl = aliased(MaterialList, name='mtl')
-
-            # 2. Handle the ActualCounts subquery: (SELECT * FROM WICS_actualcounts WHERE not LocationOnly)
-            ac = (
-                select(ActualCounts)
-                .where(ActualCounts.LocationOnly == False)
-                .subquery(name='ac')
-            )
+        self.cancelBuild()
+        self._buildNum += 1
+        job = CountSummaryBuildJob(self._buildNum, countDate, Rptvariation)
+        job.signals.finished.connect(self.buildFinished)
+        job.signals.failed.connect(self.buildFailed)
+        self._buildJob = job
+        self.lblSAPDate.setText(f"SAP Data Date: ... building report for {countDate:%Y-%m-%d} ...")
+        self._buildPool.start(job)
+    # buildReport
 
-            # 3. Define the Field List with exact Labels
-            fld_list = buildFieldList(ac, cs, mtl, orgname)
-
-            # 4. Build the Query
-            stmt = (
-                select(*fld_list)
-                .select_from(cs)
-                .join(mtl, cs.Material_id == mtl.id) # Matches
-                .outerjoin(ac, and_(
-                    cs.CountDate == ac.c.CountDate,
-                    cs.Material_id == ac.c.Material_id
-                ))
-                .where(
-                    # date_condition: (ac.CountDate = ? OR cs.CountDate = ?)
-                    or_(
-                        ac.c.CountDate == countDate,
-                        cs.CountDate == countDate
-                    ),
-                    # org_condition
-                    mtl.org_id == org,
-                    ac.c.id.is_(None),  # not counted
-                )
-            )
+    def cancelBuild(self):
+        """
+        cancel the build in flight, if any, and drop any that haven't started
+        """
+        self._buildPool.clear()
+        if self._buildJob is not None:
+            self._buildJob.cancel()
+            self._buildJob = None
+    # cancelBuild
+
+    @Slot(int, str)
+    def buildFailed(self, buildNum: int, errmsg: str):
+        if buildNum != self._buildNum:
+            return      # superseded
+        self._buildJob = None
+        self.rptModel.setReport(None, None, [])
+        self.lblSAPDate.setText("SAP Data Date: N/A")
+        self.lblRptHeader.setText(f"Count Summary could not be built: {errmsg}")
+    # buildFailed
+
+    @Slot(int, object)
+    def buildFinished(self, buildNum: int, rpt: dict):
+        """
+        show a finished build - back on the GUI thread
+        """
+        if buildNum != self._buildNum:
+            return      # superseded by a later date
+        self._buildJob = None
 
-            # Add dynamic Rptvariation filter
-            if Rptvariation == 'REQ':
-                stmt = stmt.where(cs.Requestor.is_not(None))
-
-            # Order by the label we created
-            stmt = stmt.order_by(literal_column("Matl_PartNum"))
-
-            with get_app_session() as session:
-                rslt = session.execute(stmt)
-                # Note: rslt.detach() is rarely used in SQLAlchemy 2.0 unless 
-                # using specific legacy drivers; usually rslt.all() is safer.
-                partC_qs = rslt.all()
-            # end with get_app_session
-
-            # 5. Process the Query Results
-            ttl = 'Scheduled but Not Counted'
-            if Rptvariation == 'REQ':
-                ttl = 'Requested but Not Counted'
-            SummaryReport.append({
-                        'org':org,
-                        'OrgName':orgname,
-                        'Title':ttl,
-                        'outputrows': self.CreateOutputRows(partC_qs, SAP_SOH, self.Excel_qdict),
-                        })
-        # end for org
+        countDate = rpt['CountDate']
+        Rptvariation = rpt['Rptvariation']
+        SummaryReport = rpt['SummaryReport']
+        self.Excel_qdict = rpt['Excel_qdict']
 
         AccuracyCutoff = {          # TODO: make a parameter later
             'DANGER': 70.0,
@@ -661,12 +983,12 @@ class rptCountSummary(QWidget):
         self.displayReport(
             Rptvariation,
             CountDate=countDate,
-            SAPDate=SAP_SOH['SAPDate'],
+            SAPDate=rpt['SAPDate'],
             AccuracyCutoff=AccuracyCutoff,
             SummaryReport=SummaryReport,
             ExcelFileName=ExcelFileName
         )
-    # buildReport
+    # buildFinished
 
     def displayReport(
         self,
@@ -690,149 +1012,36 @@ class rptCountSummary(QWidget):
             'ExcelFileName': ExcelFileName,
         }
         """
-        def horizontalLine()->QFrame:
-            horizontalLine = QFrame()
-            horizontalLine.setFrameShape(QFrame.Shape.HLine)
-            horizontalLine.setFrameShadow(QFrame.Shadow.Sunken)
-            horizontalLine.setStyleSheet("QFrame { border: 3px solid black; }")
-            return horizontalLine
-        # horizontalLine
-
-        # for now, just print to console
-        outputMedium = self.layoutMainArea
-
-        clearLayout(outputMedium)        # clear any existing widgets
         self.lblSAPDate.setText("SAP Data Date: "+ (SAPDate.isoformat() if SAPDate else "N/A"))
+        self.lblRptHeader.setText(
+            f"Accuracy Cutoff: {AccuracyCutoff}<br>"
+            f"Excel File: {ExcelFileName}<br>"
+            f"Count Summary Report for Count Date: {CountDate:%Y-%m-%d}"
+            )
 
-        #temporary until better formatting is done
-        outputMedium.addWidget(QLabel(f"Accuracy Cutoff: {AccuracyCutoff}"))
-        outputMedium.addWidget(QLabel(f"Excel File: {ExcelFileName}"))
-        outputMedium.addWidget(horizontalLine())    # horizontal line
-        outputMedium.addWidget(QLabel(f"Count Summary Report for Count Date: {CountDate:%Y-%m-%d}"))
-        outputMedium.addWidget(QLabel(self.lblSAPDate.text()))
-        outputMedium.addWidget(QLabel(" "))   # blank line
-
-        prevValues = {}
-        forloop_first_rptSection = True
-        org_has_data = False
-        for rptSection in SummaryReport:
-            # has the organization changed?
-            if rptSection['org'] != prevValues.get('rptSection-org'):
-                if not forloop_first_rptSection:
-                    # did previous section have data?
-                    if not org_has_data:
-                        outputMedium.addWidget(QLabel("    NO COUNTS"))
-                    # add a spacer between organizations
-                    outputMedium.addWidget(horizontalLine())
-                # end if not forloop_first
-                lineToAdd = ""
-                lineToAdd += f" <h2><u>Organization: {rptSection['OrgName']}</u></h2>"
-                outputMedium.addWidget(QLabel(lineToAdd))
-                org_has_data = False
-
-                prevValues['rptSection-org'] = rptSection['org']
-            # end if org changed
-
-            if not rptSection['outputrows']:
-                # no data for this section
-                # lineToAdd = f"No data for section: {rptSection['Title']}"
-                # outputMedium.addWidget(QLabel(lineToAdd))
-                forloop_first_rptSection = False
-                continue
-            #end if no outputrows
-            org_has_data = True
-
-            # Header for this section
-            outputMedium.addWidget(QLabel(""))   # blank line
-
-            lineToAdd = "<h3>"
-            lineToAdd += "Counts"
-            lineToAdd += f" {rptSection['Title']}"
-            lineToAdd += "</h3>"
-            outputMedium.addWidget(QLabel(lineToAdd))
-
-            for outputline in rptSection['outputrows']:
-                if outputline['Material_id'] != prevValues.get('Material-id'):
-                    diviLine = QLabel("  ")
-                    outputMedium.addWidget(diviLine)
-                    wdgtToAdd = QLabel(f"<h4><u>Material: {outputline['Material']} - {outputline['Description']}</u></h4>")
-                    outputMedium.addWidget(wdgtToAdd)
-
-                    wdgtToAdd = QWidget()
-                    layoutL = QHBoxLayout(wdgtToAdd)
-                    #TODO: better formatting here
-                    layoutL.addWidget(QLabel("<b>Count Date</b>"))
-                    layoutL.addWidget(QLabel("<b>Material</b>"))
-                    layoutL.addWidget(QLabel("<b>Counter</b>"))
-                    layoutL.addWidget(QLabel("<b>LOCATION</b>"))
-                    layoutL.addWidget(QLabel("<b>PKG ID/Desc</b>"))
-                    layoutL.addWidget(QLabel("<b>TAG QTY</b>"))
-                    outputMedium.addWidget(wdgtToAdd)
-                # endif material changed
-
-                if outputline['type'] == 'Detail':
-                    wdgtToAdd = QWidget()
-                    layoutL = QHBoxLayout(wdgtToAdd)
-                    #TODO: better formatting here
-                    layoutL.addWidget(QLabel(f"{CountDate:%m/%d}"))
-                    layoutL.addWidget(QLabel(f"{outputline['Material']}"))
-                    layoutL.addWidget(QLabel(f"{outputline['ActCounter']}"))
-                    layoutL.addWidget(QLabel(f"{outputline['LOCATION']}"))
-                    layoutL.addWidget(QLabel(f"{outputline['PKGID']}"))
-                    layoutL.addWidget(QLabel(f"{outputline['TAGQTY']}"))
-                    outputMedium.addWidget(wdgtToAdd)
-
-                    if outputline['ActCountNotes']:
-                        wdgtToAdd = QLabel(f"   Count Notes: {outputline['ActCountNotes']}")
-                        outputMedium.addWidget(wdgtToAdd)
-                    wdgtToAdd = QLabel(f"Actual Count: {outputline['CTD_QTY_Expr']} = <b>{outputline['CTD_QTY_Eval']}</b>")
-                    wdgtToAdd.setAlignment(Qt.AlignmentFlag.AlignRight)
-                    outputMedium.addWidget(wdgtToAdd)
-
-                    wdgtToAdd = QLabel("")
-                    if outputline['PossNotRec']:
-                        wdgtToAdd.setText(wdgtToAdd.text() + " | Possibly Not Received |")
-                    if outputline['MovDurCt']:
-                        wdgtToAdd.setText(wdgtToAdd.text() + " | Movement During Count |")
-                    wdgtToAdd.setAlignment(Qt.AlignmentFlag.AlignHCenter)
-                    if wdgtToAdd.text():
-                        outputMedium.addWidget(wdgtToAdd)
-
-                elif outputline['type'] == 'Summary':
-                    lblSummary = QLabel(
-                        f"Material: {outputline['Material']} | "
-                        f"Counted Total: {outputline['CountTotal']} | "
-                        f"SAP Total: {outputline['SAPTotal']} | "
-                        f"Diff: {outputline['Diff']} | "
-                        f"Accuracy: {outputline['Accuracy']:.2f}%"
-                    )
-                    outputMedium.addWidget(lblSummary)
-                    #TODO: better formatting here, print Scheduled Counter and Requestor info too
-                # end if outputline type
-
-                prevValues['Material-id'] = outputline['Material_id']
-            # end for outputline in rptSection['outputrows']
-
-            outputMedium.addWidget(horizontalLine())
-            forloop_first_rptSection = False
-        # end for rptSection
-
-        # footer for last section
-        # did previous section have data?
-        if not org_has_data:
-            outputMedium.addWidget(QLabel("    NO COUNTS"))
-        # add a spacer between organizations
-        outputMedium.addWidget(horizontalLine())
+        self.rptModel.setReport(CountDate, SAPDate, SummaryReport)
+        self.rptView.expandAll()
+        self.rptView.resizeColumnToContents(0)
     # displayReport
 
+    def closeEvent(self, event):
+        # don't leave a build running against a closed form
+        self.cancelBuild()
+        self._buildPool.waitForDone()
+        super().closeEvent(event)
+    # closeEvent
+
     @Slot()
     def handlePrintPreview(self):
         """
         Handle print preview button click
+
+        The view only holds the rows on screen, so the preview prints the whole model, via CountSummaryModel.toHtml
         """
-        widgParent = self.layoutMainArea.parent()
-        assert isinstance(widgParent, QWidget), "layoutMainArea parent is not a QWidget"
-        manager = cPrintManager(widgParent)
-        manager.open_preview()
+        doc = QTextDocument(self)
+        doc.setHtml(self.rptModel.toHtml())
+        dlg = QPrintPreviewDialog(self)
+        dlg.paintRequested.connect(doc.print_)
+        dlg.exec()
     # handlePrintPreview
 # rptCountSummary
@@ -0,0 +1,872 @@
+from datetime import date
+import html
+import threading
+from typing import Any, Callable
+
+from PySide6.QtCore import QAbstractItemModel, QByteArray, QDate, QModelIndex, QObject, QPersistentModelIndex, QRunnable, QThreadPool, QUrl, Qt, Signal, Slot
+from PySide6.QtGui import QColor, QFont, QImage, QPainter, QTextDocument
+from PySide6.QtPrintSupport import QPrintPreviewDialog
+from PySide6.QtSvg import QSvgRenderer
+from PySide6.QtWidgets import QCalendarWidget, QHBoxLayout, QLabel, QProgressBar, QPushButton, QTreeView, QVBoxLayout, QWidget
+from sqlalchemy import select
+
+from app.barcodes import Barcodes
+from app.database import unitOfWork
+from app.progress import ProgressBus
+from app.models import (
+    ActualCounts, CountSchedule, Location_WorksheetZone, MaterialCountSummary, MaterialList, Organizations, WhsePartTypes, WorksheetZones,
+    fnRollMaterialCountSummary,
+    )
+from app.utils import fnSAPByMaterial, fnSAPList
+
+
+# what the Django worksheets passed Code128.render
+_barcodeWriterOptions = {'module_height': 7.0, 'module_width': 0.35, 'quiet_zone': 0.1, 'write_text': True, 'text_distance': 3.5}
+_locBarcodeWriterOptions = {'module_height': 7.0, 'module_width': 0.35, 'quiet_zone': 0.1, 'write_text': False}
+
+
+def _fmtQty(qty) -> str:
+    # the whole number (not :g's 6 significant digits) and up to 3 decimal places; a whole quantity shows none
+    qty = round(qty or 0, 3)
+    if float(qty).is_integer():
+        return f'{int(qty):,}'
+    return f'{qty:,.3f}'.rstrip('0')
+# _fmtQty
+
+
+class CountWorksheetEngine:
+    """
+    builds the Count Worksheet (Counting Agenda) for a CountDate: every scheduled Material, by Counter,
+    with where and when it was last found and its SAP quantity
+
+    The Django CountWorksheetReport looked up VIEW_materials twice and filtered the SAP list once per
+    scheduled Material, and wrote an async_comm row for each. Here the schedule, the last found
+    locations and the SAP snapshot are each one query, whatever the size of the schedule
+    (the last count date and locations come from MaterialCountSummary), and progress goes to a callback.
+    """
+    def __init__(self, CountDate: date):
+        self.CountDate = CountDate
+    # __init__
+
+    def buildQuery(self):
+        """
+        the scheduled Materials, with their Material, org, part type and count summary,
+        ordered by Counter, Material
+        """
+        cs = CountSchedule
+        mtl = MaterialList
+        return (
+            select(
+                cs.id.label('cs_id'), cs.Counter, cs.Priority, cs.Requestor, cs.RequestFilled,
+                cs.ReasonScheduled, cs.Notes.label('cs_Notes'),
+                mtl.id.label('Material_id'), mtl.Material, mtl.Description,
+                mtl.TypicalContainerQty, mtl.TypicalPalletQty, mtl.Notes.label('mtl_Notes'),
+                Organizations.orgname.label('OrgName'),
+                WhsePartTypes.WhsePartType.label('PartType'),
+                MaterialCountSummary.LastCountDate, MaterialCountSummary.LastFoundAt,
+                )
+            .select_from(cs)
+            .join(mtl, cs.Material_id == mtl.id)
+            .outerjoin(Organizations, mtl.org_id == Organizations.id)
+            .outerjoin(WhsePartTypes, mtl.PartType_id == WhsePartTypes.id)
+            .outerjoin(MaterialCountSummary, MaterialCountSummary.Material_id == mtl.id)
+            .where(cs.CountDate == self.CountDate)
+            .order_by(cs.Counter, mtl.Material, Organizations.orgname)
+            )
+    # buildQuery
+
+    def buildLocationQuery(self):
+        """
+        each scheduled Material's last found locations (VIEW_LastFoundAtList for the schedule), ordered by location
+        """
+        ac = ActualCounts
+        return (
+            select(ac.Material_id, ac.CountDate, ac.LOCATION.label('FoundAt')).distinct()
+            .select_from(MaterialCountSummary)
+            .join(ac, (ac.Material_id == MaterialCountSummary.Material_id) & (ac.CountDate == MaterialCountSummary.LastCountDate))
+            .where(MaterialCountSummary.Material_id.in_(
+                select(CountSchedule.Material_id).where(CountSchedule.CountDate == self.CountDate)
+                ))
+            .order_by(ac.LOCATION, ac.Material_id)
+            )
+    # buildLocationQuery
+
+    def build(self, progress: Callable[[int, int, str], None] | None = None, isCancelled: Callable[[], bool] | None = None) -> dict | None:
+        """
+        run the worksheet queries and render the barcodes
+
+        returns {'CountDate', 'SAPDate', 'Counters', 'Barcodes'}:
+            Counters is a list, in Counter order, of {'Counter', 'Lines', 'Locations'} - Lines the scheduled
+                Materials (dicts), Locations (FoundAt, CountDate, Material_org) in FoundAt order
+            Barcodes is {Material_org: SVG}
+
+        progress(done, total, text) is called as the build goes; isCancelled is polled between steps,
+        and if it returns True, build stops and returns None. Nothing here touches a widget,
+        so build can run on a worker thread.
+        """
+        if progress is None:
+            progress = lambda done, total, text: None
+        if isCancelled is None:
+            isCancelled = lambda: False
+
+        nSteps = 3
+        progress(0, nSteps, 'Reading Count Schedule')
+        with unitOfWork() as uow:
+            # summaries whose next scheduled count has gone by are brought up to date first
+            fnRollMaterialCountSummary(uow.session)
+            schedRows = uow.session.execute(self.buildQuery()).all()
+            if isCancelled(): return None
+
+            progress(1, nSteps, 'Collecting List of Locations')
+            locRows = uow.session.execute(self.buildLocationQuery()).all()
+            if isCancelled(): return None
+
+            progress(2, nSteps, 'Reading SAP')
+            matlIDs = sorted({rawrow.Material_id for rawrow in schedRows})
+            SAP_SOH = fnSAPList(self.CountDate, matl=matlIDs, ssnmaker=uow.sessionmaker) if matlIDs else {'SAPDate': None, 'SAPTable': []}
+            SAPByMatl = fnSAPByMaterial(SAP_SOH['SAPTable'])
+        # endwith uow
+        if isCancelled(): return None
+
+        FoundAtByMatl: dict[int, list[str]] = {}
+        for rawrow in locRows:
+            FoundAtByMatl.setdefault(rawrow.Material_id, []).append(rawrow.FoundAt)
+
+        Counters: list[dict] = []
+        CounterOf: dict[int, Any] = {}
+        MatlOrg: dict[int, str] = {}
+        for rawrow in schedRows:
+            if not Counters or Counters[-1]['Counter'] != rawrow.Counter:
+                Counters.append({'Counter': rawrow.Counter, 'Lines': [], 'Locations': []})
+            strMatlNum = f'{rawrow.OrgName}-{rawrow.Material}'
+            MatlOrg[rawrow.Material_id] = strMatlNum
+            CounterOf.setdefault(rawrow.Material_id, rawrow.Counter)
+            Counters[-1]['Lines'].append({
+                'cs_id': rawrow.cs_id,
+                'Counter': rawrow.Counter,
+                'Priority': rawrow.Priority,
+                'Requestor': rawrow.Requestor,
+                'RequestFilled': rawrow.RequestFilled,
+                'ReasonScheduled': rawrow.ReasonScheduled,
+                'SchedNotes': rawrow.cs_Notes,
+                'Material_id': rawrow.Material_id,
+                'Material_org': strMatlNum,
+                'OrgName': rawrow.OrgName,
+                'Description': rawrow.Description,
+                'PartType': rawrow.PartType,
+                'TypicalContainerQty': rawrow.TypicalContainerQty,
+                'TypicalPalletQty': rawrow.TypicalPalletQty,
+                'MatlNotes': rawrow.mtl_Notes,
+                'LastCountDate': rawrow.LastCountDate,
+                'LastFoundAt': rawrow.LastFoundAt,
+                'FoundAt': FoundAtByMatl.get(rawrow.Material_id, []),
+                'SAPQty': SAPByMatl.get(rawrow.Material_id, ([], 0))[1],
+                })
+        # endfor rawrow
+
+        # the locations page of each Counter (as VIEW_LastFoundAtList annotated with the scheduled Counter)
+        CounterIndex = {ctr['Counter']: ctr for ctr in Counters}
+        for rawrow in locRows:
+            CounterIndex[CounterOf[rawrow.Material_id]]['Locations'].append((rawrow.FoundAt, rawrow.CountDate, MatlOrg[rawrow.Material_id]))
+
+        # one barcode per Material, not per line; Materials on earlier worksheets come from the barcode cache
+        strMatls = sorted(set(MatlOrg.values()))
+        MatlBarcodes = Barcodes.renderMany(
+            strMatls, _barcodeWriterOptions,
+            progress=lambda done, total: progress(done, total, f'Preparing barcodes: {done} of {total}'),
+            isCancelled=isCancelled,
+            )
+        if MatlBarcodes is None: return None
+        progress(len(strMatls), len(strMatls), 'Formatting Worksheet')
+
+        return {
+            'CountDate': self.CountDate,
+            'SAPDate': SAP_SOH['SAPDate'],
+            'Counters': Counters,
+            'Barcodes': MatlBarcodes,
+            }
+    # build
+# CountWorksheetEngine
+
+class CountWorksheetBuildSignals(QObject):
+    """
+    signals for CountWorksheetBuildJob - a QRunnable isn't a QObject, so it can't carry its own
+    """
+    progress = Signal(int, int, int, str)   # build number, done, total, what's being done
+    finished = Signal(int, object)          # build number, the engine's build result
+    failed = Signal(int, str)               # build number, error description
+# CountWorksheetBuildSignals
+
+class CountWorksheetBuildJob(QRunnable):
+    """
+    runs a worksheet engine's build on a QThreadPool thread; progress and the result come back
+    through signals, which Qt queues to the GUI thread - no async_comm records to write and poll.
+    Progress is also published, throttled, on the progress bus as source
+
+    cancel() is cooperative: the engine polls it between steps and gives up early. A cancelled
+    job emits nothing more.
+    """
+    def __init__(self, buildNum: int, CountDate: date, engineClass: type | None = None, source: str | None = None):
+        super().__init__()
+        self.buildNum = buildNum
+        self.CountDate = CountDate
+        self.engineClass = CountWorksheetEngine if engineClass is None else engineClass
+        self._busProgress = ProgressBus.publisher(self.engineClass.__name__ if source is None else source)
+        self.signals = CountWorksheetBuildSignals()
+        self._cancelled = threading.Event()
+    # __init__
+
+    def cancel(self):
+        self._cancelled.set()
+    # cancel
+
+    def isCancelled(self) -> bool:
+        return self._cancelled.is_set()
+    # isCancelled
+
+    def _progress(self, done: int, total: int, text: str):
+        if not self.isCancelled():
+            self.signals.progress.emit(self.buildNum, done, total, text)
+            self._busProgress.update(text, done, total)
+    # _progress
+
+    def run(self):
+        if self.isCancelled():
+            return
+        try:
+            rpt = self.engineClass(self.CountDate).build(progress=self._progress, isCancelled=self.isCancelled)
+        except Exception as ex:     # pylint: disable=broad-exception-caught
+            if not self.isCancelled():
+                self.signals.failed.emit(self.buildNum, repr(ex))
+            return
+        # endtry
+        if rpt is not None and not self.isCancelled():
+            self._busProgress.finish(f'Count Worksheet for {self.CountDate:%Y-%m-%d} ready')
+            self.signals.finished.emit(self.buildNum, rpt)
+    # run
+# CountWorksheetBuildJob
+
+class CountWorksheetModel(QAbstractItemModel):
+    """
+    The Count Worksheet as a tree model: Counter > scheduled Material.
+    toHtml renders the printable worksheet - a sheet per Material, then each Counter's Material and Location lists
+    """
+    _columns = [
+        'Counter / Material', 'Description', 'Part Type', 'Priority',
+        'Last Found On', 'Last Found At', 'SAP Qty', 'Reason Scheduled', 'Notes',
+        ]
+    _numericColumns = {6}
+
+    class Node:
+        def __init__(self, parent, text: str = '', line: dict | None = None):
+            self.parent = parent
+            self.row = len(parent.children) if parent is not None else 0
+            self.children: list = []
+            self.text = text
+            self.line = line
+            if parent is not None:
+                parent.children.append(self)
+        # __init__
+    # Node
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.CountDate: date | None = None
+        self.SAPDate: date | None = None
+        self.Counters: list[dict] = []
+        self._root = self.Node(None)
+    # __init__
+
+    def setWorksheet(self, CountDate: date | None, SAPDate: date | None, Counters: list[dict]):
+        """
+        replace the model contents with a CountWorksheetEngine worksheet
+        """
+        self.beginResetModel()
+        self.CountDate = CountDate
+        self.SAPDate = SAPDate
+        self.Counters = Counters
+        self._root = root = self.Node(None)
+        for ctr in Counters:
+            ctrNode = self.Node(root, f"{ctr['Counter'] or '(no Counter)'} - {len(ctr['Lines'])} Materials")
+            for line in ctr['Lines']:
+                self.Node(ctrNode, line['Material_org'], line)
+        # endfor ctr
+        self.endResetModel()
+    # setWorksheet
+
+    def nScheduled(self) -> int:
+        return sum(len(ctr['Lines']) for ctr in self.Counters)
+    # nScheduled
+
+    def barcodeResources(self) -> list[tuple[str, str]]:
+        """
+        (barcodeURL, barcode text) for every barcode toHtml uses
+        """
+        return [(self.barcodeURL(line['Material_id']), line['Material_org']) for ctr in self.Counters for line in ctr['Lines']]
+    # barcodeResources
+
+    def _node(self, index: QModelIndex | QPersistentModelIndex):
+        return index.internalPointer() if index.isValid() else self._root
+    # _node
+
+    def index(self, row: int, column: int, parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> QModelIndex:
+        parentNode = self._node(parent)
+        if not (0 <= row < len(parentNode.children) and 0 <= column < len(self._columns)):
+            return QModelIndex()
+        return self.createIndex(row, column, parentNode.children[row])
+    # index
+
+    def parent(self, index: QModelIndex | QPersistentModelIndex = QModelIndex()) -> QModelIndex:     # type: ignore[override]
+        if not index.isValid():
+            return QModelIndex()
+        parentNode = index.internalPointer().parent
+        if parentNode is None or parentNode is self._root:
+            return QModelIndex()
+        return self.createIndex(parentNode.row, 0, parentNode)
+    # parent
+
+    def rowCount(self, parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> int:
+        if parent.isValid() and parent.column() != 0:
+            return 0
+        return len(self._node(parent).children)
+    # rowCount
+
+    def columnCount(self, parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> int:
+        return len(self._columns)
+    # columnCount
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self._columns[section]
+        return None
+    # headerData
+
+    def cellText(self, node, column: int) -> str:
+        line = node.line
+        if column == 0:
+            return node.text
+        if line is None:
+            return ''
+        if   column == 1: return str(line['Description'] or '')
+        elif column == 2: return str(line['PartType'] or 'NO PART TYPE')
+        elif column == 3: return str(line['Priority'] or '---')
+        elif column == 4: return f"{line['LastCountDate']:%Y-%m-%d}" if line['LastCountDate'] else '---'
+        elif column == 5: return str(line['LastFoundAt'] or '---')
+        elif column == 6: return _fmtQty(line['SAPQty'])
+        elif column == 7: return str(line['ReasonScheduled'] or '')
+        elif column == 8: return str(line['SchedNotes'] or '')
+        return ''
+    # cellText
+
+    def data(self, index: QModelIndex | QPersistentModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.cellText(node, index.column())
+        if role == Qt.ItemDataRole.FontRole and node.line is None:
+            font = QFont()
+            font.setBold(True)
+            return font
+        if role == Qt.ItemDataRole.TextAlignmentRole and index.column() in self._numericColumns:
+            return int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return None
+    # data
+
+    @staticmethod
+    def barcodeURL(Material_id: int) -> str:
+        # the name the worksheet HTML uses for a Material's barcode image (see rptCountWorksheet.handlePrintPreview)
+        return f"barcode:{Material_id}"
+    # barcodeURL
+
+    def toHtml(self) -> str:
+        """
+        the worksheet as HTML, laid out as the Django rpt_CountWksht_main.html was, for printing.
+        Barcodes are <img>s named by barcodeURL; the document they go in must have them as resources
+        """
+        esc = html.escape
+        CountDate = f"{self.CountDate:%Y-%m-%d}" if self.CountDate else ''
+        pageBreak = ' style="page-break-before: always"'
+        blankRow = '<tr><td height="60"></td><td></td><td></td></tr>'
+        out = []
+        for n, ctr in enumerate(self.Counters):
+            Counter = esc(ctr['Counter'] or '')
+            out.append(f'<h2{pageBreak if n else ""}>{Counter} Counting Agenda/Worksheet for {CountDate}</h2>')
+            for line in ctr['Lines']:
+                yn = {True: 'yes', False: 'no'}.get(line['RequestFilled'], '---')
+                out.append(
+                    f'<p><img src="{self.barcodeURL(line["Material_id"])}"> '
+                    f'<big>{esc(line["OrgName"] or "")} Material {esc(line["Material_org"])}</big><br>'
+                    f'{CountDate} | {esc(line["PartType"] or "NO PART TYPE")} | Prio: <b>{esc(line["Priority"] or "---")}</b> | '
+                    f'Sched Counter: {esc(line["Counter"] or "---")} | {esc(line["Description"] or "")}<br>'
+                    f'Typical Container Qty = {esc(str(line["TypicalContainerQty"]))}, Typical Pallet Qty = {esc(str(line["TypicalPalletQty"]))} | '
+                    f'Last Found On {line["LastCountDate"] or "---"} At {esc(line["LastFoundAt"] or "---")}<br>'
+                    f'<small>dbid {line["cs_id"]} | Requestor: {esc(line["Requestor"] or "")} | RequestFilled: {yn} | '
+                    f'Reason Scheduled: {esc(line["ReasonScheduled"] or "")} | Notes: {esc(line["SchedNotes"] or "")} | SAP Qty: {_fmtQty(line["SAPQty"])}'
+                    + (f'<br>Material Notes: {esc(line["MatlNotes"])}' if line['MatlNotes'] else '')
+                    + '</small></p>'
+                    )
+                out.append('<p><big>Act Cntr: ________________________ Date: _____________</big></p>')
+                out.append('<table border="1" cellspacing="0" cellpadding="2" width="100%">'
+                    '<tr><th width="20%">LOCATION</th><th width="60%">CTD_QTY_Expr</th><th width="20%">Notes</th></tr>')
+                out.extend(f'<tr><td height="60" valign="top">{esc(loc)}</td><td></td><td></td></tr>' for loc in line['FoundAt'])
+                out.extend([blankRow] * 4)
+                out.append('</table><hr>')
+            # endfor line
+
+            out.append(f'<h3{pageBreak}><u>{Counter} Materials</u></h3><ul>')
+            out.extend(f'<li><img src="{self.barcodeURL(line["Material_id"])}"> {esc(line["Material_org"])}</li>' for line in ctr['Lines'])
+            out.append('</ul>')
+            out.append(f'<h3{pageBreak}><u>{Counter} Locations</u></h3>'
+                '<p><small><i>Material may be in locations not listed here</i></small></p><ul>')
+            out.extend(f'<li>{esc(FoundAt)} | {ctDate} | {esc(strMatlNum)}</li>' for FoundAt, ctDate, strMatlNum in ctr['Locations'])
+            out.append('</ul>')
+        # endfor ctr
+        return '\n'.join(out)
+    # toHtml
+# CountWorksheetModel
+
+class rptCountWorksheet(QWidget):
+    """
+    Count Worksheet - the counting agenda for a Count Date, one sheet per scheduled Material
+    """
+    _formname = "Count Worksheet"
+    _engineClass: type = CountWorksheetEngine
+    _modelClass: type = CountWorksheetModel
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.setWindowTitle(self._formname)
+        myLayout = QVBoxLayout(self)
+        myLayout.addWidget(QLabel(self._formname))
+
+        wdgtCountDate = QWidget()
+        layoutCountDate = QHBoxLayout(wdgtCountDate)
+        self.clndrCountDate = QCalendarWidget()
+        lblCountDate = QLabel("Count Date: "+self.clndrCountDate.selectedDate().toString("yyyy-MM-dd"+"  "))
+        self.clndrCountDate.setGridVisible(True)
+        self.clndrCountDate.setVerticalHeaderFormat(QCalendarWidget.VerticalHeaderFormat.NoVerticalHeader)
+        self.clndrCountDate.setMinimumDate(QDate(2000,1,1))
+        self.clndrCountDate.setMaximumDate(QDate(2199,12,31))
+        self.clndrCountDate.selectionChanged.connect(
+            lambda: lblCountDate.setText("Count Date: "+self.clndrCountDate.selectedDate().toString("yyyy-MM-dd"))
+            )
+        self.clndrCountDate.selectionChanged.connect(self.buildWorksheet)
+        layoutCountDate.addWidget(lblCountDate)
+        layoutCountDate.addWidget(self.clndrCountDate)
+        myLayout.addWidget(wdgtCountDate)
+
+        self.btnPrintPreview = QPushButton("Print Preview")
+        self.btnPrintPreview.clicked.connect(self.handlePrintPreview)
+        myLayout.addWidget(self.btnPrintPreview)
+
+        self.lblSAPDate = QLabel("SAP Data Date: N/A")
+        myLayout.addWidget(self.lblSAPDate)
+
+        self.lblStatus = QLabel("")
+        myLayout.addWidget(self.lblStatus)
+        self.prgBuild = QProgressBar()
+        myLayout.addWidget(self.prgBuild)
+
+        self.rptModel = self._modelClass(self)
+        self.rptView = QTreeView()
+        self.rptView.setModel(self.rptModel)
+        self.rptView.setUniformRowHeights(True)
+        self.rptView.setAlternatingRowColors(True)
+        myLayout.addWidget(self.rptView)
+
+        self.Barcodes: dict[str, bytes] = {}
+
+        # worksheets are built on this pool, one at a time; a newer date supersedes whatever is in flight
+        self._buildPool = QThreadPool(self)
+        self._buildPool.setMaxThreadCount(1)
+        self._buildNum = 0
+        self._buildJob: CountWorksheetBuildJob | None = None
+
+        self.buildWorksheet()
+    # __init__
+
+    @Slot()
+    def buildWorksheet(self):
+        """
+        Start building the worksheet for the selected date on the build pool.
+        Any build still in flight is cancelled; if it finishes anyway, its result is ignored.
+        """
+        countDate = self.clndrCountDate.selectedDate().toPython()
+        assert isinstance(countDate, date), "countDate is not a date"
+
+        self.cancelBuild()
+        self._buildNum += 1
+        job = CountWorksheetBuildJob(self._buildNum, countDate, self._engineClass, self._formname)
+        job.signals.progress.connect(self.buildProgress)
+        job.signals.finished.connect(self.buildFinished)
+        job.signals.failed.connect(self.buildFailed)
+        self._buildJob = job
+        self.btnPrintPreview.setEnabled(False)
+        self.lblStatus.setText(f"building the worksheet for {countDate:%Y-%m-%d} ...")
+        self.prgBuild.setRange(0, 0)
+        self._buildPool.start(job)
+    # buildWorksheet
+
+    def cancelBuild(self):
+        """
+        cancel the build in flight, if any, and drop any that haven't started
+        """
+        self._buildPool.clear()
+        if self._buildJob is not None:
+            self._buildJob.cancel()
+            self._buildJob = None
+    # cancelBuild
+
+    @Slot(int, int, int, str)
+    def buildProgress(self, buildNum: int, done: int, total: int, text: str):
+        if buildNum != self._buildNum:
+            return      # superseded
+        self.prgBuild.setRange(0, total)
+        self.prgBuild.setValue(done)
+        self.lblStatus.setText(text)
+    # buildProgress
+
+    @Slot(int, str)
+    def buildFailed(self, buildNum: int, errmsg: str):
+        if buildNum != self._buildNum:
+            return      # superseded
+        self._buildJob = None
+        self.rptModel.setWorksheet(None, None, [])
+        self.Barcodes = {}
+        self.prgBuild.setRange(0, 1)
+        self.prgBuild.reset()
+        self.lblSAPDate.setText("SAP Data Date: N/A")
+        self.lblStatus.setText(f"{self._formname} could not be built: {errmsg}")
+    # buildFailed
+
+    @Slot(int, object)
+    def buildFinished(self, buildNum: int, rpt: dict):
+        """
+        show a finished build - back on the GUI thread
+        """
+        if buildNum != self._buildNum:
+            return      # superseded by a later date
+        self._buildJob = None
+
+        self.Barcodes = rpt['Barcodes']
+        self.rptModel.setWorksheet(rpt['CountDate'], rpt['SAPDate'], rpt['Counters'])
+        self.rptView.expandAll()
+        self.rptView.resizeColumnToContents(0)
+        nLines = self.rptModel.nScheduled()
+        self.lblSAPDate.setText("SAP Data Date: "+ (rpt['SAPDate'].isoformat() if rpt['SAPDate'] else "N/A"))
+        self.lblStatus.setText(f"{self._formname} for {rpt['CountDate']:%Y-%m-%d}: {nLines} Materials scheduled")
+        self.prgBuild.setRange(0, 1)
+        self.prgBuild.setValue(1)
+        self.btnPrintPreview.setEnabled(nLines > 0)
+    # buildFinished
+
+    def closeEvent(self, event):
+        # don't leave a build running against a closed form
+        self.cancelBuild()
+        self._buildPool.waitForDone()
+        super().closeEvent(event)
+    # closeEvent
+
+    @staticmethod
+    def _barcodeImage(svg: bytes) -> QImage:
+        renderer = QSvgRenderer(QByteArray(svg))
+        img = QImage(renderer.defaultSize(), QImage.Format.Format_ARGB32)
+        img.fill(QColor('white'))
+        painter = QPainter(img)
+        renderer.render(painter)
+        painter.end()
+        return img
+    # _barcodeImage
+
+    @Slot()
+    def handlePrintPreview(self):
+        """
+        preview (and print) the whole worksheet, via the model's toHtml, with the barcodes as image resources
+        """
+        doc = QTextDocument(self)
+        images: dict[str, QImage] = {}
+        for url, text in self.rptModel.barcodeResources():
+            if text not in images:
+                images[text] = self._barcodeImage(self.Barcodes[text])
+            doc.addResource(QTextDocument.ResourceType.ImageResource, QUrl(url), images[text])
+        # endfor url
+        doc.setHtml(self.rptModel.toHtml())
+        dlg = QPrintPreviewDialog(self)
+        dlg.paintRequested.connect(doc.print_)
+        dlg.exec()
+    # handlePrintPreview
+# rptCountWorksheet
+
+###########################################################
+###########################################################
+
+class CountWorksheetLocEngine:
+    """
+    builds the location-ordered Count Worksheet for a CountDate: for each Counter, a stop per location
+    the scheduled Materials were last found at, in walking-route order, with the Materials to count there
+
+    The route order is precomputed: WorksheetZones.RouteOrder, then Location_WorksheetZone.RouteSeq and
+    SortKey (locations without a zone follow, by LOCATION). The Django CountWorksheetLocReport looked up
+    VIEW_materials twice and MaterialList once per row and sorted on FoundAt; here the whole route is one
+    sorted query, and the Counters' Material lists another.
+    """
+    def __init__(self, CountDate: date):
+        self.CountDate = CountDate
+    # __init__
+
+    def buildQuery(self):
+        """
+        one row per Counter, last found location and scheduled Material, in route order
+        """
+        cs = CountSchedule
+        ac = ActualCounts
+        mtl = MaterialList
+        lz = Location_WorksheetZone
+        z = WorksheetZones
+        return (
+            select(
+                cs.Counter, ac.LOCATION.label('FoundAt'), lz.zone, z.zoneName,
+                mtl.id.label('Material_id'), mtl.Material, mtl.Description,
+                mtl.TypicalContainerQty, mtl.TypicalPalletQty,
+                Organizations.orgname.label('OrgName'),
+                MaterialCountSummary.LastCountDate, MaterialCountSummary.LastFoundAt,
+                ).distinct()
+            .select_from(cs)
+            .join(MaterialCountSummary, MaterialCountSummary.Material_id == cs.Material_id)
+            .join(ac, (ac.Material_id == MaterialCountSummary.Material_id) & (ac.CountDate == MaterialCountSummary.LastCountDate))
+            .join(mtl, mtl.id == cs.Material_id)
+            .outerjoin(Organizations, mtl.org_id == Organizations.id)
+            .outerjoin(lz, lz.location == ac.LOCATION)
+            .outerjoin(z, z.zone == lz.zone)
+            .where(cs.CountDate == self.CountDate)
+            .order_by(
+                cs.Counter,
+                z.RouteOrder.is_(None), z.RouteOrder, lz.zone.is_(None), lz.zone,
+                lz.RouteSeq.is_(None), lz.RouteSeq, lz.SortKey,
+                ac.LOCATION, mtl.Material, Organizations.orgname,
+                )
+            )
+    # buildQuery
+
+    def buildMaterialQuery(self):
+        """
+        the scheduled Materials with their last count, by Counter, Material
+        """
+        cs = CountSchedule
+        mtl = MaterialList
+        return (
+            select(
+                cs.Counter, mtl.id.label('Material_id'), mtl.Material,
+                Organizations.orgname.label('OrgName'),
+                MaterialCountSummary.LastCountDate, MaterialCountSummary.LastFoundAt,
+                )
+            .select_from(cs)
+            .join(mtl, mtl.id == cs.Material_id)
+            .outerjoin(Organizations, mtl.org_id == Organizations.id)
+            .outerjoin(MaterialCountSummary, MaterialCountSummary.Material_id == mtl.id)
+            .where(cs.CountDate == self.CountDate)
+            .order_by(cs.Counter, mtl.Material, Organizations.orgname)
+            )
+    # buildMaterialQuery
+
+    def build(self, progress: Callable[[int, int, str], None] | None = None, isCancelled: Callable[[], bool] | None = None) -> dict | None:
+        """
+        run the worksheet queries and render the barcodes
+
+        returns {'CountDate', 'SAPDate' (None; this worksheet shows no SAP quantities), 'Counters', 'Barcodes'}:
+            Counters is a list, in Counter order, of {'Counter', 'Stops', 'Materials'} - Stops, in route order,
+                {'FoundAt', 'zone', 'zoneName', 'Lines'}, Lines the Materials to count there (dicts);
+                Materials every Material scheduled for the Counter, whether it was ever found or not
+            Barcodes is {text: SVG}, for the Materials and the locations
+
+        progress and isCancelled as for CountWorksheetEngine.build
+        """
+        if progress is None:
+            progress = lambda done, total, text: None
+        if isCancelled is None:
+            isCancelled = lambda: False
+
+        nSteps = 2
+        progress(0, nSteps, 'Reading Count Schedule by Location')
+        with unitOfWork() as uow:
+            fnRollMaterialCountSummary(uow.session)
+            routeRows = uow.session.execute(self.buildQuery()).all()
+            if isCancelled(): return None
+
+            progress(1, nSteps, 'Collecting Material Summary List')
+            matlRows = uow.session.execute(self.buildMaterialQuery()).all()
+        # endwith uow
+        if isCancelled(): return None
+
+        Counters: list[dict] = []
+        CounterIndex: dict[Any, dict] = {}
+        for rawrow in matlRows:
+            if rawrow.Counter not in CounterIndex:
+                CounterIndex[rawrow.Counter] = {'Counter': rawrow.Counter, 'Stops': [], 'Materials': []}
+                Counters.append(CounterIndex[rawrow.Counter])
+            CounterIndex[rawrow.Counter]['Materials'].append({
+                'Material_id': rawrow.Material_id,
+                'Material_org': f'{rawrow.OrgName}-{rawrow.Material}',
+                'LastCountDate': rawrow.LastCountDate,
+                'LastFoundAt': rawrow.LastFoundAt,
+                })
+        # endfor rawrow
+        for rawrow in routeRows:
+            Stops = CounterIndex[rawrow.Counter]['Stops']
+            if not Stops or Stops[-1]['FoundAt'] != rawrow.FoundAt:
+                Stops.append({'FoundAt': rawrow.FoundAt, 'zone': rawrow.zone, 'zoneName': rawrow.zoneName, 'Lines': []})
+            Stops[-1]['Lines'].append({
+                'Material_id': rawrow.Material_id,
+                'Material_org': f'{rawrow.OrgName}-{rawrow.Material}',
+                'OrgName': rawrow.OrgName,
+                'Description': rawrow.Description,
+                'TypicalContainerQty': rawrow.TypicalContainerQty,
+                'TypicalPalletQty': rawrow.TypicalPalletQty,
+                'LastCountDate': rawrow.LastCountDate,
+                'LastFoundAt': rawrow.LastFoundAt,
+                })
+        # endfor rawrow
+
+        texts = sorted({line['Material_org'] for ctr in Counters for line in ctr['Materials']} | {rawrow.FoundAt for rawrow in routeRows})
+        LocBarcodes = Barcodes.renderMany(
+            texts, _locBarcodeWriterOptions,
+            progress=lambda done, total: progress(done, total, f'Preparing barcodes: {done} of {total}'),
+            isCancelled=isCancelled,
+            )
+        if LocBarcodes is None: return None
+        progress(len(texts), len(texts), 'Formatting Worksheet')
+
+        return {
+            'CountDate': self.CountDate,
+            'SAPDate': None,
+            'Counters': Counters,
+            'Barcodes': LocBarcodes,
+            }
+    # build
+# CountWorksheetLocEngine
+
+class CountWorksheetLocModel(CountWorksheetModel):
+    """
+    The location-ordered Count Worksheet as a tree model: Counter > location > Material.
+    toHtml renders the printable worksheet - a sheet per location, then each Counter's Material list
+    """
+    _columns = [
+        'Counter / Location / Material', 'Zone', 'Description',
+        'Typical Container Qty', 'Typical Pallet Qty', 'Last Found On', 'Last Found At',
+        ]
+    _numericColumns = set()
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self._locURLs: dict[str, str] = {}
+    # __init__
+
+    def setWorksheet(self, CountDate: date | None, SAPDate: date | None, Counters: list[dict]):
+        """
+        replace the model contents with a CountWorksheetLocEngine worksheet
+        """
+        self.beginResetModel()
+        self.CountDate = CountDate
+        self.SAPDate = SAPDate
+        self.Counters = Counters
+        self._root = root = self.Node(None)
+        # locations can hold anything; their barcode images are named by number instead
+        self._locURLs = {}
+        for ctr in Counters:
+            ctrNode = self.Node(root, f"{ctr['Counter'] or '(no Counter)'} - {len(ctr['Stops'])} Locations, {len(ctr['Materials'])} Materials")
+            for stop in ctr['Stops']:
+                self._locURLs.setdefault(stop['FoundAt'], f"barcode:loc{len(self._locURLs)}")
+                stopNode = self.Node(ctrNode, f"Location {stop['FoundAt']}", stop)
+                for line in stop['Lines']:
+                    self.Node(stopNode, line['Material_org'], line)
+            # endfor stop
+        # endfor ctr
+        self.endResetModel()
+    # setWorksheet
+
+    def nScheduled(self) -> int:
+        return sum(len(ctr['Materials']) for ctr in self.Counters)
+    # nScheduled
+
+    def barcodeResources(self) -> list[tuple[str, str]]:
+        resources = []
+        for ctr in self.Counters:
+            resources.extend((self.barcodeURL(line['Material_id']), line['Material_org']) for line in ctr['Materials'])
+            resources.extend((self.locBarcodeURL(stop['FoundAt']), stop['FoundAt']) for stop in ctr['Stops'])
+        # endfor ctr
+        return resources
+    # barcodeResources
+
+    def locBarcodeURL(self, location: str) -> str:
+        return self._locURLs[location]
+    # locBarcodeURL
+
+    def cellText(self, node, column: int) -> str:
+        if column == 0:
+            return node.text
+        line = node.line
+        if line is None:
+            return ''
+        if 'Lines' in line:       # a location
+            return f"{line['zone']} {line['zoneName'] or ''}".strip() if column == 1 and line['zone'] is not None else ''
+        if   column == 2: return str(line['Description'] or '')
+        elif column == 3: return str(line['TypicalContainerQty'] or '')
+        elif column == 4: return str(line['TypicalPalletQty'] or '')
+        elif column == 5: return f"{line['LastCountDate']:%Y-%m-%d}" if line['LastCountDate'] else '---'
+        elif column == 6: return str(line['LastFoundAt'] or '---')
+        return ''
+    # cellText
+
+    def toHtml(self) -> str:
+        """
+        the worksheet as HTML, laid out as the Django rpt_CountWkshtLoc_main.html was, for printing
+        """
+        esc = html.escape
+        CountDate = f"{self.CountDate:%Y-%m-%d}" if self.CountDate else ''
+        pageBreak = ' style="page-break-before: always"'
+        blankRow = '<tr><td height="60"></td><td></td><td></td></tr>'
+        out = []
+        for n, ctr in enumerate(self.Counters):
+            Counter = esc(ctr['Counter'] or '')
+            out.append(f'<h2{pageBreak if n else ""}>{Counter} Counting Agenda/Worksheet for {CountDate}</h2>')
+            for stop in ctr['Stops']:
+                zone = f" (zone {esc(str(stop['zone']))} {esc(stop['zoneName'] or '')})" if stop['zone'] is not None else ''
+                out.append(f'<p><big><b>Location {esc(stop["FoundAt"])}</b>{zone}</big> <img src="{self.locBarcodeURL(stop["FoundAt"])}"></p>')
+                out.append('<p><big>Act Cntr: ________________________ Date: _____________</big></p>')
+                out.append('<table border="1" cellspacing="0" cellpadding="2" width="100%">'
+                    '<tr><th width="20%">MATERIAL</th><th width="60%">CTD_QTY_Expr</th><th width="20%">Notes</th></tr>')
+                for line in stop['Lines']:
+                    out.append(
+                        f'<tr><td height="60" valign="top" align="center"><img src="{self.barcodeURL(line["Material_id"])}"><br>'
+                        f'{esc(line["OrgName"] or "")} Material {esc(line["Material_org"])}</td><td></td><td></td></tr>'
+                        f'<tr><td colspan="3">{esc(line["Description"] or "")} &#x220e; '
+                        f'Typical Container Qty = {esc(str(line["TypicalContainerQty"]))}, Typical Pallet Qty = {esc(str(line["TypicalPalletQty"]))} | '
+                        f'Last Found On {line["LastCountDate"] or "---"} At {esc(line["LastFoundAt"] or "---")}</td></tr>'
+                        )
+                # endfor line
+                out.extend([blankRow] * 2)
+                out.append('</table><hr>')
+            # endfor stop
+
+            out.append(f'<h3{pageBreak}><u>{Counter} Materials</u></h3><ul>')
+            out.extend(
+                f'<li><img src="{self.barcodeURL(line["Material_id"])}"> {esc(line["Material_org"])} '
+                f'Last Found At {esc(line["LastFoundAt"] or "---")} on {line["LastCountDate"] or "---"}</li>'
+                for line in ctr['Materials']
+                )
+            out.append('</ul>')
+        # endfor ctr
+        return '\n'.join(out)
+    # toHtml
+# CountWorksheetLocModel
+
+class rptCountWorksheetLoc(rptCountWorksheet):
+    """
+    Count Worksheet by Location - the counting agenda for a Count Date as a walk through the warehouse
+    """
+    _formname = "Count Worksheet by Location"
+    _engineClass = CountWorksheetLocEngine
+    _modelClass = CountWorksheetLocModel
+# rptCountWorksheetLoc
@@ -22,7 +22,7 @@ from calvincTools.utils import (
     )
 
 from sqlalchemy import (
-    and_, select, update, delete, insert, 
+    and_, or_, case, select, update, delete, insert, 
     literal_column, 
     text, func, 
     )
@@ -35,19 +35,25 @@ from qtawesome import icon
 from calvincTools.utils.forms import cQFormFieldDef
 from calvincTools.utils.forms.definitions.cQFormBtnDef import cQFormBtnDef
 from calvincTools.utils.forms.definitions.cQFormFieldDef import cQFormFieldDef
-from mathematical_expressions_parser.eval import evaluate
+from mathematical_expressions_parser.eval import evaluate_many
 
-from app.database import Repository, get_app_session, get_app_sessionmaker
+from app.database import Repository, bulkLoadMode, cUnitOfWork, get_app_session, get_app_sessionmaker, unitOfWork
+from app.progress import ProgressBus
+from app.utils import fnMaterialOrgIndex
+from app.forms.AppchoiceWidgets import MaterialChoices
 from app.models import (
-    ActualCounts, CountSchedule, MaterialList, tmpMaterialListUpdate,
+    ActualCounts, CountSchedule, MaterialCountSummary, MaterialList, tmpMaterialListUpdate,
     SAP_SOHRecs, SAPPlants_org, UploadSAPResults, 
     )
 
+# an MM60 part number with any of these embedded can't be used
+_rxInvalidMatNum = regex.compile('[\n\t\xA0]')
 
 class UpdateMatlListfromSAP(cSRFSingleRecordForm):
     _ORMmodel = tmpMaterialListUpdate
     _formname = "Update Material List from SAP MM60 or ZMSQV001 Spreadsheet"
     _ssnmaker = get_app_sessionmaker()
+    _uploadBatchSize = 1000     # spreadsheet rows per bulk insert
     _field_defs = [
         # no fields to edit, everything manually handled
     ]
@@ -58,6 +64,9 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
         self.btnChooseFile.fileChosen.connect(self.FileChosen)
 
         self.dict_chkUpdtOption = {}
+        self.nExistingFldsChanged: dict[str, int] = {}     # records changed per field by proc_MatlListSAPSprsheet_03_UpdateExistingRecs
+        self._uow: cUnitOfWork | None = None               # the unit of work uploadFile runs the update in
+        self._progress = ProgressBus.publisher(self._formname)     # showUpdateStatus also goes out on the progress bus
 
         self.chkDeleteIfNotinSprsht = QCheckBox("Delete Records Not in Spreadsheet")
 
@@ -137,8 +146,13 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
     ############## UI update methods
     ###########################################################
 
-    def showUpdateStatus(self, statusText: str, progressValue: int = 0, progressMax: int = -1) -> None:
+    def showUpdateStatus(self, statusText: str, progressValue: int = 0, progressMax: int = -1, final: bool = False) -> None:
 
+        # row-by-row updates reach the bus at most every _progress.minInterval seconds; final is the proc's last word
+        if final:
+            self._progress.finish(statusText)
+        elif statusText:
+            self._progress.update(statusText, progressValue, progressMax)
         self.wdgtUpdtStatusText.setText(statusText)
 
         if progressMax < 0:
@@ -168,8 +182,12 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
 
         # UMLSSName = self.proc_MatlListSAPSprsheet_00CopyUMLSpreadsheet()     # needed in a client-server environment, not for standalone
         UMLSSName = self.btnChooseFile.getFileChosen()
-        self.proc_MatlListSAPSprsheet_01ReadSpreadsheet(UMLSSName)
-        self.done_MatlListSAPSprsheet_01ReadSpreadsheet()      # this trigger most of the rest of the processing chain
+        # the whole update is one unit of work: the steps' commits only flush, and all of it is
+        # committed at the end - or none of it, if a step fails
+        with unitOfWork() as self._uow, bulkLoadMode(self._uow.session):
+            self.proc_MatlListSAPSprsheet_01ReadSpreadsheet(UMLSSName)
+            self.done_MatlListSAPSprsheet_01ReadSpreadsheet()      # this trigger most of the rest of the processing chain
+        # endwith unitOfWork, bulkLoadMode
 
         # present results to user
         childScreen = ShowUpdateMatlListfromSAPForm()
@@ -219,7 +237,7 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
 
     def proc_MatlListSAPSprsheet_01ReadSpreadsheet(self, fName):
         # tmpMaterialListUpdate.objects.using(dbToUse).all().delete() - from client-server Django version
-        Repository(get_app_sessionmaker(), tmpMaterialListUpdate).removewhere(True)
+        self._uow.repository(tmpMaterialListUpdate).removewhere(True)
 
         self.showUpdateStatus('Reading Spreadsheet')
 
@@ -242,7 +260,7 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
                 'Price unit': 'PriceUnit', 'per': 'PriceUnit',
                 'Currency':'Currency',
                 }
-        dict_SAPPlants = {rec.SAPPlant: rec.org_id  for rec in Repository(get_app_sessionmaker(), SAPPlants_org).get_all()}  # preload SAPPlants_org cache
+        dict_SAPPlants = {rec.SAPPlant: rec.org_id  for rec in self._uow.repository(SAPPlants_org).get_all()}  # preload SAPPlants_org cache
         for col in SAPcolmnNames:
             if col.value in SAP_SSName_TableName_map:
                 SAPcol[SAP_SSName_TableName_map[col.value]] = col.column - 1 # type: ignore
@@ -254,34 +272,50 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
         # endif bad header row
 
         numrows = ws.max_row
-        nRows = 0
         intrval_announce = min(100, int(max(1, numrows // 10)))
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            nRows += 1
-            if nRows % intrval_announce == 0:
-                self.showUpdateStatus(f'Reading Spreadsheet ... record {nRows} of {numrows}', nRows, numrows)
-
-            if row[SAPcol['Material']]==None: MatNum = ''
-            else: MatNum = row[SAPcol['Material']]
-            validTmpRec = False
-            ## create a blank tmpMaterialListUpdate record,
-            newrec = tmpMaterialListUpdate()
-            if regex.match(".*[\n\t\xA0].*",str(MatNum)):
-                validTmpRec = True
-                ## refuse to work with special chars embedded in the MatNum
-                newrec.recStatus = 'err-MatlNum'
-                newrec.errmsg = f'error: {MatNum!a} is an unusable part number. It contains invalid characters and cannot be added to WICS'
-            elif len(str(MatNum)):
-                validTmpRec = True
-                newrec.org_id = dict_SAPPlants.get(str(row[SAPcol['Plant']]), 0)
-            # endif invalid Material
-            if validTmpRec:
-                ## populate by looping through SAPcol,
-                ## then save
+
+        def tmpMatlRows():
+            """ yield one tmpMaterialListUpdate row (as a dict) per usable spreadsheet row """
+            nRows = 0
+            for row in ws.iter_rows(min_row=2, values_only=True):
+                nRows += 1
+                if nRows % intrval_announce == 0:
+                    self.showUpdateStatus(f'Reading Spreadsheet ... record {nRows} of {numrows}', nRows, numrows)
+
+                if row[SAPcol['Material']]==None: MatNum = ''
+                else: MatNum = row[SAPcol['Material']]
+                ## every row gets the same keys, so the chunks can be executemany'd
+                newrec = {'recStatus': None, 'errmsg': None, 'org_id': None}
+                if _rxInvalidMatNum.search(str(MatNum)):
+                    ## refuse to work with special chars embedded in the MatNum
+                    newrec['recStatus'] = 'err-MatlNum'
+                    newrec['errmsg'] = f'error: {MatNum!a} is an unusable part number. It contains invalid characters and cannot be added to WICS'
+                elif len(str(MatNum)):
+                    newrec['org_id'] = dict_SAPPlants.get(str(row[SAPcol['Plant']]), 0)
+                else:
+                    continue
+                # endif invalid Material
+                ## populate by looping through SAPcol
                 for dbColName, ssColNum in SAPcol.items():
-                    setattr(newrec,dbColName,row[ssColNum]) # type: ignore
-                Repository(get_app_sessionmaker(), tmpMaterialListUpdate).add(newrec)
-        # endfor
+                    newrec[dbColName] = row[ssColNum]     # type: ignore
+                yield newrec
+            # endfor
+        # tmpMatlRows
+
+        # OR IGNORE: a repeat of (org_id, Material) - several Plants in one org - is dropped, as the one-at-a-time adds did
+        insStmt = insert(tmpMaterialListUpdate).prefix_with('OR IGNORE', dialect='sqlite')
+        with self._uow.sessionmaker() as session:
+            chunk = []
+            for newrec in tmpMatlRows():
+                chunk.append(newrec)
+                if len(chunk) >= self._uploadBatchSize:
+                    session.execute(insStmt, chunk)
+                    chunk = []
+            # endfor
+            if chunk:
+                session.execute(insStmt, chunk)
+            session.commit()
+        # endwith session
 
         wb.close()
         return      # need to do more than this, but for now, just exit
@@ -311,7 +345,7 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
         # with connections[dbToUse].cursor() as cursor:
         #     cursor.execute(UpdMaterialLinkSQL)
         # this is a little too wild for the Repository pattern, so we do it manually here
-        with get_app_session() as session:
+        with self._uow.sessionmaker() as session:
             stmt = (
                 update(tmpMaterialListUpdate)
                 .values(
@@ -356,7 +390,7 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
         # DeleteMatlsSelectSQL += ", SAPMaterialType, SAPMaterialGroup, Currency  "    # these can go once I set null=True on these fields
         # DeleteMatlsSelectSQL += " FROM WICS_materiallist"
         # DeleteMatlsSelectSQL += f" WHERE ({MustKeepMatlsSelCond})"
-        with get_app_session() as session:
+        with self._uow.sessionmaker() as session:
             # Build the NOT IN subqueries
             not_in_tmp = select(tmpMaterialListUpdate.MaterialLink).where(
                 tmpMaterialListUpdate.MaterialLink.is_not(None)
@@ -403,7 +437,7 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
         #     lambda rec: rec.MaterialLink_id is None and (rec.recStatus is None),
         #     {'recStatus': 'ADD'}
         # )
-        Repository(get_app_sessionmaker(), tmpMaterialListUpdate).updatewhere(
+        self._uow.repository(tmpMaterialListUpdate).updatewhere(
             (tmpMaterialListUpdate.MaterialLink == None) & (tmpMaterialListUpdate.recStatus == None),
             {'recStatus': 'ADD'}
         )
@@ -417,8 +451,8 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
     # done_MatlListSAPSprsheet_02_identifyexistingMaterial
 
     def proc_MatlListSAPSprsheet_03_UpdateExistingRecs(self):
-        def setstate_MatlListSAPSprsheet_03_UpdateExistingRecs(fldName):
-            self.showUpdateStatus(f'Updating _{fldName}_ Field in Existing Records')
+        def setstate_MatlListSAPSprsheet_03_UpdateExistingRecs(fldName, nChanged: int | None = None):
+            self.showUpdateStatus(f'Updating _{fldName}_ Field in Existing Records' + ('' if nChanged is None else f' ({nChanged} to change)'))
         # setstate_MatlListSAPSprsheet_03_UpdateExistingRecs
 
         setstate_MatlListSAPSprsheet_03_UpdateExistingRecs('')
@@ -426,15 +460,15 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
         # (Form Name, db fld Name, zero/blank value)
         # NOTE: SAPPrice updates three fields: Price, PriceUnit, Currency - that's why I don't use a simple dict here
         FormTodbFld_map = [
-            ('Description','Description','""'),
-            ('SAPMatlType','SAPMaterialType','""'),
-            ('SAPMatlGroup','SAPMaterialGroup','""'),
-            ('SAPManuf','SAPManuf','""'),
-            ('SAPMPN','SAPMPN','""'),
-            ('SAPABC','SAPABC','""'),
+            ('Description','Description',''),
+            ('SAPMatlType','SAPMaterialType',''),
+            ('SAPMatlGroup','SAPMaterialGroup',''),
+            ('SAPManuf','SAPManuf',''),
+            ('SAPMPN','SAPMPN',''),
+            ('SAPABC','SAPABC',''),
             ('SAPPrice','Price',0),
             ('SAPPrice','PriceUnit',0),
-            ('SAPPrice','Currency','""'),
+            ('SAPPrice','Currency',''),
         ]
 
         UpdateExistFldSet = {
@@ -442,33 +476,62 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
                 if chkbox.isChecked()
         }
 
+        self.nExistingFldsChanged = {}
         if UpdateExistFldSet:
-            MatlList_tbl = MaterialList.__tablename__
-            tmpMatlListUpd_tbl = tmpMaterialListUpdate.__tablename__
+            # a field is changed only if SAP has a non-blank value for it and that value differs from WICS's
+            #   (IFNULL(tmp.fld, zero) != zero AND IFNULL(matl.fld, zero) != IFNULL(tmp.fld, zero))
+            # all the checked fields are done in one UPDATE ... FROM pass; each column gets a CASE so
+            # a record changing in only some fields keeps its current values in the others
+            ChangeCond = {}
             for formName, dbName, zeroVal in FormTodbFld_map:
                 if formName in UpdateExistFldSet:
-                    setstate_MatlListSAPSprsheet_03_UpdateExistingRecs(dbName)
-                    # UPDATE this field
-                    # for SQLite, the SQLAlchemy way is complex, so we do it manually here
-                    UpdSQLSetStmt = f"{dbName}={tmpMatlListUpd_tbl}.{dbName}"
-                    UpdSQLWhereStmt = f"(IFNULL({tmpMatlListUpd_tbl}.{dbName},{zeroVal}) != {zeroVal} AND IFNULL({MatlList_tbl}.{dbName},{zeroVal})!=IFNULL({tmpMatlListUpd_tbl}.{dbName},{zeroVal}))"
-
-                    UpdSQLStmt = f"UPDATE {MatlList_tbl}"
-                    UpdSQLStmt += f" SET {UpdSQLSetStmt}"
-                    UpdSQLStmt += f" FROM {tmpMatlListUpd_tbl}"
-                    UpdSQLStmt += f" WHERE ({tmpMatlListUpd_tbl}.MaterialLink={MatlList_tbl}.id) AND {UpdSQLWhereStmt}"
-                    UpdSQLStmt += ";"
-
-                    with get_app_session() as session:
-                        session.execute(text(UpdSQLStmt))
-                        session.commit()
+                    tmpFld = getattr(tmpMaterialListUpdate, dbName)
+                    matlFld = getattr(MaterialList, dbName)
+                    ChangeCond[dbName] = and_(
+                        func.ifnull(tmpFld, zeroVal) != zeroVal,
+                        func.ifnull(matlFld, zeroVal) != func.ifnull(tmpFld, zeroVal),
+                        )
                 #endif formName in UpdateExistFldList
             #endfor
+            LinkCond = (tmpMaterialListUpdate.MaterialLink == MaterialList.id)
+
+            with self._uow.sessionmaker() as session:
+                # how many records will change, per field - for the progress display and the caller
+                countStmt = (
+                    select(*[func.count(case((cond, 1))).label(dbName) for dbName, cond in ChangeCond.items()])
+                    .select_from(MaterialList)
+                    .join(tmpMaterialListUpdate, LinkCond)
+                )
+                self.nExistingFldsChanged = dict(session.execute(countStmt).one()._mapping)
+                for dbName, nChanged in self.nExistingFldsChanged.items():
+                    setstate_MatlListSAPSprsheet_03_UpdateExistingRecs(dbName, nChanged)
+
+                if any(self.nExistingFldsChanged.values()):
+                    # the Material search index covers Description and SAPMPN; a Core UPDATE bypasses the
+                    # mapper events, so the records changing in those are re-read once the upload commits
+                    searchConds = [cond for dbName, cond in ChangeCond.items() if dbName in ('Description', 'SAPMPN')]
+                    if searchConds:
+                        searchChangedIDs = session.scalars(select(MaterialList.id).join(tmpMaterialListUpdate, LinkCond).where(or_(*searchConds))).all()
+                        self._uow.afterCommit(lambda: MaterialChoices.materialsChanged(searchChangedIDs))
+                    # endif search fields changing
+                    updStmt = (
+                        update(MaterialList)
+                        .where(LinkCond, or_(*ChangeCond.values()))
+                        .values({
+                            dbName: case((cond, getattr(tmpMaterialListUpdate, dbName)), else_=getattr(MaterialList, dbName))
+                                for dbName, cond in ChangeCond.items()
+                            })
+                    )
+                    session.execute(updStmt)
+                    session.commit()
+                # endif anything to change
+            # endwith session
         # endif UpdateExistFldList not empty
         self.done_MatlListSAPSprsheet_03_UpdateExistingRecs()
     # proc_MatlListSAPSprsheet_03_UpdateExistingRecs
     def done_MatlListSAPSprsheet_03_UpdateExistingRecs(self):
-        self.showUpdateStatus('Finished Updating Existing Records to MM60 values')
+        nChangedList = ', '.join(f'{dbName} {nChanged}' for dbName, nChanged in self.nExistingFldsChanged.items())
+        self.showUpdateStatus('Finished Updating Existing Records to MM60 values' + (f' ({nChangedList})' if nChangedList else ''))
 
         self.proc_MatlListSAPSprsheet_04_Remove()
     # done_MatlListSAPSprsheet_03_UpdateExistingRecs
@@ -481,12 +544,17 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
         self.showUpdateStatus('Removing WICS Materials no longer in SAP MM60 Materials')
 
         # do the Removals
-        with get_app_session() as session:
+        with self._uow.sessionmaker() as session:
             # SQLAlchemy delete with subquery
             subq = select(tmpMaterialListUpdate.delMaterialLink).where(tmpMaterialListUpdate.recStatus.like('DEL%'))
+            removedIDs = session.scalars(subq).all()
+            # foreign keys aren't enforced (no PRAGMA foreign_keys), so MaterialCountSummary's ON DELETE CASCADE
+            # never fires; its rows for these Materials go explicitly
+            session.execute(delete(MaterialCountSummary).where(MaterialCountSummary.Material_id.in_(subq)))
             stmt = delete(MaterialList).where(MaterialList.id.in_(subq))
             session.execute(stmt)
             session.commit()
+        self._uow.afterCommit(lambda: MaterialChoices.materialsRemoved(removedIDs))
 
         self.done_MatlListSAPSprsheet_04_Remove()
     # proc_MatlListSAPSprsheet_04_Remove
@@ -500,7 +568,7 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
         self.showUpdateStatus('Adding New WICS Materials from SAP MM60 Materials')
 
         # do the Additions
-        with get_app_session() as session:
+        with self._uow.sessionmaker() as session:
              # Select compatible columns from tmp where recStatus is 'ADD'
             select_stmt = select(
                 tmpMaterialListUpdate.org_id,
@@ -529,6 +597,7 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
 
             session.execute(stmt)
             session.commit()
+        self._uow.afterCommit(MaterialChoices.materialsAdded)
 
         self.done_MatlListSAPSprsheet_04_Add()
     # proc_MatlListSAPSprsheet_04_Add
@@ -539,7 +608,7 @@ class UpdateMatlListfromSAP(cSRFSingleRecordForm):
     # done_MatlListSAPSprsheet_04_Add
 
     def proc_MatlListSAPSprsheet_99_FinalProc(self):
-        self.showUpdateStatus('Finished Processing Spreadsheet')
+        self.showUpdateStatus('Finished Processing Spreadsheet', final=True)
     # proc_MatlListSAPSprsheet_99_FinalProc
 
     def proc_MatlListSAPSprsheet_99_Cleanup(self):
@@ -567,9 +636,19 @@ class ShowUpdateMatlListfromSAPForm(QWidget):
         wdgtScrollArea.setWidget(wdgtMainArea)
         myLayout.addWidget(wdgtScrollArea)
 
-        listImportErrors = Repository(get_app_sessionmaker(), tmpMaterialListUpdate).get_all(
-            tmpMaterialListUpdate.recStatus is not None and tmpMaterialListUpdate.recStatus.startswith('err-')
-        )
+        with unitOfWork() as uow:
+            tmpRepo = uow.repository(tmpMaterialListUpdate)
+            listImportErrors = tmpRepo.get_all(
+                tmpMaterialListUpdate.recStatus is not None and tmpMaterialListUpdate.recStatus.startswith('err-')
+            )
+            listAdditions = tmpRepo.get_all(
+                tmpMaterialListUpdate.recStatus == 'ADD'
+            )
+            listRemovals = tmpRepo.get_all(
+                tmpMaterialListUpdate.recStatus is not None and tmpMaterialListUpdate.recStatus.startswith('DEL ')
+            )
+        # endwith uow
+
         kountImportErrors = len(listImportErrors)
         if listImportErrors:
             lblErrorsTitle = QLabel(f"{kountImportErrors} errors were encountered during the update:")
@@ -582,9 +661,6 @@ class ShowUpdateMatlListfromSAPForm(QWidget):
             layoutMainArea.addWidget(lblNoErrors)
         # endif ImpErrList
 
-        listAdditions = Repository(get_app_sessionmaker(), tmpMaterialListUpdate).get_all(
-            tmpMaterialListUpdate.recStatus == 'ADD'
-        )
         kountAdditions = len(listAdditions)
         if listAdditions:
             lblAdditionsTitle = QLabel(f"{kountAdditions} materials were added to WICS:")
@@ -597,9 +673,6 @@ class ShowUpdateMatlListfromSAPForm(QWidget):
             layoutMainArea.addWidget(lblNoAdditions)
         # endif AddList
 
-        listRemovals = Repository(get_app_sessionmaker(), tmpMaterialListUpdate).get_all(
-            tmpMaterialListUpdate.recStatus is not None and tmpMaterialListUpdate.recStatus.startswith('DEL ')
-        )
         kountRemovals = len(listRemovals)
         if listRemovals:
             lblRemovalsTitle = QLabel(f"{kountRemovals} materials were removed from WICS:")
@@ -616,6 +689,87 @@ class ShowUpdateMatlListfromSAPForm(QWidget):
     def end_of_class(self):
         pass
 
+class UploadBatchWriter:
+    """
+    Collects the records produced by a spreadsheet upload and writes them in chunks.
+
+    Each chunk is written in one transaction on a single session: new records are
+    added and flushed (so they get their ids), then the UploadSAPResults rows for
+    the chunk are inserted in bulk, then the chunk is committed.
+    If anything fails while a chunk is written, that chunk is rolled back,
+    the earlier chunks stay committed (as they would with row-by-row commits)
+    and the exception propagates to the caller, which calls discard().
+
+    Result messages may be callables; they are called after the flush,
+    so a message can include the id of a record added in the same chunk.
+    """
+    def __init__(self, session: Session, batchSize: int = 500):
+        self.session = session
+        self.session.autoflush = False      # the writer decides when to flush
+        self.session.expire_on_commit = False   # records preloaded by the caller stay usable after each chunk
+        self.batchSize = max(1, batchSize)
+        self._pendingRecs: list[Any] = []
+        self._pendingResults: list[tuple[str, Any, int]] = []
+        self._pendingRows = 0
+        self.nAdded = 0         # records committed so far
+    # __init__
+
+    def add(self, rec: Any) -> None:
+        self._pendingRecs.append(rec)
+
+    def addResult(self, errState: str, errmsg: Any, rowNum: int) -> None:
+        self._pendingResults.append((errState, errmsg, rowNum))
+
+    def rowDone(self) -> None:
+        """ count a processed spreadsheet row; write the chunk when it is full """
+        self._pendingRows += 1
+        if self._pendingRows >= self.batchSize:
+            self.flush()
+    # rowDone
+
+    def flush(self) -> None:
+        if not (self._pendingRecs or self._pendingResults or self.session.dirty):
+            self._pendingRows = 0
+            return
+        try:
+            self.session.add_all(self._pendingRecs)
+            self.session.flush()
+            results = [
+                {
+                    'errState': errState,
+                    'errmsg': errmsg() if callable(errmsg) else errmsg,
+                    'rowNum': rowNum,
+                }
+                for errState, errmsg, rowNum in self._pendingResults
+            ]
+            if results:
+                self.session.execute(insert(UploadSAPResults), results)
+            self.session.commit()
+        except Exception:
+            # the chunk stays pending, for discard() to sort out
+            self.session.rollback()
+            raise
+        # endtry
+        self.nAdded += len(self._pendingRecs)
+        self._pendingRecs.clear()
+        self._pendingResults.clear()
+        self._pendingRows = 0
+    # flush
+
+    def discard(self) -> None:
+        """
+        throw away the chunk in progress: its records and their 'success' results. The rows' other
+        results (their errors) are kept, and written with the next flush, as row-by-row saving wrote them
+        """
+        self.session.rollback()
+        self._pendingRecs.clear()
+        self._pendingResults = [result for result in self._pendingResults if result[0] != 'success']
+        self._pendingRows = 0
+    # discard
+# UploadBatchWriter
+    def end_of_class(self):
+        pass
+
 class UploadActCountSprsht(cSRFSingleRecordForm):
     """
     A form for uploading and processing count entry spreadsheets into the ActualCounts database.
@@ -643,6 +797,7 @@ class UploadActCountSprsht(cSRFSingleRecordForm):
         _ORMmodel: The ORM model class (ActualCounts)
         _formname: Display name of the form
         _ssnmaker: Session maker for database operations
+        _uploadBatchSize: Number of spreadsheet rows written per transaction
         fieldDefs: Empty dict as all fields are manually handled
         btnChooseFile: File selection widget
         wdgtUpdtStatusText: Label showing current status
@@ -651,6 +806,7 @@ class UploadActCountSprsht(cSRFSingleRecordForm):
     _ORMmodel = ActualCounts
     _formname = "Upload Count Entry Spreadsheet"
     _ssnmaker = get_app_sessionmaker()
+    _uploadBatchSize = 500      # spreadsheet rows written per transaction
     fieldDefs = {
         # no fields to edit, everything manually handled
     }
@@ -662,6 +818,8 @@ class UploadActCountSprsht(cSRFSingleRecordForm):
 
         self.wdgtUpdtStatusText = QLabel("")
         self.wdgtUpdtStatusProgBar = QProgressBar()
+        self._progress = ProgressBus.publisher(self._formname)     # showUpdateStatus also goes out on the progress bus
+        self._CTDQtyEvals: dict[str, Any] = {}     # CTD_QTY_Expr text -> evaluate_many result, for the sheet being read
 
         super().__init__(formname, field_defs, model, ssnmaker, parent, *args, **kwargs)
     # __init__
@@ -723,8 +881,13 @@ class UploadActCountSprsht(cSRFSingleRecordForm):
     ############## UI update methods
     ###########################################################
 
-    def showUpdateStatus(self, statusText: str, progressValue: int = 0, progressMax: int = -1) -> None:
+    def showUpdateStatus(self, statusText: str, progressValue: int = 0, progressMax: int = -1, final: bool = False) -> None:
 
+        # row-by-row updates reach the bus at most every _progress.minInterval seconds; final is the proc's last word
+        if final:
+            self._progress.finish(statusText)
+        elif statusText:
+            self._progress.update(statusText, progressValue, progressMax)
         self.wdgtUpdtStatusText.setText(statusText)
 
         if progressMax < 0:
@@ -793,6 +956,17 @@ class UploadActCountSprsht(cSRFSingleRecordForm):
     ############## Read / process spreadsheet methods
     ###########################################################
 
+    @staticmethod
+    def CTDQtyExprText(val) -> str:
+        """
+        the expression text in a CTD_QTY_Expr cell - a leading '=' (an Excel formula) is dropped
+        """
+        if isinstance(val,str):
+            if val[:1] == '=':
+                val = val[1:]
+        return str(val)
+    # CTDQtyExprText
+
     def cleanupfld(self, fld, val, CountSprshtDateEpoch = WINDOWS_EPOCH):
         """
         fld is the name of the field in the ActualCount or MaterialList table
@@ -821,13 +995,13 @@ class UploadActCountSprsht(cSRFSingleRecordForm):
         elif fld in \
             ['CTD_QTY_Expr',
                 ]:
-            if isinstance(val,str):
-                if val[0] == '=':
-                    val = val[1:]
-            try:
-                v = evaluate(str(val))
-            except (SyntaxError, NameError, TypeError, ZeroDivisionError):
+            val = self.CTDQtyExprText(val)
+            # the sheet's expressions were evaluated together before the rows were read (see ReadSheet)
+            v = self._CTDQtyEvals[val] if val in self._CTDQtyEvals else evaluate_many([val])[0]
+            if isinstance(v, (SyntaxError, NameError, TypeError, ZeroDivisionError)):
                 v = "-- INVALID --"
+            elif isinstance(v, Exception):
+                raise v
             usefld = (v!="-- INVALID --")
             cleanval = str(val) if (v != "--INVALID--") else None
         elif fld in \
@@ -931,191 +1105,171 @@ class UploadActCountSprsht(cSRFSingleRecordForm):
         nRowsNoMaterial = 0
         nRowsErrors = 0
 
-        intrval_announce = min(100, int(max(1, ws.max_row // 10)))
-        for row in ws.iter_rows(min_row=SprshtRowNum+1, values_only=True):
-            SprshtRowNum += 1
-            if SprshtRowNum % intrval_announce == 0:
-                self.showUpdateStatus(f"Reading Spreadsheet ... record {SprshtRowNum} of {ws.max_row}", SprshtRowNum, ws.max_row)
-
-            ignoreline = ( ( (NOTdbFld_flags[0] in SprshtcolmnMap) and (row[SprshtcolmnMap[NOTdbFld_flags[0]]]) )
-                        or (row[SprshtcolmnMap['Material']] is None)
-                        )
-            if not ignoreline:
-                matlnum = self.cleanupfld('Material', row[SprshtcolmnMap['Material']])['cleanval']
-                # if no org given, check that Material unique.
-                if Sprsht_SSName_TableName_map['org_id'] not in SprshtcolmnMap:
-                    spshtorg = None
-                else:
-                    spshtorg = self.cleanupfld('org_id', row[SprshtcolmnMap['org_id']])['cleanval']
-                matlorglist = Repository(get_app_sessionmaker(), MaterialList).get_all(MaterialList.Material==matlnum)
-                MatlKount = len(matlorglist)
-                MatObj = None
-                err_already_handled = False
-                if MatlKount == 1:
-                    MatObj = matlorglist[0]
-                    spshtorg = MatObj.org_id
-                if MatlKount > 1:
-                    if spshtorg is None:
-                        r = UploadSAPResults(
-                            errState = 'error',
-                            errmsg = f"{matlnum} in multiple org_id's {tuple(matlorglist)}, but no org_id given",
-                            rowNum = SprshtRowNum
-                            )
-                        Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-                        nRowsErrors += 1
-                        err_already_handled = True
-                    else:
-                        for mat in matlorglist:
-                            if mat.org_id == spshtorg:
-                                MatObj = mat
-                                break
-                    if MatObj is None and not err_already_handled:
-                        r = UploadSAPResults(
-                            errState = 'error',
-                            errmsg = f"{matlnum} in in multiple org_id's {tuple(matlorglist)}, but org_id given ({spshtorg}) is not one of them",
-                            rowNum = SprshtRowNum
-                            )
-                        Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-                        nRowsErrors += 1
-                        err_already_handled = True
-                    #endif spshtorg is None
-                #endif MatKount > 1
-
-                if not MatObj:
-                    if not err_already_handled:
-                        nRowsErrors += 1
-                        r = UploadSAPResults(
-                            errState = 'error',
-                            errmsg = f'either {matlnum} does not exist in MaterialList or incorrect org_id ({str(spshtorg)}) given',
-                            rowNum = SprshtRowNum
-                            )
-                        Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-                else:
-                    rowErrs = False
-                    requiredFields = {reqFld: False for reqFld in SprshtREQUIREDFLDS}
-                    requiredFields['Both LocationOnly and CTD_QTY'] = False
-
-                    MatChanged = False
-                    SRec = ActualCounts()
-                    for fldName, colNum in SprshtcolmnMap.items():
-                        if fldName in NOTdbFld_flags: continue
-                        # check/correct problematic data types
-                        usefld, V = self.cleanupfld(fldName, row[colNum], CountSprshtDateEpoch=CountSprshtDateEpoch).values()
-                        if (V is not None):
-                            if usefld:
-                                if   fldName == 'CountDate':
-                                    setattr(SRec, fldName, V)
-                                    requiredFields['CountDate'] = True
-                                elif fldName == 'Material':
-                                    setattr(SRec, fldName, MatObj)
-                                    requiredFields['Material'] = True
-                                elif fldName == 'Counter':
-                                    setattr(SRec, fldName, V)
-                                    requiredFields['Counter'] = True
-                                elif fldName == 'LOCATION':
-                                    setattr(SRec, fldName, V)
-                                    requiredFields['LOCATION'] = True
-                                elif fldName == 'LocationOnly':
-                                    setattr(SRec, fldName, True if V else False)
-                                    requiredFields['Both LocationOnly and CTD_QTY'] = True
-                                elif fldName == 'CTD_QTY_Expr':
-                                    setattr(SRec, fldName, V)
-                                    requiredFields['Both LocationOnly and CTD_QTY'] = True
-                                elif fldName == 'TypicalContainerQty' \
-                                or fldName == 'TypicalPalletQty':
-                                    if V == '' or V == None: V = 0
-                                    if V != 0 and V != getattr(MatObj,fldName,0):
-                                        setattr(MatObj, fldName, V)
-                                        MatChanged = True
-                                else:
-                                    if hasattr(SRec, fldName): setattr(SRec, fldName, V)
-                                # endif fldname
+        # a first pass streams the CTD_QTY_Expr column alone, and its distinct expressions are
+        # evaluated in one batch; cleanupfld then only looks the results up
+        if 'CTD_QTY_Expr' in SprshtcolmnMap:
+            colCTDQty = SprshtcolmnMap['CTD_QTY_Expr'] + 1
+            CTDQtyExprs = list(dict.fromkeys(
+                self.CTDQtyExprText(val)
+                for (val,) in ws.iter_rows(min_row=SprshtRowNum+1, min_col=colCTDQty, max_col=colCTDQty, values_only=True)
+                ))
+            self._CTDQtyEvals = dict(zip(CTDQtyExprs, evaluate_many(CTDQtyExprs)))
+        # endif CTD_QTY_Expr
+
+        def SuccessMsg(SRec, MatChanged):
+            # called by the writer after the flush, so SRec has its id
+            resultString = str(SRec)
+            resultString += ' / LOCATION ONLY'  if SRec.LocationOnly else f' / Qty= {SRec.CTD_QTY_Expr}'
+            resultString += ' (Typ Cont Qty/Typ Plt Qty also changed)' if MatChanged else ''
+            return resultString
+        # SuccessMsg
+
+        with get_app_session() as session, bulkLoadMode(session):
+            writer = UploadBatchWriter(session, self._uploadBatchSize)
+            # one query up front instead of one per row; the records live in the writer's session,
+            # so a Material used on several rows is one object
+            MatlIndex = fnMaterialOrgIndex(session)
+            try:
+                intrval_announce = min(100, int(max(1, ws.max_row // 10)))
+                for row in ws.iter_rows(min_row=SprshtRowNum+1, values_only=True):
+                    SprshtRowNum += 1
+                    if SprshtRowNum % intrval_announce == 0:
+                        self.showUpdateStatus(f"Reading Spreadsheet ... record {SprshtRowNum} of {ws.max_row}", SprshtRowNum, ws.max_row)
+
+                    ignoreline = ( ( (NOTdbFld_flags[0] in SprshtcolmnMap) and (row[SprshtcolmnMap[NOTdbFld_flags[0]]]) )
+                                or (row[SprshtcolmnMap['Material']] is None)
+                                )
+                    if not ignoreline:
+                        matlnum = self.cleanupfld('Material', row[SprshtcolmnMap['Material']])['cleanval']
+                        # if no org given, check that Material unique.
+                        if Sprsht_SSName_TableName_map['org_id'] not in SprshtcolmnMap:
+                            spshtorg = None
+                        else:
+                            spshtorg = self.cleanupfld('org_id', row[SprshtcolmnMap['org_id']])['cleanval']
+                        matlorgs = MatlIndex.get(matlnum, {})
+                        matlorglist = list(matlorgs.values())
+                        MatlKount = len(matlorglist)
+                        MatObj = None
+                        err_already_handled = False
+                        if MatlKount == 1:
+                            MatObj = matlorglist[0]
+                            spshtorg = MatObj.org_id
+                        if MatlKount > 1:
+                            if spshtorg is None:
+                                writer.addResult('error', f"{matlnum} in multiple org_id's {tuple(matlorglist)}, but no org_id given", SprshtRowNum)
+                                nRowsErrors += 1
+                                err_already_handled = True
                             else:
-                                if fldName!='CTD_QTY_Expr':
-                                    # we have to suspend judgement on CTD_QTY_Expr until last, because this could be a LocationOnly count
+                                MatObj = matlorgs.get(spshtorg)
+                            if MatObj is None and not err_already_handled:
+                                writer.addResult('error', f"{matlnum} in in multiple org_id's {tuple(matlorglist)}, but org_id given ({spshtorg}) is not one of them", SprshtRowNum)
+                                nRowsErrors += 1
+                                err_already_handled = True
+                            #endif spshtorg is None
+                        #endif MatKount > 1
+
+                        if not MatObj:
+                            if not err_already_handled:
+                                nRowsErrors += 1
+                                writer.addResult('error', f'either {matlnum} does not exist in MaterialList or incorrect org_id ({str(spshtorg)}) given', SprshtRowNum)
+                        else:
+                            rowErrs = False
+                            requiredFields = {reqFld: False for reqFld in SprshtREQUIREDFLDS}
+                            requiredFields['Both LocationOnly and CTD_QTY'] = False
+
+                            # MatObj lives in the writer's session, so changes are held here until the row is known good
+                            MatChanges = {}
+                            SRec = ActualCounts()
+                            for fldName, colNum in SprshtcolmnMap.items():
+                                if fldName in NOTdbFld_flags: continue
+                                # check/correct problematic data types
+                                usefld, V = self.cleanupfld(fldName, row[colNum], CountSprshtDateEpoch=CountSprshtDateEpoch).values()
+                                if (V is not None):
+                                    if usefld:
+                                        if   fldName == 'CountDate':
+                                            setattr(SRec, fldName, V)
+                                            requiredFields['CountDate'] = True
+                                        elif fldName == 'Material':
+                                            # linked below, once the row is known good; linking puts SRec in MatObj's backref collection
+                                            requiredFields['Material'] = True
+                                        elif fldName == 'Counter':
+                                            setattr(SRec, fldName, V)
+                                            requiredFields['Counter'] = True
+                                        elif fldName == 'LOCATION':
+                                            setattr(SRec, fldName, V)
+                                            requiredFields['LOCATION'] = True
+                                        elif fldName == 'LocationOnly':
+                                            setattr(SRec, fldName, True if V else False)
+                                            requiredFields['Both LocationOnly and CTD_QTY'] = True
+                                        elif fldName == 'CTD_QTY_Expr':
+                                            setattr(SRec, fldName, V)
+                                            requiredFields['Both LocationOnly and CTD_QTY'] = True
+                                        elif fldName == 'TypicalContainerQty' \
+                                        or fldName == 'TypicalPalletQty':
+                                            if V == '' or V == None: V = 0
+                                            if V != 0 and V != getattr(MatObj,fldName,0):
+                                                MatChanges[fldName] = V
+                                        else:
+                                            if hasattr(SRec, fldName): setattr(SRec, fldName, V)
+                                        # endif fldname
+                                    else:
+                                        if fldName!='CTD_QTY_Expr':
+                                            # we have to suspend judgement on CTD_QTY_Expr until last, because this could be a LocationOnly count
+                                            rowErrs = True
+                                            writer.addResult('error', f'{str(V)} is invalid for {fldName}', SprshtRowNum)
+                                    #endif usefld
+                                #endif (V is not None)
+                            # for each column
+
+                            # now we determine if one of LocationOnly or CTD_QTY was given
+                            if not requiredFields['Both LocationOnly and CTD_QTY']:
+                                fldName = 'CTD_QTY_Expr'
+                                V = row[SprshtcolmnMap[fldName]]
+                                rowErrs = True
+                                writer.addResult('error', f'record is not marked LocationOnly and {str(V)} is invalid for {fldName}', SprshtRowNum)
+
+                            # are all required fields present?
+                            AllRequiredPresent = True
+                            for keyname, Prsnt in requiredFields.items():
+                                AllRequiredPresent = AllRequiredPresent and Prsnt
+                                if not Prsnt:
                                     rowErrs = True
-                                    r = UploadSAPResults(
-                                        errState = 'error',
-                                        errmsg = f'{str(V)} is invalid for {fldName}',
-                                        rowNum = SprshtRowNum
-                                        )
-                                    Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-                            #endif usefld
-                        #endif (V is not None)
-                    # for each column
-
-                    # now we determine if one of LocationOnly or CTD_QTY was given
-                    if not requiredFields['Both LocationOnly and CTD_QTY']:
-                        fldName = 'CTD_QTY_Expr'
-                        V = row[SprshtcolmnMap[fldName]]
-                        rowErrs = True
-                        r = UploadSAPResults(
-                            errState = 'error',
-                            errmsg = f'record is not marked LocationOnly and {str(V)} is invalid for {fldName}',
-                            rowNum = SprshtRowNum
-                            )
-                        Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-
-                    # are all required fields present?
-                    AllRequiredPresent = True
-                    for keyname, Prsnt in requiredFields.items():
-                        AllRequiredPresent = AllRequiredPresent and Prsnt
-                        if not Prsnt:
-                            rowErrs = True
-                            r = UploadSAPResults(
-                                errState = 'error',
-                                errmsg = f'{keyname} missing',
-                                rowNum = SprshtRowNum
-                                )
-                            Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-                    # endfor requiredFields
-
-                    if not rowErrs:
-                        Repository(get_app_sessionmaker(), ActualCounts).add(SRec)
-                        if MatChanged: Repository(get_app_sessionmaker(), MaterialList).update(MatObj)
-                        resultString = str(SRec)
-                        resultString += ' / LOCATION ONLY'  if SRec.LocationOnly else f' / Qty= {SRec.CTD_QTY_Expr}'
-                        resultString += ' (Typ Cont Qty/Typ Plt Qty also changed)' if MatChanged else ''
-                        r = UploadSAPResults(
-                            errState = 'success',
-                            errmsg = resultString,
-                            rowNum = SprshtRowNum
-                            )
-                        Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-                        nRowsAdded += 1
+                                    writer.addResult('error', f'{keyname} missing', SprshtRowNum)
+                            # endfor requiredFields
+
+                            if not rowErrs:
+                                MatChanged = bool(MatChanges)
+                                for fldName, V in MatChanges.items():
+                                    setattr(MatObj, fldName, V)
+                                setattr(SRec, 'Material', MatObj)
+                                writer.add(SRec)
+                                writer.addResult('success', lambda SRec=SRec, MatChanged=MatChanged: SuccessMsg(SRec, MatChanged), SprshtRowNum)
+                            else:
+                                nRowsErrors += 1
+                            #endif not rowErrs
+                        # endif MatObj/not MatObj
                     else:
-                        nRowsErrors += 1
-                    #endif not rowErrs
-                # endif MatObj/not MatObj
-            else:
-                nRowsNoMaterial += 1
-            #endif not ignoreline
-        # endfor row in ws.iter_rows
-
-        r = UploadSAPResults(
-            errState = 'nRowsTotal',
-            errmsg = '',
-            rowNum = SprshtRowNum
-            )
-        Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-        r = UploadSAPResults(
-            errState = 'nRowsAdded',
-            errmsg = '',
-            rowNum = nRowsAdded
-            )
-        Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-        r = UploadSAPResults(
-            errState = 'nRowsErrors',
-            errmsg = '',
-            rowNum = nRowsErrors
-            )
-        Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
-        r = UploadSAPResults(
-            errState = 'nRowsIgnored',
-            errmsg = '',
-            rowNum = nRowsNoMaterial
-            )
-        Repository(get_app_sessionmaker(), UploadSAPResults).add(r)
+                        nRowsNoMaterial += 1
+                    #endif not ignoreline
+
+                    writer.rowDone()
+                # endfor row in ws.iter_rows
+                writer.flush()
+            except Exception as ex:     # pylint: disable=broad-exception-caught
+                # the chunk in progress is rolled back; chunks already written stay, as they did with row-by-row commits
+                writer.discard()
+                nRowsErrors += 1
+                writer.addResult('fatal error', f'upload stopped - {ex!r}', SprshtRowNum)
+            # endtry
+
+            nRowsAdded = writer.nAdded
+            writer.addResult('nRowsTotal', '', SprshtRowNum)
+            writer.addResult('nRowsAdded', '', nRowsAdded)
+            writer.addResult('nRowsErrors', '', nRowsErrors)
+            writer.addResult('nRowsIgnored', '', nRowsNoMaterial)
+            writer.flush()
+        # endwith session
+        self._CTDQtyEvals = {}
 
         # close and kill temp files
         wb.close()
@@ -1127,7 +1281,7 @@ class UploadActCountSprsht(cSRFSingleRecordForm):
         #endif stateocde != 'fatalerr'
 
     def proc_UpActCountSprsheet_99_FinalProc(self) -> None:
-        self.showUpdateStatus("Finished Processing Count Entry Spreadsheet...")
+        self.showUpdateStatus("Finished Processing Count Entry Spreadsheet...", final=True)
 
     def proc_UpActCountSprsheet_99_Cleanup(self) -> None:
         # delete the temporary table
@@ -1155,26 +1309,29 @@ class ShowUploadedCountEntries(QWidget):
         wdgtScrollArea.setWidget(wdgtMainArea)
         myLayout.addWidget(wdgtScrollArea)
 
-        statusVal = Repository(get_app_sessionmaker(), UploadSAPResults).get_all(
-            UploadSAPResults.errState == 'nRowsTotal'
-        )
-        nRowsRead = statusVal[0].rowNum - 1 if statusVal else 0     # -1 because header doesn't count
-        statusVal = Repository(get_app_sessionmaker(), UploadSAPResults).get_all(
-            UploadSAPResults.errState == 'nRowsAdded'
-        )
-        nRowsAdded = statusVal[0].rowNum if statusVal else 0
-        statusVal = Repository(get_app_sessionmaker(), UploadSAPResults).get_all(
-            UploadSAPResults.errState == 'nRowsErrors'
-        )
-        nRowsErrors = statusVal[0].rowNum if statusVal else 0
-        statusVal = Repository(get_app_sessionmaker(), UploadSAPResults).get_all(
-            UploadSAPResults.errState == 'nRowsIgnored'
-        )
-        nRowsNoMaterial = statusVal[0].rowNum if statusVal else 0
+        with unitOfWork() as uow:
+            rsltRepo = uow.repository(UploadSAPResults)
+            statusVal = rsltRepo.get_all(
+                UploadSAPResults.errState == 'nRowsTotal'
+            )
+            nRowsRead = statusVal[0].rowNum - 1 if statusVal else 0     # -1 because header doesn't count
+            statusVal = rsltRepo.get_all(
+                UploadSAPResults.errState == 'nRowsAdded'
+            )
+            nRowsAdded = statusVal[0].rowNum if statusVal else 0
+            statusVal = rsltRepo.get_all(
+                UploadSAPResults.errState == 'nRowsErrors'
+            )
+            nRowsErrors = statusVal[0].rowNum if statusVal else 0
+            statusVal = rsltRepo.get_all(
+                UploadSAPResults.errState == 'nRowsIgnored'
+            )
+            nRowsNoMaterial = statusVal[0].rowNum if statusVal else 0
 
-        UplResults = Repository(get_app_sessionmaker(), UploadSAPResults).get_all(
-            UploadSAPResults.errState.notin_(['nRowsAdded','nRowsTotal','nRowsErrors','nRowsIgnored'])
-        )
+            UplResults = rsltRepo.get_all(
+                UploadSAPResults.errState.notin_(['nRowsAdded','nRowsTotal','nRowsErrors','nRowsIgnored'])
+            )
+        # endwith uow
         lblSummary = QLabel(f"Upload Summary: {nRowsRead} rows read, {nRowsAdded} rows added, {nRowsErrors} rows with errors, {nRowsNoMaterial} rows ignored (no material).")
         layoutMainArea.addWidget(lblSummary)
 
@@ -1189,6 +1346,58 @@ class ShowUploadedCountEntries(QWidget):
         pass
 
 
+class SAPUploadLookups:
+    """
+    The lookups needed by the calculated fields of an SAP MB52 upload, built once per upload.
+
+    PlantOrg maps SAPPlant -> org_id (first SAPPlants_org record for the plant, as the per-row query returned)
+    OrgMatlID maps (org_id, Material) -> MaterialList id
+    Plants and Materials are keyed as strings, since the spreadsheet may hand them over as numbers
+    """
+    PlantFld = 'Plant'                  # the rowdict keys SAPCalcFldProc reads
+    MaterialFld = 'MaterialPartNum'
+
+    def __init__(self, ssnmaker: sessionmaker, UplDate: date):
+        self.UplDate = UplDate
+        self.PlantOrg: dict[str, int] = {}
+        self.OrgMatlID: dict[tuple[int, str], int] = {}
+
+        with ssnmaker() as session:
+            for SAPPlant, org_id in session.execute(select(SAPPlants_org.SAPPlant, SAPPlants_org.org_id).order_by(SAPPlants_org.id)):
+                self.PlantOrg.setdefault(str(SAPPlant), org_id)
+            for id, org_id, Material in session.execute(select(MaterialList.id, MaterialList.org_id, MaterialList.Material)):     # pylint: disable=redefined-builtin
+                self.OrgMatlID[(org_id, str(Material))] = id
+        # endwith session
+    # __init__
+
+    def orgID(self, plant: Any) -> int | None:
+        if plant is None:
+            return None
+        return self.PlantOrg.get(str(plant))
+    # orgID
+
+    def MatlID(self, plant: Any, MatlNum: Any) -> int | None:
+        org_id = self.orgID(plant)
+        if org_id is None or MatlNum is None:
+            return None
+        return self.OrgMatlID.get((org_id, str(MatlNum)))
+    # MatlID
+
+    def SAPCalcFldProc(self, spshtFldNm: str, dbFldNm: str, val: Any, rowdict) -> Any:    # pylint:disable=unused-argument
+        # the CleanProc of the calculated fields; resolving a row costs dict lookups, not queries
+        if spshtFldNm == 'OrgID':
+            return self.orgID(rowdict[self.PlantFld])
+        elif spshtFldNm == 'MatlID':
+            return self.MatlID(rowdict[self.PlantFld], rowdict[self.MaterialFld])
+        elif spshtFldNm == 'UpldAt':
+            return self.UplDate
+        # endif calculated fields
+        return None
+    # SAPCalcFldProc
+# SAPUploadLookups
+    def end_of_class(self):
+        pass
+
 class UploadSAPSOHSprsht(cSRFSingleRecordForm):
     _ORMmodel = SAP_SOHRecs
     _formname = "Upload SAP MB52 Spreadsheet"
@@ -1205,6 +1414,8 @@ class UploadSAPSOHSprsht(cSRFSingleRecordForm):
     # __init__ inherited from cSimpleRecordForm
     def __init__(self, *args, **kwargs):
         self.uploadresults: dict[str, Any] = {}
+        self._uow: cUnitOfWork | None = None       # the unit of work uploadFile runs the upload in
+        self._progress = ProgressBus.publisher(self._formname)     # showUpdateStatus also goes out on the progress bus
 
         super().__init__(*args, **kwargs)
     # __init__
@@ -1287,11 +1498,16 @@ class UploadSAPSOHSprsht(cSRFSingleRecordForm):
     ############## UI update methods
     ###########################################################
 
-    def showUpdateStatus(self, statusText: str, progressValue: int = 0, progressMax: int = -1) -> None:
+    def showUpdateStatus(self, statusText: str, progressValue: int = 0, progressMax: int = -1, final: bool = False) -> None:
 
         assert self.wdgtUpdtStatusText is not None, "wdgtUpdtStatusText is not defined"
         assert self.wdgtUpdtStatusProgBar is not None, "wdgtUpdtStatusProgBar is not defined"
 
+        # row-by-row updates reach the bus at most every _progress.minInterval seconds; final is the proc's last word
+        if final:
+            self._progress.finish(statusText)
+        elif statusText:
+            self._progress.update(statusText, progressValue, progressMax)
         self.wdgtUpdtStatusText.setText(statusText)
 
         if progressMax < 0:
@@ -1332,8 +1548,12 @@ class UploadSAPSOHSprsht(cSRFSingleRecordForm):
         self.proc_UpSAPSprsheet_00InitUpld()
 
         USSName = self.proc_UpSAPSprsheet_00CopySpreadsheet()
-        self.proc_UpSAPSprsheet_01ReadSheet(USSName)
-        self.done_UpSAPSprsheet_01ReadSheet()      # this triggers most of the rest of the processing chain
+        # one unit of work: the old snapshot for the date is replaced by the new one in a single
+        # commit, so a failed upload leaves the old snapshot in place
+        with unitOfWork() as self._uow, bulkLoadMode(self._uow.session):
+            self.proc_UpSAPSprsheet_01ReadSheet(USSName)
+            self.done_UpSAPSprsheet_01ReadSheet()      # this triggers most of the rest of the processing chain
+        # endwith unitOfWork, bulkLoadMode
 
         # present results to user
         childScreen = ShowUploadedSAPResults(uploadresults=self.uploadresults)
@@ -1381,18 +1601,18 @@ class UploadSAPSOHSprsht(cSRFSingleRecordForm):
         self.showUpdateStatus("Reading SAP MB52 Spreadsheet...")
 
         _SStName_Material = 'Material'
-        _db_Name_Material = 'MaterialPartNum'
+        _db_Name_Material = SAPUploadLookups.MaterialFld
         _SStName_Plant = 'Plant'
-        _db_Name_Plant = 'Plant'
+        _db_Name_Plant = SAPUploadLookups.PlantFld
 
-        def SAPFldDescMap() -> Dict[str,cExcelFile.SprdsheetFldDescriptor]:
+        def SAPFldDescMap(CalcFldProc) -> Dict[str,cExcelFile.SprdsheetFldDescriptor]:
             Sprsht_SSName_TableName_map = {
                     # Material+org will translate to a Material_id
                     _SStName_Material: {'ModelFldName': _db_Name_Material},
                     _SStName_Plant: {'ModelFldName': _db_Name_Plant},
-                    'OrgID': {'ModelFldName': 'org_id', 'CalculatedFld': True, 'CleanProc': SAPCalcFldProc, 'AllowedTypes': (int, )},
-                    'MatlID': {'ModelFldName': 'Material_id', 'CalculatedFld': True, 'CleanProc': SAPCalcFldProc, 'AllowedTypes': (int, )},
-                    'UpldAt': {'ModelFldName': 'uploaded_at', 'CalculatedFld': True, 'CleanProc': SAPCalcFldProc, 'AllowedTypes': (date, )},
+                    'OrgID': {'ModelFldName': 'org_id', 'CalculatedFld': True, 'CleanProc': CalcFldProc, 'AllowedTypes': (int, )},
+                    'MatlID': {'ModelFldName': 'Material_id', 'CalculatedFld': True, 'CleanProc': CalcFldProc, 'AllowedTypes': (int, )},
+                    'UpldAt': {'ModelFldName': 'uploaded_at', 'CalculatedFld': True, 'CleanProc': CalcFldProc, 'AllowedTypes': (date, )},
                     'Material description': {'ModelFldName': 'Description'},
                     'Material type': {'ModelFldName': 'MaterialType'},
                     'Storage location': {'ModelFldName': 'StorageLocation'},
@@ -1423,31 +1643,6 @@ class UploadSAPSOHSprsht(cSRFSingleRecordForm):
             return fldVal
         # SAPFldCleanProc
 
-        def SAPCalcFldProc(spshtFldNm:str, dbFldNm:str, val:Any, rowdict) -> Any:    # pylint:disable=unused-argument
-            if spshtFldNm == 'OrgID':
-                plant_val = rowdict[_db_Name_Plant]
-                org_list = Repository(get_app_sessionmaker(), SAPPlants_org).get_all(SAPPlants_org.SAPPlant==plant_val)
-                if len(org_list) < 1:
-                    return None
-                org_id = org_list[0].org_id
-                return org_id
-            elif spshtFldNm == 'MatlID':
-                plant_val = rowdict[_db_Name_Plant]
-                _org = Repository(get_app_sessionmaker(), SAPPlants_org).get_all(SAPPlants_org.SAPPlant==plant_val)[0].org_id
-                MatlNum = rowdict[_db_Name_Material]
-                try:
-                    whereclause = and_(MaterialList.org_id==_org, MaterialList.Material==MatlNum)
-                    MatlRec = Repository(get_app_sessionmaker(), MaterialList).get_all(whereclause)[0]
-                    return MatlRec.id
-                except (TypeError, IndexError, KeyError):
-                    return None
-            elif spshtFldNm == 'UpldAt':
-                assert self.uplDate is not None, "uplDate is not defined"
-                return self.uplDate.date().toPython()
-            # endif calculated fields
-            return None
-        # SAPCalcFldProc
-
         def UplSAPProgressAnnounceCallback(currentRowNum, totalRows):
             self.showUpdateStatus(f"Reading Spreadsheet ... record {currentRowNum} of {totalRows}", currentRowNum, totalRows)
 
@@ -1455,7 +1650,10 @@ class UploadSAPSOHSprsht(cSRFSingleRecordForm):
         # (this was signed off on by user before coming here)
         assert self.uplDate is not None, "uplDate is not defined"
         UplDate = self.uplDate.date().toPython()
-        Repository(get_app_sessionmaker(), SAP_SOHRecs).removewhere(SAP_SOHRecs.uploaded_at==UplDate)
+        self._uow.repository(SAP_SOHRecs).removewhere(SAP_SOHRecs.uploaded_at==UplDate)
+
+        # plant->org and (org, Material)->id, read once for the whole upload
+        SAPLookups = SAPUploadLookups(self._uow.sessionmaker, UplDate)
 
         # wb = load_workbook(filename=fName, read_only=True)
         wb = cExcelFile.load_from_file(filename=fName, read_only=True)
@@ -1463,10 +1661,10 @@ class UploadSAPSOHSprsht(cSRFSingleRecordForm):
         # CountSprshtDateEpoch = wb.epoch
 
         wb.save_to_SQLAlchemyModel(
-            ssnmaker=self._ssnmaker,
+            ssnmaker=self._uow.sessionmaker,
             TargetModel=SAP_SOHRecs,
             WksheetName=None,   # default to active sheet
-            SprdsheetFlds=SAPFldDescMap(),
+            SprdsheetFlds=SAPFldDescMap(SAPLookups.SAPCalcFldProc),
             required_columns=[_db_Name_Material, _db_Name_Plant, ],
             progress_interval=100,
             progress_callback=UplSAPProgressAnnounceCallback,
@@ -1481,11 +1679,11 @@ class UploadSAPSOHSprsht(cSRFSingleRecordForm):
 
         # self.done_UpSAPSprsheet_01ReadSheet()    # caller will do this
     def done_UpSAPSprsheet_01ReadSheet(self):
-        self.showUpdateStatus("Finished Reading Count Entry Spreadsheet.")
+        self.showUpdateStatus("Finished Reading SAP MB52 Spreadsheet.")
         self.proc_UpSAPSprsheet_99_FinalProc()
 
     def proc_UpSAPSprsheet_99_FinalProc(self) -> None:
-        self.showUpdateStatus("Finished Processing Count Entry Spreadsheet...")
+        self.showUpdateStatus("Finished Processing SAP MB52 Spreadsheet...", final=True)
 
     def proc_UpSAPSprsheet_99_Cleanup(self) -> None:
         # nothing to clean up here
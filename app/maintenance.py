@@ -0,0 +1,60 @@
+"""
+maintenance commands, run from the WICS directory:
+
+    python -m app.maintenance init-db
+    python -m app.maintenance backfill-ctdqty [--all]
+    python -m app.maintenance rebuild-countsummary
+
+every command first brings the database schema up to date (see app.schema)
+"""
+import argparse
+import sys
+
+from app.schema import SCHEMA_VERSION, fnBootstrapSchema
+from app.utils import fnBackfillCTDQtyEval, fnRebuildMaterialCountSummary
+
+
+def cmd_init_db(args) -> int:     # pylint: disable=unused-argument
+    # the schema was brought up to date before the command ran
+    print(f"database schema is at version {SCHEMA_VERSION}")
+    return 0
+# cmd_init_db
+
+
+def cmd_backfill_ctdqty(args) -> int:
+    nUpdated = fnBackfillCTDQtyEval(allRecs=args.all)
+    print(f"ActualCounts: {nUpdated} records evaluated")
+    return 0
+# cmd_backfill_ctdqty
+
+
+def cmd_rebuild_countsummary(args) -> int:     # pylint: disable=unused-argument
+    nRows = fnRebuildMaterialCountSummary()
+    print(f"MaterialCountSummary: rebuilt, {nRows} Materials")
+    return 0
+# cmd_rebuild_countsummary
+
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m app.maintenance', description='WICS maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    cmdParser = subparsers.add_parser('init-db', help='create the tables, or bring them up to the current schema version')
+    cmdParser.set_defaults(func=cmd_init_db)
+
+    cmdParser = subparsers.add_parser('backfill-ctdqty', help='store the evaluated CTD_QTY_Expr of ActualCounts records')
+    cmdParser.add_argument('--all', action='store_true', help='re-evaluate every record, not just those never evaluated')
+    cmdParser.set_defaults(func=cmd_backfill_ctdqty)
+
+    cmdParser = subparsers.add_parser('rebuild-countsummary', help='rebuild the per-Material count summary from ActualCounts and CountSchedule')
+    cmdParser.set_defaults(func=cmd_rebuild_countsummary)
+
+    args = parser.parse_args(argv)
+    if fnBootstrapSchema():
+        print(f"database schema updated to version {SCHEMA_VERSION}")
+    return args.func(args)
+# main
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,14 @@
+import re
 from typing import Any
 from datetime import datetime, date
 
-from sqlalchemy.orm import (DeclarativeBase, Mapped, mapped_column, relationship, Session, )
+from sqlalchemy.orm import (DeclarativeBase, Mapped, mapped_column, relationship, Session, object_session, )
 from sqlalchemy import (
     Column, MetaData, 
     Integer, String, Boolean, SmallInteger, Float, LargeBinary, Date,
     ForeignKey, UniqueConstraint, Index,
-    inspect, 
+    and_, delete, func, insert, select, 
+    event, inspect, 
     )
 from sqlalchemy.exc import IntegrityError
 
@@ -16,7 +18,8 @@ from PySide6.QtCore import (QObject, )
 from PySide6.QtWidgets import (QApplication, )
 # from cMenu.utils import (pleaseWriteMe, )
 
-from .database import app_Session
+from mathematical_expressions_parser.eval import evaluate
+
 
 ix_naming_convention = {
     "ix": "ix_%(column_0_label)s",
@@ -265,6 +268,11 @@ class ActualCounts(cAppModelBase):
     FLAG_PossiblyNotRecieved: Mapped[bool] = mapped_column(Boolean, nullable=True, default=False)
     FLAG_MovementDuringCount: Mapped[bool] = mapped_column(Boolean, nullable=True, default=False)
     Notes: Mapped[str] = mapped_column(String(250), nullable=True)
+    # CTD_QTY_Expr, evaluated when the record is saved (see fnCTD_QTY_Eval):
+    #   CTD_QTY_Valid None - not evaluated yet (rows from before these columns; see app.maintenance backfill-ctdqty)
+    #   CTD_QTY_Valid False - CTD_QTY_Expr doesn't evaluate; CTD_QTY_Eval is None
+    CTD_QTY_Eval: Mapped[float] = mapped_column(Float, nullable=True, default=None)
+    CTD_QTY_Valid: Mapped[bool] = mapped_column(Boolean, nullable=True, default=None)
     
     Material: Mapped[MaterialList] = relationship(MaterialList, backref="actual_counts", lazy="selectin")
 
@@ -272,6 +280,8 @@ class ActualCounts(cAppModelBase):
         Index('ix_actualcounts_countdate_material', 'CountDate', 'Material_id'),
         Index('ix_actualcounts_material', Material_id),
         Index('ix_actualcounts_location', LOCATION),
+        # covers SUM(CTD_QTY_Eval) per Material and CountDate
+        Index('ix_actualcounts_countdate_material_qty', 'CountDate', 'Material_id', 'LocationOnly', 'CTD_QTY_Eval'),
         )    
 
     def __repr__(self) -> str:
@@ -281,6 +291,168 @@ class ActualCounts(cAppModelBase):
         # return str(self.pk) + ": " + str(self.CountDate) + " / " + str(self.Material) + " / " + str(self.Counter) + " / " + str(self.LOCATION)
         return f'{self.id}: {self.CountDate:%Y-%m-%d}  / {self.Material} / {self.Counter} / {self.LOCATION}'
 
+def fnCTD_QTY_Eval(expr) -> tuple[float | None, bool]:
+    """
+    (CTD_QTY_Eval, CTD_QTY_Valid) for a CTD_QTY_Expr
+    """
+    if expr is None:
+        return None, False
+    try:
+        value = evaluate(str(expr))
+    except Exception:   # pylint: disable=broad-exception-caught   # any failure just means not valid
+        return None, False
+    if not isinstance(value, (int, float)):
+        return None, False
+    return float(value), True
+# fnCTD_QTY_Eval
+
+@event.listens_for(ActualCounts, 'before_insert')
+@event.listens_for(ActualCounts, 'before_update')
+def _ActualCounts_set_CTD_QTY_Eval(mapper, connection, target):   # pylint: disable=unused-argument
+    # every ORM save - the forms and the spreadsheet uploader - keeps the stored quantity in step with CTD_QTY_Expr
+    # (Core update() statements bypass this; they must set CTD_QTY_Eval/CTD_QTY_Valid themselves)
+    target.CTD_QTY_Eval, target.CTD_QTY_Valid = fnCTD_QTY_Eval(target.CTD_QTY_Expr)
+# _ActualCounts_set_CTD_QTY_Eval
+
+###########################################################
+###########################################################
+
+class MaterialCountSummary(cAppModelBase):
+    """
+    per Material, what VIEW_materials.LastCountDate/LastFoundAt and VIEW_LastFoundAtList used to work
+    out on every read: kept up to date as ActualCounts and CountSchedule records are saved (see
+    fnRefreshMaterialCountSummary), so reads are plain indexed lookups.
+    A Material never counted and with nothing scheduled has no row.
+    """
+    __tablename__ = 'materialcountsummary'
+    _rltblMatlFld = 'Material_id'
+    _rltblMatlName = MaterialList.__tablename__
+
+    Material_id: Mapped[int] = mapped_column(Integer, ForeignKey(f"{_rltblMatlName}.id", onupdate="CASCADE", ondelete="CASCADE"), primary_key=True)
+    LastCountDate: Mapped[date] = mapped_column(Date, nullable=True)
+    LastFoundAt: Mapped[str] = mapped_column(String(4096), nullable=True)       # the LOCATIONs counted on LastCountDate, sorted, ', '-separated
+    nCountRows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    NextScheduledCount: Mapped[date] = mapped_column(Date, nullable=True)     # the first CountSchedule date on/after the day the row was refreshed
+    
+    Material: Mapped[MaterialList] = relationship(MaterialList)
+
+    __table_args__ = (
+        Index('ix_materialcountsummary_lastcountdate', LastCountDate),
+        Index('ix_materialcountsummary_nextscheduledcount', NextScheduledCount),
+        )
+
+    def __repr__(self) -> str:
+        return f'<MaterialCountSummary(Material_id={self.Material_id}, LastCountDate="{self.LastCountDate}", NextScheduledCount="{self.NextScheduledCount}")>'
+# MaterialCountSummary
+
+_MaterialCountSummary_chunk = 500       # Material ids per IN (...)
+
+def fnRefreshMaterialCountSummary(conn, matlIDs = None, today: date | None = None) -> int:
+    """
+    recompute the MaterialCountSummary rows of the Materials in matlIDs, or of every Material if matlIDs is None,
+    on conn (a Connection or Session - the caller's transaction)
+
+    returns the number of rows written
+    """
+    today = date.today() if today is None else today
+    ac = ActualCounts.__table__.c
+    cs = CountSchedule.__table__.c
+    sumTbl = MaterialCountSummary.__table__
+
+    if matlIDs is None:
+        conn.execute(delete(sumTbl))
+        chunks = [None]
+    else:
+        matlIDs = sorted({matlID for matlID in matlIDs if matlID is not None})
+        chunks = [matlIDs[i:i+_MaterialCountSummary_chunk] for i in range(0, len(matlIDs), _MaterialCountSummary_chunk)]
+    # endif matlIDs
+
+    nWritten = 0
+    for chunk in chunks:
+        acWhere = [] if chunk is None else [ac.Material_id.in_(chunk)]
+        csWhere = [] if chunk is None else [cs.Material_id.in_(chunk)]
+
+        lastCounts = (
+            select(ac.Material_id, func.max(ac.CountDate).label('LastCountDate'), func.count().label('nCountRows'))
+            .where(*acWhere)
+            .group_by(ac.Material_id)
+            .subquery('lastcounts')
+            )
+        summary = {matlID: {'Material_id': matlID, 'LastCountDate': lastDate, 'LastFoundAt': None, 'nCountRows': nRows, 'NextScheduledCount': None}
+            for matlID, lastDate, nRows in conn.execute(select(lastCounts))}
+        foundAt: dict[int, list[str]] = {}
+        for matlID, location in conn.execute(
+                select(ac.Material_id, ac.LOCATION).distinct()
+                .join(lastCounts, and_(ac.Material_id == lastCounts.c.Material_id, ac.CountDate == lastCounts.c.LastCountDate))
+                .order_by(ac.Material_id, ac.LOCATION)
+                ):
+            foundAt.setdefault(matlID, []).append(location)
+        for matlID, locations in foundAt.items():
+            summary[matlID]['LastFoundAt'] = ', '.join(locations)
+        for matlID, nextDate in conn.execute(
+                select(cs.Material_id, func.min(cs.CountDate))
+                .where(cs.CountDate >= today, *csWhere)
+                .group_by(cs.Material_id)
+                ):
+            summary.setdefault(matlID, {'Material_id': matlID, 'LastCountDate': None, 'LastFoundAt': None, 'nCountRows': 0, 'NextScheduledCount': None})
+            summary[matlID]['NextScheduledCount'] = nextDate
+        # endfor next scheduled
+
+        if chunk is not None:
+            conn.execute(delete(sumTbl).where(sumTbl.c.Material_id.in_(chunk)))
+        if summary:
+            conn.execute(insert(sumTbl), list(summary.values()))
+        nWritten += len(summary)
+    # endfor chunk
+
+    return nWritten
+# fnRefreshMaterialCountSummary
+
+def fnRollMaterialCountSummary(conn, today: date | None = None) -> int:
+    """
+    NextScheduledCount is relative to the day it was worked out; refresh the rows whose NextScheduledCount
+    has gone by (an indexed range read - usually nothing to do). Returns the number of rows refreshed
+    """
+    today = date.today() if today is None else today
+    sumTbl = MaterialCountSummary.__table__
+    staleIDs = conn.execute(select(sumTbl.c.Material_id).where(sumTbl.c.NextScheduledCount < today)).scalars().all()
+    return fnRefreshMaterialCountSummary(conn, staleIDs, today) if staleIDs else 0
+# fnRollMaterialCountSummary
+
+@event.listens_for(ActualCounts, 'after_insert')
+@event.listens_for(ActualCounts, 'after_update')
+@event.listens_for(ActualCounts, 'after_delete')
+@event.listens_for(CountSchedule, 'after_insert')
+@event.listens_for(CountSchedule, 'after_update')
+@event.listens_for(CountSchedule, 'after_delete')
+def _MaterialCountSummary_touch(mapper, connection, target):    # pylint: disable=unused-argument
+    # note which Materials the flush touched (both of them, if a record moved to another Material);
+    # their summaries are redone once, at the end of the flush
+    session = object_session(target)
+    if session is None:
+        return
+    touched = session.info.setdefault('_MaterialCountSummary_touched', set())
+    touched.add(target.Material_id)
+    touched.update(inspect(target).attrs.Material_id.history.deleted or ())
+# _MaterialCountSummary_touch
+
+@event.listens_for(MaterialList, 'after_delete')
+def _MaterialCountSummary_MaterialDeleted(mapper, connection, target):    # pylint: disable=unused-argument
+    # foreign keys aren't enforced, so the ON DELETE CASCADE above doesn't happen by itself
+    # (a Core delete(MaterialList) must delete the summary rows too)
+    sumTbl = MaterialCountSummary.__table__
+    connection.execute(delete(sumTbl).where(sumTbl.c.Material_id == target.id))
+# _MaterialCountSummary_MaterialDeleted
+
+@event.listens_for(Session, 'after_flush')
+def _MaterialCountSummary_refresh(session, flush_context):      # pylint: disable=unused-argument
+    # Core insert()/update()/delete() statements on ActualCounts or CountSchedule bypass this;
+    # they must call fnRefreshMaterialCountSummary themselves
+    touched = session.info.pop('_MaterialCountSummary_touched', None)
+    if touched:
+        fnRefreshMaterialCountSummary(session.connection(), touched)
+# _MaterialCountSummary_refresh
+
 
 # def FoundAt(db_to_use:HttpRequest|User|str, matl = None):
 #     # Django's generated SQL takes longer than I'd like.  I can do better, so...
@@ -407,23 +579,58 @@ class SAPPlants_org(cAppModelBase):
 ###########################################################
 ###########################################################
 
-# TODO later
-# class WorksheetZones(cAppModelBase):
+class WorksheetZones(cAppModelBase):
 
-#     __tablename__ = PUT_THE_TABLE_NAME_HERE
+    __tablename__ = 'worksheetzones'
 
-#     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-#     zone = models.IntegerField(primary_key=True)
-#     zoneName = models.CharField(max_length=10,blank=True)
+    zone: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    zoneName: Mapped[str] = mapped_column(String(10), nullable=False, default='')
+    RouteOrder: Mapped[int] = mapped_column(Integer, nullable=True, default=None)     # the zone's place on the walk through the warehouse; None goes last
 
+    def __repr__(self) -> str:
+        return f'<WorksheetZones(zone={self.zone}, zoneName="{self.zoneName}", RouteOrder={self.RouteOrder})>'
+    def __str__(self) -> str:
+        return f'{self.zone} {self.zoneName}'.strip()
+# WorksheetZones
 
-# class Location_WorksheetZone(cAppModelBase):
 
-#     __tablename__ = PUT_THE_TABLE_NAME_HERE
+class Location_WorksheetZone(cAppModelBase):
 
-#     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-#     location = models.CharField(max_length=50,blank=False)
-#     zone = models.ForeignKey(WorksheetZones, on_delete=models.RESTRICT)
+    __tablename__ = 'location_worksheetzone'
+    _rltblZoneFld = 'zone'
+    _rltblZoneName = WorksheetZones.__tablename__
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    location: Mapped[str] = mapped_column(String(50), nullable=False)
+    zone: Mapped[int] = mapped_column(Integer, ForeignKey(f"{_rltblZoneName}.zone", onupdate="CASCADE", ondelete="RESTRICT"), nullable=False)
+    RouteSeq: Mapped[int] = mapped_column(Integer, nullable=True, default=None)       # the location's place on the walk through its zone; None goes last
+    SortKey: Mapped[str] = mapped_column(String(100), nullable=False, default='')      # fnLocationSortKey(location), set on save
+
+    worksheetzone: Mapped[WorksheetZones] = relationship(WorksheetZones)
+
+    __table_args__ = (
+        UniqueConstraint('location'),
+        Index('ix_location_worksheetzone_route', 'zone', 'RouteSeq', 'SortKey'),
+        )
+
+    def __repr__(self) -> str:
+        return f'<Location_WorksheetZone(id={self.id}, location="{self.location}", zone={self.zone}, RouteSeq={self.RouteSeq})>'
+# Location_WorksheetZone
+
+def fnLocationSortKey(location: str | None) -> str:
+    """
+    location, upper-cased, with every run of digits zero-padded to 8 so that it sorts in
+    natural order: A2-10 before A10-2
+    """
+    return re.sub(r'\d+', lambda m: m.group().zfill(8), (location or '').strip().upper())[:100]
+# fnLocationSortKey
+
+@event.listens_for(Location_WorksheetZone, 'before_insert')
+@event.listens_for(Location_WorksheetZone, 'before_update')
+def _Location_WorksheetZone_set_SortKey(mapper, connection, target):   # pylint: disable=unused-argument
+    # the worksheet sorts by the stored key; Core statements must set it themselves (fnLocationSortKey)
+    target.SortKey = fnLocationSortKey(target.location)
+# _Location_WorksheetZone_set_SortKey
 
 ###########################################################
 ###########################################################
@@ -480,5 +687,4 @@ class SAPPlants_org(cAppModelBase):
 ####################################################################################
 ####################################################################################
 
-cAppModelBase.metadata.create_all(app_Session().get_bind())
-# Ensure that the tables are created when the module is imported
+# the tables are created (and brought up to date) by app.schema.fnBootstrapSchema, not on import
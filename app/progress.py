@@ -0,0 +1,128 @@
+"""
+in-process progress reporting - what async_comm did in the Django WICS, without the database
+
+a long-running proc publishes to ProgressBus (through a cProgressPublisher, which throttles the
+row-by-row updates); anything that wants to show progress - a form's status line, a status bar,
+a log pane - connects to ProgressBus.published, or reads the last few events back with recent().
+
+    progress = ProgressBus.publisher('Upload SAP MB52 Spreadsheet')
+    progress.update('Reading Spreadsheet ...', nRow, nRows)       # throttled
+    progress.status('Identifying Existing Materials ...')          # always published
+    progress.finish('Finished Processing Spreadsheet')
+
+    ProgressBus.published.connect(self.showProgress)      # self a QObject: Qt queues the call to its thread
+
+publishing is thread safe; the signal is delivered to each receiver in its own thread, as Qt signals are
+"""
+from collections import deque
+import itertools
+import threading
+import time
+
+from PySide6.QtCore import QObject, Signal
+
+
+class cProgressEvent:
+    """
+    one progress report. total < 0 means there's no count to show, only text
+    """
+    __slots__ = ('seq', 'time', 'source', 'text', 'done', 'total', 'final')
+
+    def __init__(self, seq: int, source: str, text: str, done: int = 0, total: int = -1, final: bool = False):
+        self.seq = seq
+        self.time = time.time()
+        self.source = source
+        self.text = text
+        self.done = done
+        self.total = total
+        self.final = final
+    # __init__
+
+    def __repr__(self) -> str:
+        count = f' {self.done}/{self.total}' if self.total >= 0 else ''
+        return f'<cProgressEvent #{self.seq} {self.source}: "{self.text}"{count}{" (final)" if self.final else ""}>'
+    # __repr__
+# cProgressEvent
+
+
+class cProgressBus(QObject):
+    """
+    the bus: a Qt signal per event, and a ring buffer of the last maxEvents events
+    """
+    published = Signal(object)      # cProgressEvent
+
+    def __init__(self, maxEvents: int = 1000, parent: QObject | None = None):
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        self._events: deque[cProgressEvent] = deque(maxlen=maxEvents)
+        self._latest: dict[str, cProgressEvent] = {}
+        self._seq = itertools.count(1)
+    # __init__
+
+    def publish(self, source: str, text: str, done: int = 0, total: int = -1, final: bool = False) -> cProgressEvent:
+        with self._lock:
+            event = cProgressEvent(next(self._seq), source, text, done, total, final)
+            self._events.append(event)
+            self._latest[source] = event
+        # endwith _lock
+        self.published.emit(event)
+        return event
+    # publish
+
+    def recent(self, source: str | None = None, since: int = 0, limit: int | None = None) -> list[cProgressEvent]:
+        """
+        the buffered events, oldest first - of source only, if given, and with seq > since
+        (so a listener can catch up from the last event it saw); at most the last limit of them
+        """
+        with self._lock:
+            events = [event for event in self._events if event.seq > since and (source is None or event.source == source)]
+        return events if limit is None else events[-limit:]
+    # recent
+
+    def latest(self, source: str) -> cProgressEvent | None:
+        with self._lock:
+            return self._latest.get(source)
+    # latest
+
+    def publisher(self, source: str, minInterval: float = 0.2) -> 'cProgressPublisher':
+        return cProgressPublisher(self, source, minInterval)
+    # publisher
+# cProgressBus
+
+
+class cProgressPublisher:
+    """
+    publishes one source's progress. update() publishes at most once every minInterval seconds,
+    except for the last step (done >= total); status() and finish() always publish
+    """
+    def __init__(self, bus: cProgressBus, source: str, minInterval: float = 0.2):
+        self.bus = bus
+        self.source = source
+        self.minInterval = minInterval
+        self._lastPublished = 0.0
+    # __init__
+
+    def update(self, text: str, done: int = 0, total: int = -1) -> bool:
+        """
+        returns whether the update was published
+        """
+        now = time.monotonic()
+        if total >= 0 and done < total and now - self._lastPublished < self.minInterval:
+            return False
+        self._lastPublished = now
+        self.bus.publish(self.source, text, done, total)
+        return True
+    # update
+
+    def status(self, text: str):
+        self._lastPublished = time.monotonic()
+        self.bus.publish(self.source, text)
+    # status
+
+    def finish(self, text: str):
+        self._lastPublished = 0.0
+        self.bus.publish(self.source, text, final=True)
+    # finish
+# cProgressPublisher
+
+ProgressBus = cProgressBus()
@@ -0,0 +1,129 @@
+"""
+creating and upgrading the WICS tables
+
+importing app.models touches no database. The application (and any tool that writes) calls
+fnBootstrapSchema once, before using the tables; it is idempotent, and when the database is
+already at SCHEMA_VERSION it costs a single PRAGMA read.
+
+the version is kept in SQLite's PRAGMA user_version. 0 is a database from before versioning
+(or a new one); it gets _schema_v1's create_all, which makes any missing tables as they are now,
+and every step after it is safe to run on the result. Otherwise only the steps past the
+database's version run.
+"""
+import threading
+
+from sqlalchemy import Connection, Engine, inspect, text
+
+from app.database import app_engine
+from app.models import (
+    ActualCounts, Location_WorksheetZone, MaterialCountSummary, WorksheetZones, cAppModelBase,
+    fnRefreshMaterialCountSummary,
+    )
+
+SCHEMA_VERSION = 4
+
+
+def _schema_v1(conn: Connection) -> None:
+    # the tables as they were first ported; create_all leaves existing tables alone
+    cAppModelBase.metadata.create_all(conn)
+# _schema_v1
+
+def _schema_v2(conn: Connection) -> None:
+    """
+    ActualCounts.CTD_QTY_Eval, CTD_QTY_Valid and their index.
+    create_all never adds columns to tables that already exist, so they're ALTERed in
+    """
+    addCols = {
+        ActualCounts.__tablename__: ['CTD_QTY_Eval', 'CTD_QTY_Valid'],
+        }
+    insp = inspect(conn)
+    for tblName, colNames in addCols.items():
+        tbl = cAppModelBase.metadata.tables[tblName]
+        existingCols = {col['name'] for col in insp.get_columns(tblName)}
+        for colName in colNames:
+            if colName not in existingCols:
+                colType = tbl.c[colName].type.compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE {tblName} ADD COLUMN "{colName}" {colType}'))
+        # endfor colName
+        for ix in tbl.indexes:
+            ix.create(conn, checkfirst=True)
+    # endfor tblName
+# _schema_v2
+
+def _schema_v3(conn: Connection) -> None:
+    """
+    MaterialCountSummary, filled from what's already counted and scheduled
+    """
+    MaterialCountSummary.__table__.create(conn, checkfirst=True)
+    fnRefreshMaterialCountSummary(conn)
+# _schema_v3
+
+def _schema_v4(conn: Connection) -> None:
+    # WorksheetZones and Location_WorksheetZone, for the location-ordered Count Worksheet
+    for tbl in (WorksheetZones.__table__, Location_WorksheetZone.__table__):
+        tbl.create(conn, checkfirst=True)
+# _schema_v4
+
+# version: step that brings a database at version-1 up to version
+_SCHEMA_STEPS = {
+    1: _schema_v1,
+    2: _schema_v2,
+    3: _schema_v3,
+    4: _schema_v4,
+    }
+
+_bootstrapLock = threading.Lock()
+_bootstrapped: set[Engine] = set()
+
+
+def fnSchemaVersion(engine: Engine = app_engine) -> int:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql('PRAGMA user_version').scalar() or 0
+# fnSchemaVersion
+
+
+def fnBootstrapSchema(engine: Engine = app_engine) -> bool:
+    """
+    bring the database up to SCHEMA_VERSION, if it isn't there already
+
+    returns True if any DDL was run. Raises RuntimeError if the database is from a newer WICS
+    """
+    with _bootstrapLock:
+        if engine in _bootstrapped:
+            return False
+
+        ranDDL = False
+        dbVersion = fnSchemaVersion(engine)
+        if dbVersion > SCHEMA_VERSION:
+            raise RuntimeError(f'the database is at schema version {dbVersion}; this WICS only knows up to {SCHEMA_VERSION}')
+        if dbVersion < SCHEMA_VERSION:
+            # SQLite DDL is transactional, but pysqlite (in its default, legacy transaction mode) issues no
+            # BEGIN before DDL, so under engine.begin() each CREATE/ALTER would commit by itself. With the
+            # driver's transaction handling turned off (AUTOCOMMIT), the BEGIN here is ours, and the steps
+            # and the new version go in together or not at all. IMMEDIATE takes the write lock up front,
+            # so a second WICS upgrading the same file waits, then finds the work done
+            with engine.connect() as conn:
+                conn.execution_options(isolation_level='AUTOCOMMIT')
+                conn.exec_driver_sql('BEGIN IMMEDIATE')
+                try:
+                    dbVersion = conn.exec_driver_sql('PRAGMA user_version').scalar() or 0
+                    if dbVersion < SCHEMA_VERSION:
+                        # each step past the database's version, once; a new database gets the current
+                        # tables from _schema_v1, and the later steps then find little to do
+                        for version in range(dbVersion + 1, SCHEMA_VERSION + 1):
+                            _SCHEMA_STEPS[version](conn)
+                        conn.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                        ranDDL = True
+                    # endif still behind
+                except BaseException:
+                    conn.exec_driver_sql('ROLLBACK')
+                    raise
+                # endtry
+                conn.exec_driver_sql('COMMIT')
+            # endwith conn
+        # endif dbVersion < SCHEMA_VERSION
+
+        _bootstrapped.add(engine)
+        return ranDDL
+    # endwith _bootstrapLock
+# fnBootstrapSchema
@@ -1,53 +1,77 @@
-from app.database import Repository, get_app_sessionmaker
-from app.models import MaterialList, SAP_SOHRecs
+from app.database import Repository, get_app_session, get_app_sessionmaker
+from app.models import (
+    ActualCounts, MaterialList, SAP_SOHRecs,
+    fnCTD_QTY_Eval, fnRefreshMaterialCountSummary,
+    )
 
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
 
 from datetime import date
 
 
-def fnSAPList(for_date = date.today(), matl = None) -> dict:
+def fnMaterialOrgIndex(session: Session) -> dict[str, dict[int, MaterialList]]:
+    """
+    load every MaterialList record in one query and index it as
+        {Material: {org_id: MaterialList record}}
+    within each Material, the orgs are in id order (the order the per-Material queries returned them)
+
+    the records belong to session, so changes made to them are saved by that session
+    """
+    MatlIndex: dict[str, dict[int, MaterialList]] = {}
+    for rec in session.scalars(select(MaterialList).order_by(MaterialList.id)):
+        MatlIndex.setdefault(rec.Material, {})[rec.org_id] = rec
+    return MatlIndex
+# fnMaterialOrgIndex
+
+
+def fnSAPList(for_date = date.today(), matl = None, ssnmaker = None) -> dict:
     """
     read the last SAP list before for_date into a list of SAP_SOHRecs
 
-    matl is a Material (string, NOT object!), or list, tuple or queryset of Materials to list, or None if all records are to be listed
+    matl is a MaterialList record or id, or an iterable of records or ids, or None if all records are to be listed
+        (a Material string is no longer accepted)
     the SAPDate returned is the last one prior or equal to for_date
+    ssnmaker: where to read from, if not the app's own sessions (a unitOfWork's sessionmaker, say)
     """
     _myDtFmt = '%Y-%m-%d %H:%M'
 
     dateObj = for_date
+    ssnmaker = get_app_sessionmaker() if ssnmaker is None else ssnmaker
 
-    tmp0 = Repository(get_app_sessionmaker(), SAP_SOHRecs).get_all(
-        SAP_SOHRecs.uploaded_at <= dateObj
-    )
-    if not tmp0:
-        tmp0 = Repository(get_app_sessionmaker(), SAP_SOHRecs).get_all()
-        if tmp0:
-            LatestSAPDate = min(rec.uploaded_at for rec in tmp0)
-        else:
-            LatestSAPDate = None
-    else:
-        LatestSAPDate = max(rec.uploaded_at for rec in tmp0)
-    # endif not tmp0
-
-    SAPLatest = Repository(get_app_sessionmaker(), SAP_SOHRecs).get_all(
-        SAP_SOHRecs.uploaded_at == LatestSAPDate,
-        order_by=[SAP_SOHRecs.org_id, SAP_SOHRecs.MaterialPartNum, SAP_SOHRecs.StorageLocation],
-        )
+    # the snapshot date comes from MAX/MIN, which SQLite answers from the
+    # index on sap_sohrecs (uploaded_at, org_id, MaterialPartNum) without reading the rows
+    with ssnmaker() as session:
+        LatestSAPDate = session.scalar(
+            select(func.max(SAP_SOHRecs.uploaded_at)).where(SAP_SOHRecs.uploaded_at <= dateObj)
+            )
+        if LatestSAPDate is None:
+            LatestSAPDate = session.scalar(select(func.min(SAP_SOHRecs.uploaded_at)))
+    # endwith session
 
     SList = {'reqDate': for_date, 'SAPDate': LatestSAPDate, 'SAPTable':[]}
 
-    if not matl:
-        STable = SAPLatest
-    else:
+    whereclause = [SAP_SOHRecs.uploaded_at == LatestSAPDate]
+    if matl:
         if isinstance(matl,str):
             raise TypeError('fnSAPList by Matl string is deprecated')
         elif isinstance(matl,MaterialList):  # handle case matl is a MaterialList instance here
-            STable = [rec for rec in SAPLatest if rec.Material == matl]
+            whereclause.append(SAP_SOHRecs.Material_id == matl.id)
         elif isinstance(matl,int):  # handle case matl is a MaterialList id here
-            STable = [rec for rec in SAPLatest if rec.Material.id == matl]
-        else:   # it better be an iterable!
-            STable = [rec for rec in SAPLatest if rec.Material in matl]
-    # endif not matl
+            whereclause.append(SAP_SOHRecs.Material_id == matl)
+        else:   # it better be an iterable! (of MaterialList instances or ids)
+            matlIDs = [m.id if isinstance(m, MaterialList) else m for m in matl]
+            whereclause.append(SAP_SOHRecs.Material_id.in_(matlIDs))
+    # endif matl
+
+    if LatestSAPDate is None:
+        STable = []
+    else:
+        STable = Repository(ssnmaker, SAP_SOHRecs).get_all(
+            *whereclause,
+            order_by=[SAP_SOHRecs.org_id, SAP_SOHRecs.MaterialPartNum, SAP_SOHRecs.StorageLocation],
+            )
+    # endif LatestSAPDate
 
     # yea, building SList is sorta wasteful, but a lot of existing code depends on it
     # won't be changing it until a total revamp of WICS
@@ -57,3 +81,98 @@ def fnSAPList(for_date = date.today(), matl = None) -> dict:
 
     return SList
 # fnSAPList
+
+
+def fnSAPByMaterial(SAPTable) -> dict[int, tuple[list[tuple], float]]:
+    """
+    group an SAP snapshot (fnSAPList's SAPTable) by Material_id, in one pass:
+        {Material_id: ([(StorageLocation, Amount, BaseUnitofMeasure), ...], total Amount)}
+
+    the total applies the record's UOM multiplier (mult) if it has one; SAP_SOHRecs doesn't carry
+    one yet (UnitsOfMeasure hasn't been ported), so that's 1
+    """
+    SAPByMatl: dict[int, tuple[list[tuple], float]] = {}
+    for SAProw in SAPTable:
+        SAPLines, SAPTot = SAPByMatl.get(SAProw.Material_id, ([], 0))
+        SAPLines.append((SAProw.StorageLocation, SAProw.Amount, SAProw.BaseUnitofMeasure))
+        SAPTot += (SAProw.Amount or 0) * (getattr(SAProw, 'mult', None) or 1)
+        SAPByMatl[SAProw.Material_id] = (SAPLines, SAPTot)
+    return SAPByMatl
+# fnSAPByMaterial
+
+
+def fnCountTotals(CountDate: date | None = None, matl = None, ssnmaker = None) -> dict[tuple[int, date], int | float]:
+    """
+    total counted quantity per Material and CountDate, from the stored CTD_QTY_Eval:
+        {(Material_id, CountDate): total}
+    LocationOnly counts and expressions that don't evaluate are left out, as the reports do
+
+    CountDate limits the totals to that date; matl (a MaterialList record or id, or an iterable of them) to those Materials
+    ssnmaker: where to read from, if not the app's own sessions
+    """
+    stmt = (
+        select(ActualCounts.Material_id, ActualCounts.CountDate, func.sum(ActualCounts.CTD_QTY_Eval))
+        .where(ActualCounts.LocationOnly == False)      # pylint: disable=singleton-comparison
+        .group_by(ActualCounts.Material_id, ActualCounts.CountDate)
+        )
+    if CountDate is not None:
+        stmt = stmt.where(ActualCounts.CountDate == CountDate)
+    if matl is not None:
+        if isinstance(matl, (MaterialList, int)):
+            matl = [matl]
+        stmt = stmt.where(ActualCounts.Material_id.in_([m.id if isinstance(m, MaterialList) else m for m in matl]))
+    # endif matl
+
+    # CTD_QTY_Eval is REAL, so SUM is a float; whole totals go back to int, as the counts were entered
+    with (get_app_sessionmaker() if ssnmaker is None else ssnmaker)() as session:
+        totals = {(matlID, ctDate): (total or 0) for matlID, ctDate, total in session.execute(stmt)}
+    # endwith session
+    return {key: (int(total) if float(total).is_integer() else total) for key, total in totals.items()}
+# fnCountTotals
+
+
+def fnBackfillCTDQtyEval(allRecs: bool = False, batchSize: int = 1000) -> int:
+    """
+    fill in ActualCounts.CTD_QTY_Eval/CTD_QTY_Valid for records that haven't been evaluated
+    (CTD_QTY_Valid is NULL), or for every record if allRecs
+
+    returns the number of records updated
+    """
+    stmt = select(ActualCounts.id, ActualCounts.CTD_QTY_Expr).order_by(ActualCounts.id)
+    if not allRecs:
+        stmt = stmt.where(ActualCounts.CTD_QTY_Valid.is_(None))
+    updStmt = (
+        update(ActualCounts.__table__)
+        .where(ActualCounts.__table__.c.id == bindparam('b_id'))
+        .values(CTD_QTY_Eval=bindparam('b_eval'), CTD_QTY_Valid=bindparam('b_valid'))
+        )
+
+    nUpdated = 0
+    with get_app_session() as session:
+        recs = session.execute(stmt).all()
+        for start in range(0, len(recs), batchSize):
+            batch = []
+            for recID, expr in recs[start:start+batchSize]:
+                qty, valid = fnCTD_QTY_Eval(expr)
+                batch.append({'b_id': recID, 'b_eval': qty, 'b_valid': valid})
+            session.execute(updStmt, batch)
+            nUpdated += len(batch)
+        # endfor start
+        session.commit()
+    # endwith session
+
+    return nUpdated
+# fnBackfillCTDQtyEval
+
+
+def fnRebuildMaterialCountSummary() -> int:
+    """
+    rebuild MaterialCountSummary from scratch - for after ActualCounts or CountSchedule were changed
+    behind the app's back (direct SQL, an older WICS). Returns the number of summary rows
+    """
+    with get_app_session() as session:
+        nRows = fnRefreshMaterialCountSummary(session)
+        session.commit()
+    # endwith session
+    return nRows
+# fnRebuildMaterialCountSummary
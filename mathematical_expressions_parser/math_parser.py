@@ -2,6 +2,7 @@
 module for class Parser
 """
 import math
+import re
 
 
 _CONSTANTS = {"pi": math.pi, "e": math.e, "phi": (1 + 5**0.5) / 2}
@@ -255,3 +256,236 @@ class MathParser:
                 )
 
         return float(strValue)
+
+
+def _fold(nodes, fn):
+    """
+    combine compiled nodes with fn(values): if every node is a constant, fn is applied now;
+    otherwise the result is a closure that applies it when called with the variables
+    """
+    if not any(callable(n) for n in nodes):
+        return fn(nodes)
+    return lambda in_vars: fn([n(in_vars) if callable(n) else n for n in nodes])
+
+
+class MathCompiler(MathParser):
+    """
+    class MathCompiler
+
+    Parses like MathParser, but getValue returns a compiled node instead of a value:
+    either a number, or a closure taking the variables dict and returning the value.
+
+    Anything that doesn't depend on a variable is worked out while parsing, in the same order
+    MathParser does it, so an expression without variables raises the same errors at the same
+    point. in_vars only says which names are variables; the values come when the closure is called.
+    """
+
+    def parseAddition(self):
+        values = [self.parseMultiplication()]
+
+        while True:
+            self.skipWhitespace()
+            char = self.peek()
+
+            if char == "+":
+                self.index += 1
+                values.append(self.parseMultiplication())
+            elif char == "-":
+                self.index += 1
+                values.append(_fold([self.parseMultiplication()], lambda v: -1 * v[0]))
+            else:
+                break
+
+        return _fold(values, sum)
+
+    def parseMultiplication(self):
+        values = [self.parseParenthesis()]
+
+        while True:
+            self.skipWhitespace()
+            char = self.peek()
+
+            if char == "*":
+                self.index += 1
+                values.append(self.parseParenthesis())
+            elif char == "/":
+                div_index = self.index
+                self.index += 1
+                denominator = self.parseParenthesis()
+
+                def reciprocal(v, div_index=div_index):
+                    if v[0] == 0:
+                        raise ZeroDivisionError(
+                            "Division by 0 kills baby whales (occured at index "
+                            + str(div_index)
+                            + ")"
+                        )
+                    return 1.0 / v[0]
+
+                values.append(_fold([denominator], reciprocal))
+            else:
+                break
+
+        def product(v):
+            value = 1.0
+            for factor in v:
+                value *= factor
+            return value
+
+        return _fold(values, product)
+
+    def parseNegative(self):
+        self.skipWhitespace()
+        char = self.peek()
+
+        if char == "-":
+            self.index += 1
+            return _fold([self.parseParenthesis()], lambda v: -1 * v[0])
+        else:
+            return self.parseValue()
+
+    def parseVariable(self):
+        self.skipWhitespace()
+        var = []
+        while self.hasNext():
+            char = self.peek()
+
+            if char.lower() in "_abcdefghijklmnopqrstuvwxyz0123456789":
+                var.append(char)
+                self.index += 1
+            else:
+                break
+        var = "".join(var)
+
+        function = _FUNCTIONS.get(var.lower())
+        if function != None:
+            args = self.parseArguments()
+            return _fold(args, lambda v: float(function(*v)))
+
+        constant = _CONSTANTS.get(var.lower())
+        if constant != None:
+            return constant
+
+        if self.in_vars.get(var, None) != None:
+            def variable(in_vars):
+                value = (in_vars or {}).get(var, None)
+                if value != None:
+                    return float(value)
+                raise NameError("Unrecognized variable: '" + var + "'")
+            return variable
+
+        raise NameError("Unrecognized variable: '" + var + "'")
+
+
+# one token per match: leading whitespace (only the characters skipWhitespace skips), then
+# a number, a name, an operator/punctuation character, or anything else (which fails the fast path)
+_TOKEN_RE = re.compile(r"[ \t\n\r]*(?:([0-9.]+)|([_A-Za-z0-9]+)|([-+*/(),])|(.))", re.DOTALL)
+
+_BINARY_PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2}
+
+
+class FastPathUnavailable(Exception):
+    """
+    raised by FastMathParser when the expression needs the full parser
+    """
+
+
+class FastMathParser:
+    """
+    class FastMathParser
+
+    The fast path for MathParser: the string is split by one regex into tokens, which a
+    precedence-climbing loop evaluates - no per-character slicing.
+
+    It handles numbers, + - * /, unary minus, parentheses, the _CONSTANTS and the _FUNCTIONS,
+    with MathParser's grammar and its order of arithmetic (a - b is a + -1 * b, a / b is a * (1.0 / b)),
+    so it gets the same values. It does not do variables and it does not report errors: for
+    anything it can't evaluate, getValue raises FastPathUnavailable and the caller should use
+    MathParser (or MathCompiler), which raises the proper error.
+    """
+
+    def __init__(self, string):
+        self.string = string
+        self.tokens = []
+        self.pos = 0
+
+    def getValue(self):
+        try:
+            self.tokens = _TOKEN_RE.findall(self.string)
+            self.pos = 0
+            value = self.parseBinary(1)
+        except FastPathUnavailable:
+            raise
+        except Exception as ex:
+            raise FastPathUnavailable() from ex
+        if self.pos != len(self.tokens):
+            raise FastPathUnavailable()
+        return value
+
+    def nextOp(self):
+        # the operator/punctuation at the current token, or "" if it's something else or there's none
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos][2]
+        return ""
+
+    def popExpected(self, op):
+        if self.nextOp() != op:
+            raise FastPathUnavailable()
+        self.pos += 1
+
+    def parseBinary(self, min_prec):
+        lhs = self.parseUnary()
+
+        while True:
+            op = self.nextOp()
+            prec = _BINARY_PRECEDENCE.get(op)
+            if prec is None or prec < min_prec:
+                return lhs
+            self.pos += 1
+            rhs = self.parseBinary(prec + 1)
+
+            if op == "+":
+                lhs = lhs + rhs
+            elif op == "-":
+                lhs = lhs + -1 * rhs
+            elif op == "*":
+                lhs = lhs * rhs
+            else:
+                lhs = lhs * (1.0 / rhs)     # 0 raises here; MathParser re-raises it properly
+
+    def parseUnary(self):
+        if self.pos >= len(self.tokens):
+            raise FastPathUnavailable()
+        number, name, op, other = self.tokens[self.pos]
+        self.pos += 1
+
+        if op == "(":
+            value = self.parseBinary(1)
+            self.popExpected(")")
+            return value
+        if op == "-":
+            return -1 * self.parseUnary()
+        if number:
+            return float(number)
+        if name:
+            function = _FUNCTIONS.get(name.lower())
+            if function != None:
+                return float(function(*self.parseArguments()))
+            constant = _CONSTANTS.get(name.lower())
+            if constant != None:
+                return constant
+        # a variable, a stray operator or an unexpected character
+        raise FastPathUnavailable()
+
+    def parseArguments(self):
+        args = []
+        self.popExpected("(")
+        if self.nextOp() == ")":
+            self.pos += 1
+            return args
+        args.append(self.parseBinary(1))
+        while self.nextOp() == ",":
+            self.pos += 1
+            args.append(self.parseBinary(1))
+        self.popExpected(")")
+        return args
@@ -1,4 +1,4 @@
-import app.forms as forms
+from app.forms import cLazyForm
 # from userprofiles.views import fnWICSuserForm
 
 # import _newcode
@@ -13,6 +13,8 @@ def LoadAdmin():
 #########################################################################
 
 
+# form classes are given as cLazyForm('module in app.forms', 'class'), so a form's module
+# (and what it imports) loads when the form is first opened, not at startup
 FormNameToURL_Map = {}
 # FormNameToURL_Map['menu Argument'.lower()] = (url, view)
 # FormNameToURL_Map['l10-wics-uadmin'.lower()] = (None, fnWICSuserForm)
@@ -20,31 +22,31 @@ FormNameToURL_Map['l10-wics-uadmin'.lower()] = (None, None)
 FormNameToURL_Map['l6-wics-uadmin'.lower()] = FormNameToURL_Map['l10-wics-uadmin']
 FormNameToURL_Map['django-admin'.lower()] = (None, LoadAdmin)
 
-FormNameToURL_Map['frmcountentry'.lower()] = ('CountEntryForm', forms.CountEntryForm)
-FormNameToURL_Map['frmUploadCountEntry'.lower()] = ('UploadActualCountSprsht', forms.spreadsheet.UploadActCountSprsht)
-FormNameToURL_Map['frmcountsummarypreview'.lower()] = ('CountSummaryReport', forms.fmActualCounts.rptCountSummary)
+FormNameToURL_Map['frmcountentry'.lower()] = ('CountEntryForm', cLazyForm('fmActualCounts', 'CountEntryForm'))
+FormNameToURL_Map['frmUploadCountEntry'.lower()] = ('UploadActualCountSprsht', cLazyForm('spreadsheet', 'UploadActCountSprsht'))
+FormNameToURL_Map['frmcountsummarypreview'.lower()] = ('CountSummaryReport', cLazyForm('fmActualCounts', 'rptCountSummary'))
 FormNameToURL_Map['frmrequestedcountsummary'.lower()] = ('CountSummaryReport-v-init', None)
-FormNameToURL_Map['frmimportsap'.lower()] = ('UploadSAPSprSht', forms.UploadSAPSOHSprsht)
-FormNameToURL_Map['frmmaterial'.lower()] = ('MatlForm', forms.MaterialForm)
+FormNameToURL_Map['frmimportsap'.lower()] = ('UploadSAPSprSht', cLazyForm('spreadsheet', 'UploadSAPSOHSprsht'))
+FormNameToURL_Map['frmmaterial'.lower()] = ('MatlForm', cLazyForm('frmMaterials', 'MaterialForm'))
 FormNameToURL_Map['frmmpnlookup'.lower()] = ('MPNLookup', None)
 FormNameToURL_Map['frmParts-By-Type-with-LastCounts'.lower()] = ('MatlByPartType', None)
 FormNameToURL_Map['rptMaterialByLastCount'.lower()] = ('MatlByLastCountDate', None)
 FormNameToURL_Map['rptMaterialByDESCValue'.lower()] = ('MatlByDESCValue', None)
-FormNameToURL_Map['matllistupdt'.lower()] = ('', forms.UpdateMatlListfromSAP)
+FormNameToURL_Map['matllistupdt'.lower()] = ('', cLazyForm('spreadsheet', 'UpdateMatlListfromSAP'))
 FormNameToURL_Map['frmRandCountScheduler'.lower()] = (None, None)
 
-FormNameToURL_Map['frmCountScheduleEntry'.lower()] = ('CountScheduleForm', forms.CountScheduleRecordForm)
+FormNameToURL_Map['frmCountScheduleEntry'.lower()] = ('CountScheduleForm', cLazyForm('frmCountSchedule', 'CountScheduleRecordForm'))
 FormNameToURL_Map['frmRequestCountScheduleEntry'.lower()] = ('RequestCountScheduleForm', None)
 FormNameToURL_Map['frmRequestedCountListEdit'.lower()] = ('RequestCountListEdit', None)
 FormNameToURL_Map['frmUploadCountSched'.lower()] = ('UploadCountSchedSprsht', None)
 FormNameToURL_Map['frmcount-schedulehistory-by-counterdate'.lower()] = ('CountScheduleList', None)
-FormNameToURL_Map['rptCountWorksheet'.lower()] = ('CountWorksheet', None)
-FormNameToURL_Map['rptCountWorksheetLoc'.lower()] = ('CountWorksheetLoc', None)
+FormNameToURL_Map['rptCountWorksheet'.lower()] = ('CountWorksheet', cLazyForm('rptCountWorksheet', 'rptCountWorksheet'))
+FormNameToURL_Map['rptCountWorksheetLoc'.lower()] = ('CountWorksheetLoc', cLazyForm('rptCountWorksheet', 'rptCountWorksheetLoc'))
 FormNameToURL_Map['rptMaterialLocations'.lower()] = ('MaterialLocations', None)
 FormNameToURL_Map['LocationList'.lower()] = ('LocationList', None)
 FormNameToURL_Map['sap'.lower()] = ('showtable-SAP', None)
 FormNameToURL_Map['tblActualCounts'.lower()] = ('ActualCountList', None)
-FormNameToURL_Map['PartTypeFm'.lower()] = ('PartTypeForm', forms.PartTypesForm)
+FormNameToURL_Map['PartTypeFm'.lower()] = ('PartTypeForm', cLazyForm('frmPartTypes', 'PartTypesForm'))
 
 
 FormNameToURL_Map['test01'.lower()] = ('', None)
@@ -0,0 +1,110 @@
+"""
+import timing for Main.py --profile-startup
+
+start() (before anything else is imported) puts a finder at the front of sys.meta_path that times
+each module's execution; report() prints the modules by cumulative import time, with the time
+spent in each module's own code (self), and the time from start() to the report.
+Only standard library modules are used here, so nothing is imported ahead of the measurement.
+"""
+import sys
+import time
+from importlib.abc import MetaPathFinder
+
+
+class _TimedLoader:
+    """
+    wraps a module's loader; exec_module is timed, everything else is passed through
+    """
+    def __init__(self, loader, profiler: '_ImportProfiler'):
+        self._loader = loader
+        self._profiler = profiler
+    # __init__
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+    # create_module
+
+    def exec_module(self, module):
+        self._profiler.enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.leave(module.__name__)
+        # endtry
+    # exec_module
+
+    def __getattr__(self, name):
+        if name in ('_loader', '_profiler'):
+            raise AttributeError(name)
+        return getattr(self._loader, name)
+    # __getattr__
+# _TimedLoader
+
+class _ImportProfiler(MetaPathFinder):
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.timings: dict[str, tuple[float, float]] = {}     # {module: (self, cumulative)}
+        self._stack: list[list[float]] = []                   # [start, time in nested imports]
+    # __init__
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        # endfor finder
+        return None
+    # find_spec
+
+    def enter(self):
+        self._stack.append([time.perf_counter(), 0.0])
+    # enter
+
+    def leave(self, modname: str):
+        start, nested = self._stack.pop()
+        cumulative = time.perf_counter() - start
+        self.timings[modname] = (cumulative - nested, cumulative)
+        if self._stack:
+            self._stack[-1][1] += cumulative
+    # leave
+# _ImportProfiler
+
+_profiler: _ImportProfiler | None = None
+
+
+def start():
+    global _profiler        # pylint: disable=global-statement
+    if _profiler is None:
+        _profiler = _ImportProfiler()
+        sys.meta_path.insert(0, _profiler)
+# start
+
+
+def stop():
+    if _profiler is not None and _profiler in sys.meta_path:
+        sys.meta_path.remove(_profiler)
+# stop
+
+
+def report(top: int = 40, file = None):
+    """
+    stop timing and print the top slowest imports (by cumulative time) to file (default stderr)
+    """
+    if _profiler is None:
+        return
+    stop()
+    file = sys.stderr if file is None else file
+    elapsed = time.perf_counter() - _profiler.t0
+    timings = _profiler.timings
+    totalImport = sum(selfTime for selfTime, _ in timings.values())
+
+    print(f"startup: {elapsed*1000:.1f} ms to first show, {totalImport*1000:.1f} ms of it importing {len(timings)} modules", file=file)
+    print(f"{'cumulative ms':>14} {'self ms':>10}  module", file=file)
+    for modname, (selfTime, cumulative) in sorted(timings.items(), key=lambda item: item[1][1], reverse=True)[:top]:
+        print(f"{cumulative*1000:14.1f} {selfTime*1000:10.1f}  {modname}", file=file)
+    # endfor modname
+# report
@@ -0,0 +1,81 @@
+"""
+the MB52 upload's calculated fields (org, Material id, upload date) must come from
+SAPUploadLookups' dicts: one pair of queries per upload, none per spreadsheet row
+"""
+from datetime import date
+import unittest
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import MaterialList, Organizations, SAPPlants_org, cAppModelBase
+from app.forms.spreadsheet import SAPUploadLookups
+
+
+class SAPUploadLookupsQueryCountTest(unittest.TestCase):
+    nRows = 500
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        cAppModelBase.metadata.create_all(self.engine)
+        self.ssnmaker = sessionmaker(bind=self.engine)
+
+        with self.ssnmaker() as session:
+            orgA, orgB = Organizations(orgname='A'), Organizations(orgname='B')
+            session.add_all([orgA, orgB])
+            session.flush()
+            self.orgA, self.orgB = orgA.id, orgB.id
+            session.add_all([SAPPlants_org(SAPPlant='1000', org_id=orgA.id), SAPPlants_org(SAPPlant='1010', org_id=orgB.id)])
+            session.add_all([MaterialList(org_id=orgA.id if n % 2 else orgB.id, Material=f'{n:06d}') for n in range(self.nRows)])
+            session.commit()
+        # endwith session
+
+        self.nStatements = 0
+        event.listen(self.engine, 'before_cursor_execute', self._countStatement)
+    # setUp
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self._countStatement)
+        self.engine.dispose()
+    # tearDown
+
+    def _countStatement(self, *args):
+        self.nStatements += 1
+    # _countStatement
+
+    def test_no_queries_per_row(self):
+        UplDate = date(2026, 1, 2)
+        lookups = SAPUploadLookups(self.ssnmaker, UplDate)
+        nBuildStatements = self.nStatements
+
+        rows = [{SAPUploadLookups.PlantFld: '1000' if n % 2 else 1010, SAPUploadLookups.MaterialFld: f'{n:06d}'} for n in range(self.nRows)]
+        rows.append({SAPUploadLookups.PlantFld: '9999', SAPUploadLookups.MaterialFld: '000001'})     # unknown plant
+        rows.append({SAPUploadLookups.PlantFld: '1000', SAPUploadLookups.MaterialFld: None})         # no Material
+        self.nStatements = 0
+        resolved = [
+            (lookups.SAPCalcFldProc('OrgID', 'org_id', None, row),
+             lookups.SAPCalcFldProc('MatlID', 'Material_id', None, row),
+             lookups.SAPCalcFldProc('UpldAt', 'uploaded_at', None, row))
+            for row in rows
+            ]
+
+        self.assertEqual(self.nStatements, 0, 'resolving the rows ran queries')
+        self.assertLessEqual(nBuildStatements, 2)
+
+        with self.ssnmaker() as session:
+            expected = {(m.org_id, m.Material): m.id for m in session.scalars(select(MaterialList))}
+        # endwith session
+        for row, (org_id, Matl_id, UpldAt) in zip(rows[:self.nRows], resolved):
+            self.assertEqual(org_id, self.orgA if row[SAPUploadLookups.PlantFld] == '1000' else self.orgB)
+            self.assertEqual(Matl_id, expected[(org_id, row[SAPUploadLookups.MaterialFld])])
+            self.assertEqual(UpldAt, UplDate)
+        # endfor row
+        self.assertEqual(resolved[-2][:2], (None, None))
+        self.assertEqual(resolved[-1][:2], (self.orgA, None))
+    # test_no_queries_per_row
+# SAPUploadLookupsQueryCountTest
+
+
+if __name__ == '__main__':
+    unittest.main()